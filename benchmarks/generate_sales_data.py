@@ -0,0 +1,107 @@
+import argparse
+import sqlite3
+import os
+import numpy as np
+import pandas as pd
+
+PATH_TO_SOURCE_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "sales_pipeline.db")
+
+# the values and distributions of data/supermarket_sales.csv
+BRANCHES = {"A": "Yangon", "B": "Mandalay", "C": "Naypyitaw"}
+CUSTOMER_TYPES = ["Member", "Normal"]
+GENDERS = ["Male", "Female"]
+PRODUCT_LINES = ["Health and beauty", "Electronic accessories", "Home and lifestyle", "Sports and travel",
+                 "Food and beverages", "Fashion accessories"]
+PAYMENTS = ["Ewallet", "Cash", "Credit card"]
+TAX_RATE = 0.05
+GROSS_MARGIN_PERCENTAGE = 4.761904762
+
+
+def generate_sales(rows: int, start: int = 0, seed: int = 42) -> pd.DataFrame:
+    """
+    Generate synthetic sales shaped like data/supermarket_sales.csv (vectorized)
+    :param rows: the number of rows
+    :param start: the number of the first row (invoice ids are unique across chunks)
+    :param seed: random seed (the same data for the same seed and start)
+    :return: pandas DataFrame with the columns of sales_input_data
+    """
+    random = np.random.default_rng(seed + start)
+    numbers = np.arange(start, start + rows)
+    branch = random.choice(list(BRANCHES), rows)
+    unit_price = np.round(random.uniform(10, 100, rows), 2)
+    quantity = random.integers(1, 11, rows)
+    cogs = np.round(unit_price * quantity, 2)
+    tax = np.round(cogs * TAX_RATE, 4)
+    days = random.integers(0, 89, rows)
+    dates = pd.Timestamp("2019-01-01") + pd.to_timedelta(days, unit="D")
+    minutes = random.integers(10 * 60, 21 * 60, rows)
+
+    return pd.DataFrame({
+        "invoice_id": [f"{number // 1000000:03d}-{number // 10000 % 100:02d}-{number % 10000:04d}"
+                       for number in numbers],
+        "branch": branch,
+        "city": pd.Series(branch).map(BRANCHES).values,
+        "customer_type": random.choice(CUSTOMER_TYPES, rows),
+        "gender": random.choice(GENDERS, rows),
+        "product_line": random.choice(PRODUCT_LINES, rows),
+        "unit_price": unit_price,
+        "quantity": quantity,
+        "tax": tax,
+        "total": np.round(cogs + tax, 4),
+        "date": [f"{date.month}/{date.day}/{date.year}" for date in dates],
+        "time": [f"{minute // 60:02d}:{minute % 60:02d}" for minute in minutes],
+        "payment": random.choice(PAYMENTS, rows),
+        "cogs": cogs,
+        "gross_margin_percentage": GROSS_MARGIN_PERCENTAGE,
+        "gross_income": tax,
+        "rating": np.round(random.uniform(4, 10, rows), 1),
+    })
+
+
+def create_sales_db(path_to_db: str, rows: int, chunksize: int = 1000000, seed: int = 42) -> str:
+    """
+    Create the pipeline DB (the schema of data/sales_pipeline.db) with synthetic sales_input_data
+    :param path_to_db: the path to the new DB (replaced if exists)
+    :param rows: the number of rows of sales_input_data
+    :param chunksize: the number of rows generated and inserted at once
+    :param seed: random seed
+    :return: path_to_db
+    """
+    if os.path.exists(path_to_db):
+        os.remove(path_to_db)
+    os.makedirs(os.path.dirname(os.path.abspath(path_to_db)), exist_ok=True)
+
+    with sqlite3.connect(PATH_TO_SOURCE_DB) as source:
+        schema = [row[0] for row in source.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' "
+            "AND name IN ('sales_input_data', 'sales_output_male', 'sales_output_female')"
+        )]
+
+    connector = sqlite3.connect(path_to_db)
+    try:
+        connector.execute("PRAGMA journal_mode=WAL")
+        connector.execute("PRAGMA synchronous=OFF")
+        for sql in schema:
+            connector.execute(sql)
+        columns = None
+        with connector:
+            for start in range(0, rows, chunksize):
+                df = generate_sales(min(chunksize, rows - start), start=start, seed=seed)
+                columns = columns or list(df.columns)
+                connector.executemany(
+                    f"INSERT INTO sales_input_data ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})",
+                    df.astype(object).itertuples(index=False, name=None)
+                )
+    finally:
+        connector.close()
+    return path_to_db
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate synthetic sales DB for benchmarks")
+    parser.add_argument("--rows", type=int, default=10000, help="the number of rows of sales_input_data")
+    parser.add_argument("--output", default=os.path.join("benchmarks", "data", "sales_10000.db"),
+                        help="the path to the generated DB")
+    parser.add_argument("--seed", type=int, default=42, help="random seed")
+    args = parser.parse_args()
+    create_sales_db(args.output, args.rows, seed=args.seed)
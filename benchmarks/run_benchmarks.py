@@ -0,0 +1,487 @@
+from typing import Dict, List, Callable, Optional
+import functools
+import gc
+import subprocess
+import threading
+import platform
+import argparse
+import tempfile
+import warnings
+import sqlite3
+import shutil
+import json
+import time
+import re
+import sys
+import os
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.generate_sales_data import create_sales_db  # noqa: E402
+from data_quality.data_quality_core import DqSuiteCompiler, DqResultCache, DataQuality, DqReportWriter, \
+    DqException, DqRowPredicate  # noqa: E402
+from data_quality.dq_parallel import DqParallelEngine  # noqa: E402
+from data_quality.dq_instrumentation import get_rss_bytes  # noqa: E402
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# metrics compared with the baseline (a regression is a growth of the metric)
+COMPARED_METRICS = ("wall_time_s", "peak_rss_mb", "frame_mb", "scans", "spark_jobs", "jdbc_reads", "sqlite_commits")
+ANSI_COLOR = re.compile(r"\x1b\[[0-9;]*m")
+# the pipeline outputs: {gender: the name of the table for the DQ report}
+SEGMENTS = {"Male": "male_output", "Female": "female_output"}
+# the modules of the pandas pipeline (they should not load Spark and great_expectations)
+IMPORT_MODULES = ("data_quality.data_quality_core", "data_quality.dq_male_output", "main_pandas")
+BACKEND_MODULES = ("pyspark", "great_expectations")
+IMPORT_CODE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import {module}
+wall_time = time.perf_counter() - start
+print(json.dumps({{
+    "wall_time_s": wall_time,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "backends": sorted({{name.split(".")[0] for name in sys.modules}} & set({backends}))
+}}))
+"""
+
+
+class Counters:
+
+    def __init__(self):
+        """
+        Process wide counters of data frame scans and SQLite commits (see instrument)
+        """
+        self.lock = threading.Lock()
+        self.values = {"scans": 0, "sqlite_commits": 0}
+
+    def add(self, name: str, value: int = 1):
+        with self.lock:
+            self.values[name] += value
+
+    def snapshot(self) -> Dict[str, int]:
+        with self.lock:
+            return dict(self.values)
+
+
+COUNTERS = Counters()
+
+
+def instrument():
+    """
+    Count the work of the pipelines without changing them:
+    - scans: DQ statistics passes (DqSuiteCompiler.compute_stats), DQ fingerprints and SQL reads of pandas
+    - sqlite_commits: COMMIT statements of all SQLite connections (trace callback)
+    (the work of DQ worker processes is not counted)
+    :return: None
+    """
+    def counted(function: Callable, name: str) -> Callable:
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            COUNTERS.add(name)
+            return function(*args, **kwargs)
+        return wrapper
+
+    DqSuiteCompiler.compute_stats = classmethod(counted(DqSuiteCompiler.compute_stats.__func__, "scans"))
+    DqResultCache.get_fingerprint = staticmethod(counted(DqResultCache.get_fingerprint, "scans"))
+    pd.read_sql_query = counted(pd.read_sql_query, "scans")
+
+    connect = sqlite3.connect
+
+    @functools.wraps(connect)
+    def traced_connect(*args, **kwargs):
+        connector = connect(*args, **kwargs)
+        connector.set_trace_callback(
+            lambda statement: COUNTERS.add("sqlite_commits") if statement.startswith("COMMIT") else None
+        )
+        return connector
+
+    sqlite3.connect = traced_connect
+
+
+class RssSampler:
+
+    def __init__(self, interval: float = 0.01):
+        """
+        Samples RSS of the process in the background thread to get the peak RSS of one stage
+        :param interval: sampling interval in seconds
+        """
+        self.interval = interval
+        self.peak = 0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.sample, daemon=True)
+
+    def __enter__(self) -> 'RssSampler':
+        self.peak = get_rss_bytes()
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stopped.set()
+        self.thread.join()
+        self.peak = max(self.peak, get_rss_bytes())
+
+    def sample(self):
+        while not self.stopped.wait(self.interval):
+            self.peak = max(self.peak, get_rss_bytes())
+
+
+def measure(results: List[Dict], engine: str, stage: str, rows: int, function: Callable, spark=None,
+            count_scans: bool = True, metrics: Callable[[], Dict] = None):
+    """
+    Run one stage of the pipeline and add its metrics to results
+    (DQ errors raised by the suites are recorded, the benchmark continues)
+    :param results: the list of the results
+    :param engine: 'pandas' or 'spark'
+    :param stage: the name of the stage
+    :param rows: the number of input rows
+    :param function: the stage
+    :param spark: spark session (Spark jobs and JDBC reads are counted)
+    :param count_scans: False - the scans are done in other processes and can not be counted
+    :param metrics: callable returning additional metrics of the stage (called when the stage is passed)
+    :return: None
+    """
+    run_metrics = None
+    if spark is not None:
+        from main_spark import SparkRunMetrics
+        run_metrics = SparkRunMetrics(spark)
+        run_metrics.start()
+
+    counters_before = COUNTERS.snapshot()
+    exception = None
+    with RssSampler() as rss:
+        start = time.perf_counter()
+        try:
+            function()
+        except Exception as error:
+            # DQ errors are raised with the colored JSON of the failed expectations
+            message = ' '.join(ANSI_COLOR.sub('', str(error)).split())
+            exception = f"{type(error).__name__}: {message}"[:200]
+        wall_time = time.perf_counter() - start
+    counters_after = COUNTERS.snapshot()
+    if run_metrics is not None:
+        run_metrics.stop()
+
+    results.append({
+        "engine": engine,
+        "stage": stage,
+        "rows": rows,
+        "wall_time_s": round(wall_time, 4),
+        "peak_rss_mb": round(rss.peak / 1024 ** 2, 1),
+        "scans": counters_after["scans"] - counters_before["scans"] if count_scans else None,
+        "spark_jobs": run_metrics.spark_jobs if run_metrics else None,
+        "jdbc_reads": run_metrics.jdbc_reads if run_metrics else None,
+        "sqlite_commits": counters_after["sqlite_commits"] - counters_before["sqlite_commits"],
+        "exception": exception,
+    })
+    if metrics is not None and exception is None:
+        results[-1].update(metrics())
+    print(json.dumps(results[-1]))
+
+
+def run_imports(results: List[Dict], repeat: int) -> List[Dict]:
+    """
+    Measure the cold import time of the pandas pipeline modules (a new interpreter for every import)
+    :param results: the list of the results
+    :param repeat: the number of imports of every module (the median is reported)
+    :return: the results of the imports
+    """
+    import_results = []
+    for module in IMPORT_MODULES:
+        runs = []
+        exception = None
+        for _ in range(repeat):
+            process = subprocess.run(
+                [sys.executable, "-c", IMPORT_CODE.format(module=module, backends=list(BACKEND_MODULES))],
+                capture_output=True, text=True, cwd=os.path.join(BENCHMARKS_PATH, "..")
+            )
+            if process.returncode:
+                exception = process.stderr.strip().splitlines()[-1][:200]
+                break
+            runs.append(json.loads(process.stdout.strip().splitlines()[-1]))
+        runs.sort(key=lambda run: run["wall_time_s"])
+        median = runs[len(runs) // 2] if runs else {}
+        import_results.append({
+            "engine": "import",
+            "stage": module,
+            "rows": 0,
+            "wall_time_s": round(median["wall_time_s"], 4) if runs else None,
+            "peak_rss_mb": round(median["peak_rss_mb"], 1) if runs else None,
+            "scans": None,
+            "spark_jobs": None,
+            "jdbc_reads": None,
+            "sqlite_commits": None,
+            "backends": median.get("backends"),
+            "exception": exception,
+        })
+        print(json.dumps(import_results[-1]))
+    results.extend(import_results)
+    return import_results
+
+
+def run_pandas(results: List[Dict], path_to_db: str, rows: int, work_path: str, dq_executor: str,
+               chunksize: int):
+    from main_pandas import SalesDataPipeline
+
+    sales = SalesDataPipeline(path_to_db=path_to_db, output_path=work_path)
+    outputs = {}
+
+    def read():
+        query = sales.get_sales_by_payment_method(df=sales.get_sales_query(), payment_method="Credit card")
+        query = sales.get_sales_price_lower_then(df=query, price_lower=50)
+        query = sales.get_sales_quantity_lower_then(df=query, quantity_lower=3)
+        outputs.update(sales.fan_out(query, key="gender", segments=SEGMENTS))
+
+    def save():
+        sales.save_output(output_data=outputs["male_output"], output_table="sales_output_male")
+        sales.save_output(output_data=outputs["female_output"], output_table="sales_output_female")
+
+    measure(results, "pandas", "read", rows, read)
+    measure(results, "pandas", "dq", rows,
+            lambda: sales.data_quality_checks_sales_pipeline_parallel(outputs, executor=dq_executor),
+            count_scans=dq_executor != "process")
+    measure(results, "pandas", "save", rows, save)
+    measure(results, "pandas", "streaming", rows, lambda: sales.run_streaming(chunksize=chunksize))
+
+
+def run_dtypes(results: List[Dict], path_to_db: str, rows: int, work_path: str, dq_executor: str):
+    """
+    Compare the compact dtypes of the input (SalesDataPipeline(compact=True)) with the text columns read by default:
+    the load of the whole input table (frame_mb - the memory of the loaded data frame), the pipeline filters
+    on the data frame and the DQ suites of the outputs (the compact path runs first: the peak RSS of the text path
+    includes the memory kept by the process after the compact path)
+    """
+    from main_pandas import SalesDataPipeline
+
+    for mode in ("compact", "text"):
+        sales = SalesDataPipeline(path_to_db=path_to_db, output_path=work_path, compact=mode == "compact")
+        # the outputs of the text path are validated by the 'dq' stage before: the results are not taken from the cache
+        sales.dq_result_cache = None
+        frames = {}
+
+        def load():
+            frames["input"] = sales.collect(sales.get_sales_query())
+
+        def filter_outputs():
+            df = sales.get_sales_by_payment_method(df=frames["input"], payment_method="Credit card")
+            df = sales.get_sales_price_lower_then(df=df, price_lower=50)
+            df = sales.get_sales_quantity_lower_then(df=df, quantity_lower=3)
+            frames.update(sales.fan_out(df, key="gender", segments=SEGMENTS))
+
+        measure(results, "pandas", f"load_{mode}", rows, load,
+                metrics=lambda: {"frame_mb": round(frames["input"].memory_usage(deep=True).sum() / 1024 ** 2, 1)})
+        measure(results, "pandas", f"filter_{mode}", rows, filter_outputs)
+        measure(results, "pandas", f"dq_{mode}", rows,
+                lambda: sales.data_quality_checks_sales_pipeline_parallel(
+                    {table_name: frames[table_name] for table_name in SEGMENTS.values() if table_name in frames},
+                    executor=dq_executor),
+                count_scans=dq_executor != "process")
+        frames.clear()
+        gc.collect()
+
+
+def add_input_suite(dq: DataQuality):
+    """
+    The suite of the whole input table for the parallel DQ stages (every column is checked)
+    """
+    exception = DqException(exception_message="The input table check", is_error=False)
+    for column in dq.df.columns:
+        dq.expect_column_values_to_not_be_null(column=column, exception=exception)
+    for column in ("unit_price", "quantity", "tax", "total", "cogs", "gross_income", "rating"):
+        dq.expect_column_min_to_be_between(column=column, exception=exception, min_value=0)
+        dq.expect_column_max_to_be_between(column=column, exception=exception, max_value=10000)
+    for column, values in (("branch", ["A", "B", "C"]), ("city", ["Yangon", "Mandalay", "Naypyitaw"]),
+                           ("customer_type", ["Member", "Normal"]), ("gender", ["Male", "Female"]),
+                           ("payment", ["Cash", "Credit card", "Ewallet"])):
+        dq.expect_column_values_distinct_to_be_in_set(column=column, values_li=values, exception=exception)
+    dq.expect_column_unique_value_count_to_be_between(column="invoice_id", exception=exception,
+                                                      min_value=dq.df.shape[0])
+    dq.expect_rows_to_not_match(name="check_input_unit_price",
+                                predicate=DqRowPredicate.where("city", "==", "Mandalay")
+                                & DqRowPredicate.where("unit_price", "<", 10),
+                                exception=exception)
+
+
+def run_parallel_dq(results: List[Dict], path_to_db: str, rows: int, work_path: str, workers: int):
+    """
+    Compare the DQ pass over the whole input table in the current process with the pass of DqParallelEngine
+    for the compact dtypes and the text columns (the text columns are not shared with the workers, the worker
+    processes are started by an unmeasured run; identical - the DQ results of both passes are the same)
+    """
+    from main_pandas import SalesDataPipeline
+
+    engine = DqParallelEngine(workers=workers, min_rows=0)
+    try:
+        for mode in ("compact", "text"):
+            sales = SalesDataPipeline(path_to_db=path_to_db, output_path=work_path, compact=mode == "compact")
+            df = sales.collect(sales.get_sales_query())
+            records = {}
+
+            def validate(name: str, parallel_engine: Optional[DqParallelEngine]):
+                report_writer = DqReportWriter()
+                dq = DataQuality(df=df, table_name="sales_input_data", report_writer=report_writer,
+                                 parallel_engine=parallel_engine, max_row_ids=0)
+                add_input_suite(dq)
+                dq.run_suite()
+                records[name] = [{field: record[field] for field in ("success", "expectation_type", "kwargs",
+                                                                     "unexpected_count", "partial_unexpected_list")}
+                                 for record in report_writer.records]
+
+            validate("warm_up", engine)
+            measure(results, "pandas", f"dq_serial_{mode}", rows, lambda: validate("serial", None))
+            measure(results, "pandas", f"dq_parallel_{mode}", rows, lambda: validate("parallel", engine),
+                    metrics=lambda: {"workers": workers, "identical": records["parallel"] == records["serial"]})
+            del df
+            gc.collect()
+    finally:
+        engine.close()
+
+
+def run_spark(results: List[Dict], path_to_db: str, rows: int, work_path: str):
+    from main_spark import SalesDataPipeline
+    from pyspark.sql import SparkSession
+
+    spark = SparkSession.builder.master("local[*]") \
+        .config('spark.jars.packages', 'org.xerial:sqlite-jdbc:3.34.0') \
+        .getOrCreate()
+    pipeline = {}
+    outputs = {}
+
+    def load():
+        pipeline["sales"] = SalesDataPipeline(path_to_db=path_to_db, output_path=work_path, input_cache=False)
+
+    def materialize():
+        sales = pipeline["sales"]
+        df = sales.get_sales_by_payment_method(payment_method="Credit card", df=sales.sdf_data)
+        df = sales.get_sales_price_lower_then(price_lower=50, df=df)
+        df = sales.get_sales_quantity_lower_then(quantity_lower=3, df=df)
+        outputs.update(sales.fan_out(df, key="gender", segments=SEGMENTS))
+
+    def save():
+        pipeline["sales"].save_output(output_data=outputs["male_output"], table_name="sales_output_male")
+        pipeline["sales"].save_output(output_data=outputs["female_output"], table_name="sales_output_female")
+
+    measure(results, "spark", "load", rows, load, spark=spark)
+    measure(results, "spark", "materialize", rows, materialize, spark=spark)
+    measure(results, "spark", "dq", rows,
+            lambda: pipeline["sales"].data_quality_checks_sales_pipeline_parallel(outputs), spark=spark)
+    measure(results, "spark", "save", rows, save, spark=spark)
+    if "sales" in pipeline:
+        pipeline["sales"].release_materialized()
+
+
+def get_meta() -> Dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=BENCHMARKS_PATH).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "commit": commit,
+        "ts": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results: List[Dict], baseline: Dict, threshold: float) -> List[str]:
+    """
+    Compare the results with the baseline results
+    :param results: the results of the current run
+    :param baseline: the JSON output of the baseline run
+    :param threshold: allowed relative growth of the metric (0.2 - 20%)
+    :return: list of regressions (empty - no regressions)
+    """
+    baseline_results = {(r["engine"], r["stage"], r["rows"]): r for r in baseline["results"]}
+    regressions = []
+    for result in results:
+        previous = baseline_results.get((result["engine"], result["stage"], result["rows"]))
+        if previous is None:
+            continue
+        for metric in COMPARED_METRICS:
+            old, new = previous.get(metric), result.get(metric)
+            if old is None or new is None:
+                continue
+            if new > old * (1 + threshold) and new - old > (0.01 if metric == "wall_time_s" else 0):
+                regressions.append(f"{result['engine']}/{result['stage']}/{result['rows']}: "
+                                   f"{metric} {old} -> {new}")
+    return regressions
+
+
+def get_source_db(rows: int, seed: int) -> str:
+    # the generated data is reused by the next runs (the pipelines work on a copy)
+    path_to_db = os.path.join(BENCHMARKS_PATH, "data", f"sales_{rows}_{seed}.db")
+    if not os.path.exists(path_to_db):
+        create_sales_db(path_to_db, rows, seed=seed)
+    return path_to_db
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmarks of the pipelines and DQ suites")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000],
+                        help="the sizes of the synthetic input, e.g. 10000 1000000 100000000")
+    parser.add_argument("--engines", nargs="+", choices=("pandas", "spark"), default=["pandas"])
+    parser.add_argument("--dq-executor", choices=("thread", "process"), default="thread",
+                        help="executor of the pandas DQ runner (scans of 'process' workers are not counted)")
+    parser.add_argument("--chunksize", type=int, default=100000, help="the chunk size of the streaming stage")
+    parser.add_argument("--dq-workers", type=int, default=os.cpu_count(),
+                        help="the worker processes of the parallel DQ stage (the number of CPUs by default)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="the path to the JSON output")
+    parser.add_argument("--compare", help="the JSON output of the baseline run")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative growth of the metrics")
+    parser.add_argument("--import-repeat", type=int, default=5,
+                        help="the number of cold imports of every module (0 - skip the import benchmark)")
+    parser.add_argument("--import-target", type=float,
+                        help="the max import time of the pandas pipeline modules in seconds (fail if exceeded)")
+    args = parser.parse_args(argv)
+
+    # DQ warnings of the suites are expected
+    warnings.simplefilter("ignore")
+    results: List[Dict] = []
+    failures = []
+    if args.import_repeat > 0:
+        for result in run_imports(results, args.import_repeat):
+            if result["exception"]:
+                failures.append(f"import {result['stage']}: {result['exception']}")
+            elif result["backends"]:
+                failures.append(f"import {result['stage']}: loads {', '.join(result['backends'])}")
+            elif args.import_target is not None and result["wall_time_s"] > args.import_target:
+                failures.append(f"import {result['stage']}: {result['wall_time_s']}s > {args.import_target}s")
+    for failure in failures:
+        print(f"IMPORT {failure}")
+
+    instrument()
+    for rows in args.rows:
+        source_db = get_source_db(rows, args.seed)
+        for engine in args.engines:
+            with tempfile.TemporaryDirectory(prefix=f"dq_benchmark_{engine}_{rows}_") as work_path:
+                path_to_db = os.path.join(work_path, "sales_pipeline.db")
+                shutil.copyfile(source_db, path_to_db)
+                if engine == "pandas":
+                    run_pandas(results, path_to_db, rows, work_path, args.dq_executor, args.chunksize)
+                    run_dtypes(results, path_to_db, rows, work_path, args.dq_executor)
+                    run_parallel_dq(results, path_to_db, rows, work_path, args.dq_workers)
+                else:
+                    run_spark(results, path_to_db, rows, work_path)
+
+    output = {"meta": get_meta(), "results": results}
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as output_file:
+            json.dump(output, output_file, indent=3)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        return 1 if regressions or failures else 0
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,13 +1,41 @@
-from great_expectations import dataset
 import warnings
-from pyspark.sql import DataFrame as SparkDataFrame
 import pandas as pd
-from typing import List, Dict
-from datetime import datetime
+import numpy as np
+from typing import List, Dict, Set, Any, Optional, Tuple, Callable, Iterator, TYPE_CHECKING
+from datetime import datetime, date
+from decimal import Decimal
 import json
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from types import SimpleNamespace
 import os
 import sqlite3
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from functools import reduce
+from data_quality.dq_report_store import DqReportStore
+from data_quality.dq_connections import DqReportService, get_report_service, get_connection_pool
+from data_quality.dq_instrumentation import DqTracer, DqSpan
+from data_quality.dq_row_ids import DqRowIds
+import sys
+
+# pyspark and great_expectations are imported on the first use only (pure pandas jobs do not load them)
+if TYPE_CHECKING:
+    from pyspark.sql import DataFrame as SparkDataFrame
+    from data_quality.dq_parallel import DqParallelEngine
+
+
+def is_spark_df(df) -> bool:
+    """
+    Check that df is Spark DataFrame without importing pyspark
+    (a Spark data frame can exist only if the caller has already imported pyspark)
+    :param df: any object
+    :return: bool
+    """
+    spark_sql = sys.modules.get('pyspark.sql')
+    return spark_sql is not None and type(df) is spark_sql.DataFrame
 
 
 @dataclass
@@ -16,32 +44,1357 @@ class DqException:
     is_error: bool = False
 
 
+@dataclass(frozen=True)
+class DqExecutionMode:
+    mode: str = 'exact'
+    fraction: Optional[float] = None
+    seed: Optional[int] = None
+    relative_sd: float = 0.05
+    accuracy: int = 10000
+
+    def __post_init__(self):
+        if self.mode not in ('exact', 'sample', 'approx'):
+            raise ValueError(f"Unknown execution mode '{self.mode}', expected 'exact', 'sample' or 'approx'")
+        if self.mode == 'sample' and not (self.fraction and 0 < self.fraction <= 1):
+            raise ValueError(f"Sample fraction should be in (0, 1], got {self.fraction}")
+
+    @classmethod
+    def exact(cls):
+        """
+        Evaluate expectations over all rows with exact statistics
+        """
+        return cls()
+
+    @classmethod
+    def sample(cls, fraction: float, seed: int = 42):
+        """
+        Evaluate expectations over the deterministic sample of rows
+        :param fraction: the fraction of rows in the sample
+        :param seed: the seed of the sample (the same seed gives the same sample for the same data)
+        """
+        return cls(mode='sample', fraction=fraction, seed=seed)
+
+    @classmethod
+    def approx(cls, relative_sd: float = 0.05, accuracy: int = 10000):
+        """
+        Evaluate expectations over all rows with approximate distinct count / quantile sketches (Spark)
+        :param relative_sd: maximum relative standard deviation of approx_count_distinct
+        :param accuracy: accuracy of percentile_approx
+        """
+        return cls(mode='approx', relative_sd=relative_sd, accuracy=accuracy)
+
+    def __str__(self):
+        if self.mode == 'sample':
+            return f'sample({self.fraction}, seed={self.seed})'
+        return self.mode
+
+    def apply(self, df):
+        """
+        Get the rows to evaluate expectations on (the deterministic sample for 'sample' mode)
+        :param df: DataFrame (Spark or Pandas)
+        :return: DataFrame (Spark or Pandas)
+        """
+        if self.mode != 'sample':
+            return df
+        if is_spark_df(df):
+            return df.sample(withReplacement=False, fraction=self.fraction, seed=self.seed)
+        return df.sample(frac=self.fraction, random_state=self.seed)
+
+
+@dataclass(frozen=True)
+class DqRowPredicate:
+    """
+    Declarative row predicate of the custom expectation (e.g. city == 'Mandalay' and unit_price < 10),
+    compiled to a vectorized pandas mask or a Spark Column expression.
+    Null values never match a comparison (the same result for Pandas and Spark)
+    """
+    operator: str
+    column: Optional[str] = None
+    value: Any = None
+    operands: Tuple['DqRowPredicate', ...] = ()
+
+    # leaf operators: how the operator is applied to pandas Series / Spark Column
+    comparisons = {
+        '==': lambda column, value: column == value,
+        '!=': lambda column, value: column != value,
+        '<': lambda column, value: column < value,
+        '<=': lambda column, value: column <= value,
+        '>': lambda column, value: column > value,
+        '>=': lambda column, value: column >= value,
+    }
+    null_operators = ('is null', 'is not null')
+
+    @classmethod
+    def where(cls, column: str, operator: str, value=None) -> 'DqRowPredicate':
+        """
+        Create the predicate for one column
+        :param column: the column name
+        :param operator: one of comparisons, 'in', 'not in', 'is null', 'is not null'
+        :param value: the value to compare with (list of values for 'in' / 'not in')
+        :return: DqRowPredicate
+        """
+        if operator in ('in', 'not in'):
+            value = tuple(value)
+        elif operator not in cls.comparisons and operator not in cls.null_operators:
+            raise ValueError(f"Unsupported operator '{operator}'")
+        return cls(operator=operator, column=column, value=value)
+
+    def __and__(self, other: 'DqRowPredicate') -> 'DqRowPredicate':
+        return DqRowPredicate(operator='and', operands=self.get_operands('and') + other.get_operands('and'))
+
+    def __or__(self, other: 'DqRowPredicate') -> 'DqRowPredicate':
+        return DqRowPredicate(operator='or', operands=self.get_operands('or') + other.get_operands('or'))
+
+    def __invert__(self) -> 'DqRowPredicate':
+        return DqRowPredicate(operator='not', operands=(self,))
+
+    def __str__(self):
+        if self.operator in ('and', 'or'):
+            return '(' + f' {self.operator} '.join(map(str, self.operands)) + ')'
+        if self.operator == 'not':
+            return f'not {self.operands[0]}'
+        if self.operator in self.null_operators:
+            return f'{self.column} {self.operator}'
+        return f'{self.column} {self.operator} {self.value!r}'
+
+    def get_operands(self, operator: str) -> tuple:
+        # nested and/or are flattened
+        return self.operands if self.operator == operator else (self,)
+
+    def columns(self) -> Set[str]:
+        """
+        Get all columns used by the predicate
+        """
+        if self.column is not None:
+            return {self.column}
+        return set().union(*[operand.columns() for operand in self.operands])
+
+    def to_mask(self, df: pd.DataFrame) -> pd.Series:
+        """
+        Compile the predicate to the vectorized boolean mask of the pandas data frame
+        :param df: pandas DataFrame
+        :return: boolean Series (True - the row matches the predicate)
+        """
+        if self.operator in ('and', 'or'):
+            return self.combine([operand.to_mask(df) for operand in self.operands])
+        if self.operator == 'not':
+            return ~self.operands[0].to_mask(df)
+
+        column = df[self.column]
+        if self.operator == 'is null':
+            return column.isna()
+        if self.operator == 'is not null':
+            return column.notna()
+        if self.operator in ('in', 'not in'):
+            mask = column.isin(self.value)
+            return column.notna() & (mask if self.operator == 'in' else ~mask)
+        return column.notna() & self.comparisons[self.operator](column, self.value)
+
+    def to_column(self):
+        """
+        Compile the predicate to the Spark Column expression
+        :return: boolean Spark Column (never null)
+        """
+        if self.operator in ('and', 'or'):
+            return self.combine([operand.to_column() for operand in self.operands])
+        if self.operator == 'not':
+            return ~self.operands[0].to_column()
+
+        from pyspark.sql import functions as F
+
+        column = F.col(self.column)
+        if self.operator == 'is null':
+            return column.isNull()
+        if self.operator == 'is not null':
+            return column.isNotNull()
+        if self.operator in ('in', 'not in'):
+            expression = column.isin(list(self.value))
+            expression = expression if self.operator == 'in' else ~expression
+        else:
+            expression = self.comparisons[self.operator](column, self.value)
+        return F.coalesce(expression, F.lit(False))
+
+    def combine(self, expressions: List):
+        # the same operators for pandas Series and Spark Column
+        if self.operator == 'and':
+            return reduce(lambda first, second: first & second, expressions)
+        return reduce(lambda first, second: first | second, expressions)
+
+
+@dataclass
+class DqExpectation:
+    expectation_type: str
+    kwargs: Dict
+    exception: DqException
+    execution_mode: Optional[DqExecutionMode] = None
+    predicate: Optional[DqRowPredicate] = None
+
+
+@dataclass
+class DqColumnStats:
+    distinct: Optional[Set] = None
+    null_count: Optional[int] = None
+    min: Any = None
+    max: Any = None
+    distinct_count: Optional[int] = None
+    median: Any = None
+
+    # statistics which can be merged from the statistics of two parts of the data
+    mergeable_stats = ('distinct', 'null_count', 'min', 'max')
+
+    def merge(self, other: 'DqColumnStats') -> 'DqColumnStats':
+        """
+        Merge statistics of two parts of the same column (not mergeable statistics are dropped)
+        :param other: statistics of the other part of the column
+        :return: DqColumnStats of the whole column
+        """
+        distinct = self.distinct | other.distinct \
+            if self.distinct is not None and other.distinct is not None else None
+        return DqColumnStats(
+            distinct=distinct,
+            null_count=self.null_count + other.null_count
+            if self.null_count is not None and other.null_count is not None else None,
+            min=merge_value(self.min, other.min, min),
+            max=merge_value(self.max, other.max, max),
+            distinct_count=len(distinct) if distinct is not None else None
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            'distinct': sorted(map(to_python, self.distinct), key=str) if self.distinct is not None else None,
+            'null_count': to_python(self.null_count),
+            'min': to_python(self.min),
+            'max': to_python(self.max),
+        }
+
+    @classmethod
+    def from_dict(cls, values: Dict) -> 'DqColumnStats':
+        return cls(
+            distinct=set(values['distinct']) if values.get('distinct') is not None else None,
+            null_count=values.get('null_count'),
+            min=values.get('min'),
+            max=values.get('max')
+        )
+
+
+@dataclass
+class DqPredicateStats:
+    unexpected_count: int = 0
+    unexpected_rows: List[Dict] = field(default_factory=list)
+
+    # the max number of unexpected rows kept as a sample (partial_unexpected_list in ge library)
+    max_unexpected_rows = 20
+
+    def merge(self, other: 'DqPredicateStats') -> 'DqPredicateStats':
+        return DqPredicateStats(
+            unexpected_count=self.unexpected_count + other.unexpected_count,
+            unexpected_rows=(self.unexpected_rows + other.unexpected_rows)[:self.max_unexpected_rows]
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            'unexpected_count': to_python(self.unexpected_count),
+            'unexpected_rows': [{key: to_python(value) for key, value in row.items()}
+                                for row in self.unexpected_rows]
+        }
+
+    @classmethod
+    def from_dict(cls, values: Dict) -> 'DqPredicateStats':
+        return cls(unexpected_count=values['unexpected_count'], unexpected_rows=values['unexpected_rows'])
+
+
+@dataclass
+class DqStats:
+    columns: List[str]
+    dtypes: Dict[str, str] = field(default_factory=dict)
+    row_count: Optional[int] = None
+    column_stats: Dict[str, DqColumnStats] = field(default_factory=dict)
+    execution_mode: str = 'exact'
+    sample_fraction: Optional[float] = None
+    predicate_stats: Dict[str, DqPredicateStats] = field(default_factory=dict)
+
+    def covers(self, plan: Dict[str, Set[str]], predicates: Dict[str, DqRowPredicate] = None) -> bool:
+        """
+        Check that all planned statistics can be merged into these statistics
+        :param plan: dict {column name: set of statistics}
+        :param predicates: dict {predicate: DqRowPredicate} of the row predicate expectations
+        :return: bool
+        """
+        if any(predicate not in self.predicate_stats for predicate in (predicates or {})):
+            return False
+        for column, column_stats in plan.items():
+            if column not in self.column_stats or not column_stats.issubset(DqColumnStats.mergeable_stats):
+                return False
+            if any(getattr(self.column_stats[column], stat) is None and stat in ('distinct', 'null_count')
+                   for stat in column_stats):
+                return False
+        return True
+
+    def merge(self, other: 'DqStats') -> 'DqStats':
+        """
+        Merge statistics of the already validated rows (self) with the statistics of new rows (other)
+        :param other: statistics of new rows (only its columns are kept)
+        :return: DqStats of all rows
+        """
+        return DqStats(
+            columns=other.columns,
+            dtypes=other.dtypes,
+            row_count=(self.row_count or 0) + (other.row_count or 0),
+            column_stats={
+                column: self.column_stats[column].merge(column_stats) if column in self.column_stats else column_stats
+                for column, column_stats in other.column_stats.items()
+            },
+            execution_mode=other.execution_mode,
+            sample_fraction=other.sample_fraction,
+            predicate_stats={
+                predicate: self.predicate_stats[predicate].merge(predicate_stats)
+                if predicate in self.predicate_stats else predicate_stats
+                for predicate, predicate_stats in other.predicate_stats.items()
+            }
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'row_count': to_python(self.row_count),
+            'column_stats': {column: column_stats.to_dict() for column, column_stats in self.column_stats.items()},
+            'predicate_stats': {predicate: predicate_stats.to_dict()
+                                for predicate, predicate_stats in self.predicate_stats.items()}
+        }, default=str)
+
+    @classmethod
+    def from_json(cls, value: str) -> 'DqStats':
+        values = json.loads(value)
+        return cls(
+            columns=list(values['column_stats']),
+            row_count=values['row_count'],
+            column_stats={column: DqColumnStats.from_dict(column_stats)
+                          for column, column_stats in values['column_stats'].items()},
+            predicate_stats={predicate: DqPredicateStats.from_dict(predicate_stats)
+                             for predicate, predicate_stats in values.get('predicate_stats', {}).items()}
+        )
+
+
+def to_python(value):
+    """
+    Convert numpy / pandas scalar to python value (None for missing values)
+    """
+    if value is None:
+        return None
+    if isinstance(value, np.generic):
+        value = value.item()
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+def get_observed_categories(series: pd.Series) -> pd.Index:
+    """
+    The categories of the categorical series which are present in it (counted on the category codes,
+    the values are not compared)
+    """
+    codes = series.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(series.cat.categories))
+    return series.cat.categories[counts > 0]
+
+
+def merge_value(first, second, function):
+    """
+    Merge two values (min/max) ignoring missing values
+    """
+    first, second = to_python(first), to_python(second)
+    if first is None:
+        return second
+    if second is None:
+        return first
+    return function(first, second)
+
+
+class DqStateStore:
+
+    def __init__(self, connector, table_name: str = "dq_column_state"):
+        """
+        Keeps mergeable per-column statistics of already validated rows in DB (for incremental DQ)
+        keyed by the table and the watermark column
+        :param connector: connector to DB
+        :param table_name: the name of the table with the column states
+        """
+        self.connector = connector
+        self.table_name = table_name
+        self.connector.execute(f'CREATE TABLE IF NOT EXISTS {self.table_name} ('
+                               f'table_name TEXT NOT NULL, '
+                               f'watermark_column TEXT NOT NULL, '
+                               f'watermark TEXT, '
+                               f'state TEXT NOT NULL, '
+                               f'ts TEXT NOT NULL, '
+                               f'PRIMARY KEY (table_name, watermark_column))')
+
+    def load(self, table_name: str, watermark_column: str) -> Optional[tuple]:
+        """
+        Load the state of the last run
+        :param table_name: the name of the table for the DQ report
+        :param watermark_column: the column which defines the new rows (values only grow)
+        :return: tuple (watermark, DqStats) or None if there is no state
+        """
+        row = self.connector.execute(f'SELECT watermark, state FROM {self.table_name} '
+                                     f'WHERE table_name = ? AND watermark_column = ?',
+                                     (table_name, watermark_column)).fetchone()
+        if row is None:
+            return None
+        watermark = json.loads(row[0]) if row[0] is not None else None
+        if not isinstance(watermark, dict):
+            # the state of an untyped watermark (text values compared alphabetically): all rows are validated again
+            return None
+        return self.load_watermark(watermark), DqStats.from_json(row[1])
+
+    def save(self, table_name: str, watermark_column: str, watermark, stats: DqStats):
+        """
+        Save the state of the current run (one commit)
+        :param table_name: the name of the table for the DQ report
+        :param watermark_column: the column which defines the new rows
+        :param watermark: the max value of the watermark column over all validated rows
+        :param stats: the merged statistics of all validated rows
+        :return: None
+        """
+        self.connector.execute(f'INSERT OR REPLACE INTO {self.table_name} '
+                               f'(table_name, watermark_column, watermark, state, ts) VALUES (?, ?, ?, ?, ?)',
+                               (table_name, watermark_column, json.dumps(self.dump_watermark(watermark)),
+                                stats.to_json(), str(datetime.now())))
+        self.connector.commit()
+
+    @staticmethod
+    def dump_watermark(watermark) -> Dict:
+        """
+        Get the watermark with its type (the value is restored with the same type)
+        :param watermark: numeric or datetime value
+        :return: dict {type, value}
+        """
+        value = to_python(watermark)
+        if isinstance(value, datetime):
+            return {'type': 'datetime', 'value': pd.Timestamp(value).isoformat()}
+        if isinstance(value, date):
+            return {'type': 'date', 'value': value.isoformat()}
+        if isinstance(value, Decimal):
+            return {'type': 'decimal', 'value': str(value)}
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return {'type': type(value).__name__, 'value': value}
+        raise ValueError(f"Watermark must be numeric or datetime, got '{type(watermark).__name__}'")
+
+    @staticmethod
+    def load_watermark(watermark: Dict):
+        """
+        Restore the watermark saved by dump_watermark
+        :param watermark: dict {type, value}
+        :return: pd.Timestamp, date, Decimal, int or float
+        """
+        loaders = {'datetime': pd.Timestamp, 'date': date.fromisoformat, 'decimal': Decimal, 'int': int, 'float': float}
+        return loaders[watermark['type']](watermark['value'])
+
+
+class DqResultCache:
+
+    def __init__(self, path_to_db: str = None, max_size: int = 1024, ttl: float = None,
+                 table_name: str = "dq_result_cache", persistent: bool = True):
+        """
+        Cache of expectation results keyed by (data frame fingerprint, expectation type, kwargs, execution mode):
+        in-memory LRU tier + persistent SQLite tier, both with optional TTL
+        :param path_to_db: the path to the DB of the persistent tier (the pipeline DB by default)
+        :param max_size: the max number of results in the in-memory tier (least recently used are evicted)
+        :param ttl: time to live of the cached results in seconds (None - results never expire)
+        :param table_name: the name of the table of the persistent tier
+        :param persistent: use the persistent SQLite tier
+        """
+        self.path_to_db = path_to_db if path_to_db else DataQuality.get_path_to_db()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.table_name = table_name
+        self.persistent = persistent
+        self.memory: OrderedDict = OrderedDict()
+        self.lock = threading.RLock()
+        self.table_checked = False
+
+    def __getstate__(self):
+        # the cache is passed to worker processes without the lock and the in-memory tier
+        state = self.__dict__.copy()
+        state['memory'] = OrderedDict()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Pooled connection to the DB of the persistent tier (the table is created on the first use)
+        :return: sqlite3 connection
+        """
+        with get_connection_pool(self.path_to_db).connection() as connector:
+            if not self.table_checked:
+                connector.execute(f'CREATE TABLE IF NOT EXISTS {self.table_name} '
+                                  f'(key TEXT PRIMARY KEY, result TEXT NOT NULL, created REAL NOT NULL)')
+                self.table_checked = True
+            yield connector
+
+    @staticmethod
+    def get_key(fingerprint: str, expectation: DqExpectation, execution_mode: DqExecutionMode) -> str:
+        return hashlib.sha1(json.dumps(
+            [fingerprint, expectation.expectation_type, expectation.kwargs, str(execution_mode)],
+            sort_keys=True, default=str
+        ).encode()).hexdigest()
+
+    def is_expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def get(self, key: str) -> Optional[Dict]:
+        """
+        Get cached result (in-memory tier first, then persistent tier)
+        :param key: the cache key
+        :return: dict {success, result} or None
+        """
+        with self.lock:
+            if key in self.memory:
+                created, value = self.memory[key]
+                if not self.is_expired(created):
+                    self.memory.move_to_end(key)
+                    return value
+                del self.memory[key]
+
+            if not self.persistent:
+                return None
+            with self.connection() as connector:
+                row = connector.execute(f'SELECT result, created FROM {self.table_name} WHERE key = ?',
+                                        (key,)).fetchone()
+            if row is None or self.is_expired(row[1]):
+                return None
+            value = json.loads(row[0])
+            self.put_memory(key, value, row[1])
+            return value
+
+    def put(self, results: Dict[str, Dict]):
+        """
+        Save results to both tiers (one commit for the persistent tier, expired results are removed)
+        :param results: dict {key: dict {success, result}}
+        :return: None
+        """
+        with self.lock:
+            created = time.time()
+            for key, value in results.items():
+                self.put_memory(key, value, created)
+
+            if not self.persistent or not results:
+                return
+            with self.connection() as connector:
+                connector.executemany(
+                    f'INSERT OR REPLACE INTO {self.table_name} (key, result, created) VALUES (?, ?, ?)',
+                    [(key, json.dumps(value, default=str), created) for key, value in results.items()]
+                )
+                if self.ttl is not None:
+                    connector.execute(f'DELETE FROM {self.table_name} WHERE created < ?', (created - self.ttl,))
+                connector.commit()
+
+    def put_memory(self, key: str, value: Dict, created: float):
+        self.memory[key] = (created, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_size:
+            self.memory.popitem(last=False)
+
+    @staticmethod
+    def get_fingerprint(df) -> str:
+        """
+        Content fingerprint of the data frame (schema + order independent hash of all rows)
+        :param df: DataFrame (Spark or Pandas)
+        :return: hex digest
+        """
+        if is_spark_df(df):
+            from pyspark.sql import functions as F
+
+            row = df.agg(
+                F.count(F.lit(1)).alias('rows'),
+                F.sum(F.xxhash64(*[F.col(column) for column in df.columns]).cast('decimal(38,0)')).alias('hash')
+            ).collect()[0]
+            content = f"{row['rows']}:{row['hash']}"
+            schema = df.schema.simpleString()
+        else:
+            # sum of the row hashes mod 2**64 (uint64 sum wraps around) as the sum of xxhash64 for Spark
+            row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+            content = f"{len(row_hashes)}:{row_hashes.sum(dtype=np.uint64)}"
+            schema = json.dumps([(column, str(dtype)) for column, dtype in df.dtypes.items()], default=str)
+        return hashlib.sha1(f'{schema}|{content}'.encode()).hexdigest()
+
+
+class DqSuiteCompiler:
+    # column statistics required by the expectation types which are resolved from the data
+    required_stats: Dict[str, List[str]] = {
+        'expect_column_distinct_values_to_be_in_set': ['distinct'],
+        'expect_column_values_to_not_be_null': ['null_count'],
+        'expect_column_min_to_be_between': ['min'],
+        'expect_column_max_to_be_between': ['max'],
+        'expect_table_row_count_to_be_between': [],
+        'expect_column_unique_value_count_to_be_between': ['distinct_count'],
+        'expect_column_median_to_be_between': ['median'],
+    }
+    # expectation types which are resolved from the data frame schema only (no Spark action / pandas scan)
+    schema_expectation_types: Set[str] = {
+        'expect_column_to_exist',
+        'expect_column_values_to_be_of_type',
+        'expect_table_columns_to_match_ordered_list',
+    }
+    # the order of the stats passes (cheap passes first)
+    pass_cost: Dict[str, int] = {'sample': 0, 'approx': 1, 'exact': 2}
+
+    def __init__(self, tracer: DqTracer = None, parallel_engine: 'DqParallelEngine' = None):
+        """
+        Collects expectations of the suite, plans the column statistics they need,
+        computes the statistics in one aggregation pass and resolves all expectations from them
+        :param tracer: measures the passes and expectations (wall time, rows scanned, Spark jobs, memory delta)
+        :param parallel_engine: evaluates the passes over large Pandas data frames on a process pool
+        """
+        self.expectations: List[DqExpectation] = []
+        self.stats: Dict[str, DqStats] = {}
+        self.tracer = tracer if tracer else DqTracer()
+        self.parallel_engine = parallel_engine
+        # span of the pass of every execution mode of the last run
+        self.spans: Dict[str, DqSpan] = {}
+        # expectations skipped by the last fail fast run
+        self.skipped: List[DqExpectation] = []
+        # statistics of the validated rows before the watermark of the last incremental run
+        self.state_stats: Optional[DqStats] = None
+
+    def add(self, expectation_type: str, kwargs: Dict, exception: DqException,
+            execution_mode: DqExecutionMode = None, predicate: DqRowPredicate = None):
+        """
+        Register expectation in the suite (it is evaluated on run)
+        :param expectation_type: the name of the expectation
+        :param kwargs: the expectation arguments (saved to the DQ report)
+        :param exception: the exception type (error or warning) and message
+        :param execution_mode: the execution mode of the expectation (None - the suite execution mode)
+        :param predicate: the row predicate of the custom expectation (no rows are expected to match it)
+        :return: None
+        """
+        expectation = DqExpectation(expectation_type, kwargs, exception, execution_mode, predicate)
+
+        # skip identical checks
+        if expectation not in self.expectations:
+            self.expectations.append(expectation)
+
+    def plan(self, columns: List[str], expectations: List[DqExpectation]) -> Dict[str, Set[str]]:
+        """
+        Plan the statistics required by the expectations
+        :param columns: the list of the data frame columns
+        :param expectations: the list of the expectations
+        :return: dict {column name: set of statistics}
+        """
+        plan: Dict[str, Set[str]] = {}
+        for expectation in expectations:
+            column = expectation.kwargs.get('column')
+            stats = self.required_stats.get(expectation.expectation_type, [])
+            if stats and column in columns:
+                plan.setdefault(column, set()).update(stats)
+        return plan
+
+    @staticmethod
+    def plan_predicates(columns: List[str], expectations: List[DqExpectation]) -> Dict[str, DqRowPredicate]:
+        """
+        Plan the row predicates to evaluate (identical predicates are evaluated once)
+        :param columns: the list of the data frame columns
+        :param expectations: the list of the expectations
+        :return: dict {predicate: DqRowPredicate} (predicates with missing columns are skipped)
+        """
+        return {
+            str(e.predicate): e.predicate for e in expectations
+            if e.predicate is not None and e.predicate.columns().issubset(columns)
+        }
+
+    def data_expectations(self) -> List[DqExpectation]:
+        """
+        Get registered expectations which are resolved from the data (not from the schema)
+        :return: list of DqExpectation
+        """
+        return [e for e in self.expectations if e.expectation_type not in self.schema_expectation_types]
+
+    def run(self, df, execution_mode: DqExecutionMode = None, base_stats: DqStats = None,
+            required_plan: Dict[str, Set[str]] = None, fail_fast: bool = False,
+            profile: DqStats = None, boundary_df=None) -> List[tuple]:
+        """
+        Evaluate all registered expectations: schema expectations are resolved from the schema only,
+        all others with one pass over the data frame per execution mode (skipped if there are no such expectations),
+        cheap passes first (schema, sample, approx, exact)
+        :param df: DataFrame (Spark or Pandas)
+        :param execution_mode: the execution mode of the suite (exact by default)
+        :param base_stats: statistics of the already validated rows to merge with (incremental DQ, exact mode only)
+        :param required_plan: additional statistics to compute in the same pass
+        :param fail_fast: skip the remaining passes after a failed expectation with error exception
+                          (the skipped expectations are not in the results)
+        :param profile: the statistics of the profile of df (DqProfile.to_stats()): the column statistics
+                        of exact and approx passes are taken from the profile, only the rest is computed
+        :param boundary_df: the rows at the watermark which are validated with df (incremental DQ): they are
+                            validated again on the next run, so only the statistics of df merged with base_stats
+                            are kept in self.state_stats
+        :return: list of tuples (result, exception) in the registration order
+        """
+        execution_mode = execution_mode if execution_mode else DqExecutionMode.exact()
+        schema = self.get_schema(df)
+        self.stats: Dict[str, DqStats] = {}
+        self.state_stats = None
+        self.spans: Dict[str, DqSpan] = {}
+
+        # identical checks (with different exceptions) are evaluated once
+        resolved = {}
+        data_expectations: Dict[DqExecutionMode, List[DqExpectation]] = {}
+        for expectation in self.expectations:
+            if expectation.expectation_type in self.schema_expectation_types:
+                key = self.get_key(expectation)
+                if key not in resolved:
+                    with self.tracer.span('dq.expectation', expectation_type=expectation.expectation_type,
+                                          kwargs=key[1]) as span:
+                        resolved[key] = self.resolve(expectation, schema)
+                    resolved[key].result.update(span.to_result(), rows_scanned=0)
+            else:
+                mode = expectation.execution_mode if expectation.execution_mode else execution_mode
+                data_expectations.setdefault(mode, []).append(expectation)
+
+        for mode, expectations in sorted(data_expectations.items(), key=lambda item: self.pass_cost[item[0].mode]):
+            if fail_fast and self.has_error_failure(resolved, execution_mode):
+                break
+            if base_stats is not None and mode.mode != 'exact':
+                raise ValueError(f"Incremental DQ supports 'exact' execution mode only, got '{mode}'")
+
+            plan = self.plan(schema.columns, expectations)
+            for column, column_stats in (required_plan or {}).items():
+                plan.setdefault(column, set()).update(column_stats)
+
+            predicates = self.plan_predicates(schema.columns, expectations)
+            # the profile of another schema is not used
+            use_profile = profile is not None and base_stats is None and mode.mode != 'sample' \
+                and profile.dtypes == schema.dtypes
+            profiled = self.get_profiled_stats(profile, plan) if use_profile else {}
+            plan = {column: column_stats for column, column_stats in plan.items() if column not in profiled}
+
+            stats = DqStats(columns=schema.columns, dtypes=schema.dtypes)
+            with self.tracer.span('dq.stats_pass', df, execution_mode=str(mode), expectations=len(expectations)) \
+                    as span:
+                if plan or predicates or not use_profile:
+                    self.compute_stats(mode.apply(df), plan, stats, mode, predicates, self.parallel_engine)
+                    if boundary_df is not None:
+                        self.state_stats = base_stats.merge(stats) if base_stats is not None else stats
+                        boundary_stats = DqStats(columns=schema.columns, dtypes=schema.dtypes)
+                        self.compute_stats(mode.apply(boundary_df), plan, boundary_stats, mode, predicates,
+                                           self.parallel_engine)
+                        stats = stats.merge(boundary_stats)
+                    # the rows of this pass only (not the merged rows of the incremental state)
+                    rows_scanned = stats.row_count
+                else:
+                    # all statistics are in the profile: the data is not touched
+                    stats.row_count = profile.row_count
+                    rows_scanned = 0
+                stats.column_stats.update(profiled)
+            if base_stats is not None:
+                stats = base_stats.merge(stats)
+            self.stats[str(mode)] = stats
+            self.spans[str(mode)] = span
+
+            # the expectations of one pass share its metrics
+            for expectation in expectations:
+                key = self.get_key(expectation, mode)
+                if key not in resolved:
+                    resolved[key] = self.resolve(expectation, stats)
+                    resolved[key].result.update(span.to_result(), rows_scanned=rows_scanned)
+                    self.tracer.emit('dq.expectation', span, expectation_type=expectation.expectation_type,
+                                     kwargs=key[1], rows_scanned=rows_scanned)
+
+        results = []
+        self.skipped = []
+        for expectation in self.expectations:
+            key = self.get_expectation_key(expectation, execution_mode)
+            if key not in resolved:
+                self.skipped.append(expectation)
+                continue
+            results.append((resolved[key], expectation.exception))
+        if self.skipped:
+            warnings.warn('\033[33m' + f"\nFail fast: {len(self.skipped)} expectations are skipped after an error"
+                          + '\033[m')
+        self.expectations = []
+        return results
+
+    def get_expectation_key(self, expectation: DqExpectation, execution_mode: DqExecutionMode) -> tuple:
+        if expectation.expectation_type in self.schema_expectation_types:
+            return self.get_key(expectation)
+        return self.get_key(expectation, expectation.execution_mode or execution_mode)
+
+    def has_error_failure(self, resolved: Dict[tuple, Any], execution_mode: DqExecutionMode) -> bool:
+        """
+        Check if any already resolved expectation with error exception failed
+        :param resolved: dict {key: result} of the resolved expectations
+        :param execution_mode: the execution mode of the suite
+        :return: bool
+        """
+        for expectation in self.expectations:
+            if not expectation.exception.is_error:
+                continue
+            result = resolved.get(self.get_expectation_key(expectation, execution_mode))
+            if result is not None and not result.success:
+                return True
+        return False
+
+    @staticmethod
+    def get_profiled_stats(profile: DqStats, plan: Dict[str, Set[str]]) -> Dict[str, DqColumnStats]:
+        """
+        Get the planned column statistics which are in the profile
+        :param profile: the statistics of the profile
+        :param plan: dict {column name: set of statistics}
+        :return: dict {column name: DqColumnStats} of the columns with all planned statistics in the profile
+        """
+        return {
+            column: profile.column_stats[column] for column, column_stats in plan.items()
+            if column in profile.column_stats
+            and all(getattr(profile.column_stats[column], stat) is not None for stat in column_stats)
+        }
+
+    @staticmethod
+    def get_unexpected_predicate(expectation: DqExpectation) -> Optional[DqRowPredicate]:
+        """
+        Get the predicate of the unexpected rows of the expectation
+        :param expectation: registered expectation
+        :return: DqRowPredicate (None - the expectation is not evaluated row by row, e.g. min/max)
+        """
+        column = expectation.kwargs.get('column')
+        if expectation.predicate is not None:
+            return expectation.predicate
+        if expectation.expectation_type == 'expect_column_values_to_not_be_null':
+            return DqRowPredicate.where(column, 'is null')
+        if expectation.expectation_type == 'expect_column_distinct_values_to_be_in_set':
+            return DqRowPredicate.where(column, 'not in', expectation.kwargs['value_set'])
+        return None
+
+    @staticmethod
+    def get_key(expectation: DqExpectation, execution_mode: DqExecutionMode = None) -> tuple:
+        return expectation.expectation_type, json.dumps(expectation.kwargs, sort_keys=True, default=str), \
+            str(execution_mode)
+
+    @staticmethod
+    def get_schema(df) -> DqStats:
+        """
+        Get columns and types of the data frame (metadata only, no Spark action / pandas scan)
+        :param df: DataFrame (Spark or Pandas)
+        :return: DqStats with columns and dtypes only
+        """
+        if is_spark_df(df):
+            dtypes = dict(df.dtypes)
+        else:
+            dtypes = {column: str(dtype) for column, dtype in df.dtypes.items()}
+        return DqStats(columns=list(df.columns), dtypes=dtypes)
+
+    @classmethod
+    def compute_stats(cls, df, plan: Dict[str, Set[str]], stats: DqStats,
+                      execution_mode: DqExecutionMode = None, predicates: Dict[str, DqRowPredicate] = None,
+                      parallel_engine: 'DqParallelEngine' = None) -> DqStats:
+        """
+        Compute all planned statistics in one pass (one agg for Spark, one vectorized pass for Pandas)
+        :param df: DataFrame (Spark or Pandas), already sampled for 'sample' mode
+        :param plan: dict {column name: set of statistics}
+        :param stats: DqStats to fill in
+        :param execution_mode: the execution mode (exact by default)
+        :param predicates: dict {predicate: DqRowPredicate} to count the unexpected rows for
+        :param parallel_engine: evaluates the pass over the chunks of a large Pandas data frame in parallel
+        :return: DqStats
+        """
+        execution_mode = execution_mode if execution_mode else DqExecutionMode.exact()
+        stats.execution_mode = str(execution_mode)
+        stats.sample_fraction = execution_mode.fraction if execution_mode.mode == 'sample' else None
+
+        if is_spark_df(df):
+            return cls.compute_stats_spark(df, plan, stats, execution_mode, predicates or {})
+
+        # there are no sketches for Pandas: approximate statistics are computed exactly
+        if execution_mode.mode == 'approx':
+            stats.execution_mode = str(DqExecutionMode.exact())
+        if parallel_engine is not None and parallel_engine.accepts(df):
+            return parallel_engine.compute_stats_pandas(df, plan, stats, predicates or {})
+        return cls.compute_stats_pandas(df, plan, stats, predicates or {})
+
+    @staticmethod
+    def compute_stats_pandas(df: pd.DataFrame, plan: Dict[str, Set[str]], stats: DqStats,
+                             predicates: Dict[str, DqRowPredicate]) -> DqStats:
+        stats.row_count = df.shape[0]
+        for key, predicate in predicates.items():
+            mask = predicate.to_mask(df)
+            stats.predicate_stats[key] = DqPredicateStats(
+                unexpected_count=int(mask.sum()),
+                unexpected_rows=[
+                    {column: to_python(value) for column, value in unexpected_row.items()}
+                    for unexpected_row in df.loc[mask].head(DqPredicateStats.max_unexpected_rows).to_dict('records')
+                ]
+            )
+
+        null_columns = [column for column, column_stats in plan.items() if 'null_count' in column_stats]
+        min_max_columns = [column for column, column_stats in plan.items() if column_stats & {'min', 'max'}]
+
+        # distinct values, distinct count and min/max of categorical columns are taken from the observed categories
+        categories = {column: get_observed_categories(df[column]) for column in plan
+                      if isinstance(df[column].dtype, pd.CategoricalDtype)}
+        min_max_columns = [column for column in min_max_columns if column not in categories]
+
+        null_counts = df[null_columns].isna().sum() if null_columns else {}
+        min_max = df[min_max_columns].agg(['min', 'max']) if min_max_columns else None
+
+        for column, column_stats in plan.items():
+            values = categories.get(column)
+            stats.column_stats[column] = DqColumnStats(
+                distinct=(set(values) if values is not None else set(df[column].dropna().unique()))
+                if 'distinct' in column_stats else None,
+                null_count=int(null_counts[column]) if 'null_count' in column_stats else None,
+                min=(values.min() if values is not None else min_max.at['min', column])
+                if 'min' in column_stats else None,
+                max=(values.max() if values is not None else min_max.at['max', column])
+                if 'max' in column_stats else None,
+                distinct_count=(len(values) if values is not None else int(df[column].nunique()))
+                if 'distinct_count' in column_stats else None,
+                median=df[column].median() if 'median' in column_stats else None
+            )
+        return stats
+
+    @staticmethod
+    def compute_stats_spark(df: 'SparkDataFrame', plan: Dict[str, Set[str]], stats: DqStats,
+                            execution_mode: DqExecutionMode, predicates: Dict[str, DqRowPredicate]) -> DqStats:
+        from pyspark.sql import functions as F
+
+        approx = execution_mode.mode == 'approx'
+        aggregations = {
+            'distinct': lambda column: F.collect_set(F.col(column)),
+            'null_count': lambda column: F.sum(F.when(F.col(column).isNull(), 1).otherwise(0)),
+            'min': lambda column: F.min(F.col(column)),
+            'max': lambda column: F.max(F.col(column)),
+            'distinct_count': lambda column: F.approx_count_distinct(F.col(column), execution_mode.relative_sd)
+            if approx else F.countDistinct(F.col(column)),
+            'median': lambda column: F.percentile_approx(F.col(column), 0.5, execution_mode.accuracy)
+            if approx else F.expr(f'percentile(`{column}`, 0.5)'),
+        }
+
+        # build one aggregation for all columns and statistics
+        expressions = [F.count(F.lit(1)).alias('row_count')]
+        aliases = {}
+        for column_index, (column, column_stats) in enumerate(plan.items()):
+            for stat in column_stats:
+                alias = f'c{column_index}_{stat}'
+                aliases[(column, stat)] = alias
+                expressions.append(aggregations[stat](column).alias(alias))
+        compiled = {key: predicate.to_column() for key, predicate in predicates.items()}
+        for predicate_index, column in enumerate(compiled.values()):
+            expressions.append(F.sum(F.when(column, 1).otherwise(0)).alias(f'p{predicate_index}_unexpected'))
+        row = df.agg(*expressions).collect()[0]
+
+        stats.row_count = row['row_count']
+        for predicate_index, (key, column) in enumerate(compiled.items()):
+            unexpected_count = row[f'p{predicate_index}_unexpected'] or 0
+            # the sample of unexpected rows is collected for failed predicates only
+            unexpected_rows = [
+                unexpected_row.asDict()
+                for unexpected_row in df.filter(column).limit(DqPredicateStats.max_unexpected_rows).collect()
+            ] if unexpected_count else []
+            stats.predicate_stats[key] = DqPredicateStats(unexpected_count, unexpected_rows)
+        for column, column_stats in plan.items():
+            values = {stat: row[aliases[(column, stat)]] for stat in column_stats}
+            stats.column_stats[column] = DqColumnStats(
+                distinct=set(values['distinct']) if 'distinct' in values else None,
+                null_count=values.get('null_count'),
+                min=values.get('min'),
+                max=values.get('max'),
+                distinct_count=values.get('distinct_count'),
+                median=values.get('median')
+            )
+        return stats
+
+    @staticmethod
+    def resolve(expectation: DqExpectation, stats: DqStats):
+        """
+        Resolve expectation from the computed statistics
+        :param expectation: registered expectation
+        :param stats: the statistics of the data frame
+        :return: result in the same format as ExpectationValidationResult from ge library
+        """
+        kwargs = expectation.kwargs
+        column = kwargs.get('column')
+        result = {}
+        if expectation.expectation_type not in DqSuiteCompiler.schema_expectation_types:
+            result = {'execution_mode': stats.execution_mode, 'sample_size': stats.row_count}
+
+        if expectation.predicate is not None:
+            predicate_stats = stats.predicate_stats.get(str(expectation.predicate))
+            if predicate_stats is None:
+                # the columns of the predicate do not exist in the data frame
+                success = False
+                observed_value = None
+            else:
+                observed_value = predicate_stats.unexpected_count
+                success = observed_value == 0
+                result.update(
+                    unexpected_count=predicate_stats.unexpected_count,
+                    partial_unexpected_list=predicate_stats.unexpected_rows
+                )
+        elif expectation.expectation_type == 'expect_column_to_exist':
+            success = column in stats.dtypes
+            observed_value = None
+        elif expectation.expectation_type == 'expect_table_columns_to_match_ordered_list':
+            observed_value = stats.columns
+            success = observed_value == list(kwargs['column_list'])
+        elif expectation.expectation_type == 'expect_column_values_to_be_of_type':
+            observed_value = stats.dtypes.get(column)
+            success = observed_value is not None and observed_value.lower() == kwargs['type_'].lower()
+        elif expectation.expectation_type == 'expect_table_row_count_to_be_between':
+            # estimate the number of rows from the sample size
+            observed_value = round(stats.row_count / stats.sample_fraction) if stats.sample_fraction \
+                else stats.row_count
+            success = is_between(observed_value, kwargs.get('min_value'), kwargs.get('max_value'))
+        elif column not in stats.column_stats:
+            # the column does not exist in the data frame
+            success = False
+            observed_value = None
+        elif expectation.expectation_type == 'expect_column_distinct_values_to_be_in_set':
+            observed_value = sorted(stats.column_stats[column].distinct, key=str)
+            success = set(observed_value).issubset(kwargs['value_set'])
+        elif expectation.expectation_type == 'expect_column_values_to_not_be_null':
+            observed_value = stats.column_stats[column].null_count
+            success = observed_value == 0
+        elif expectation.expectation_type == 'expect_column_min_to_be_between':
+            observed_value = stats.column_stats[column].min
+            success = is_between(observed_value, kwargs.get('min_value'), kwargs.get('max_value'))
+        elif expectation.expectation_type == 'expect_column_max_to_be_between':
+            observed_value = stats.column_stats[column].max
+            success = is_between(observed_value, kwargs.get('min_value'), kwargs.get('max_value'))
+        elif expectation.expectation_type == 'expect_column_unique_value_count_to_be_between':
+            observed_value = stats.column_stats[column].distinct_count
+            success = is_between(observed_value, kwargs.get('min_value'), kwargs.get('max_value'))
+        elif expectation.expectation_type == 'expect_column_median_to_be_between':
+            observed_value = stats.column_stats[column].median
+            success = is_between(observed_value, kwargs.get('min_value'), kwargs.get('max_value'))
+        else:
+            raise ValueError(f"Expectation '{expectation.expectation_type}' is not supported by suite compiler")
+
+        return DataQuality.get_dq_result(
+            success=success,
+            expectation_type=expectation.expectation_type,
+            kwargs=kwargs,
+            observed_value=observed_value,
+            **result
+        )
+
+
+def is_between(value, min_value, max_value) -> bool:
+    """
+    Check that value is between min_value and max_value (None means no bound)
+    """
+    if value is None or pd.isna(value):
+        return False
+    if min_value is not None and value < min_value:
+        return False
+    if max_value is not None and value > max_value:
+        return False
+    return True
+
+
+class DqStreamAccumulator:
+
+    def __init__(self):
+        """
+        Accumulates mergeable partial DQ results of the data frame chunks (streaming DQ):
+        statistics of data expectations are merged chunk by chunk, results of custom checks are merged
+        with AND (the check passes only if it passes for all chunks); expectations are resolved on finalize
+        """
+        self.expectations: List[DqExpectation] = []
+        self.schema: Optional[DqStats] = None
+        self.stats: Optional[DqStats] = None
+        self.custom_results: Dict[tuple, tuple] = {}
+        self.chunks = 0
+        # the metrics of the passes over all chunks (shared by the data expectations)
+        self.metrics: Dict[str, Any] = {}
+
+    def add_chunk(self, suite: 'DqSuiteCompiler', df, execution_mode: DqExecutionMode):
+        """
+        Compute statistics of the chunk for the registered expectations and merge them with the previous chunks
+        :param suite: the suite with registered expectations
+        :param df: the chunk (DataFrame)
+        :param execution_mode: the execution mode of the suite
+        :return: None
+        """
+        for expectation in suite.expectations:
+            mode = expectation.execution_mode or execution_mode
+            if mode.mode != 'exact':
+                raise ValueError(f"Streaming DQ supports 'exact' execution mode only, got '{mode}'")
+            if expectation.expectation_type == 'expect_column_median_to_be_between':
+                raise ValueError("Median is not mergeable and is not supported by streaming DQ")
+            if expectation not in self.expectations:
+                self.expectations.append(expectation)
+
+        # distinct count is merged from distinct sets
+        required_plan = {
+            e.kwargs['column']: {'distinct'} for e in suite.data_expectations()
+            if e.expectation_type == 'expect_column_unique_value_count_to_be_between' and e.kwargs['column'] in df.columns
+        }
+        rows_before = self.stats.row_count if self.stats is not None else 0
+        suite.run(df, DqExecutionMode.exact(), base_stats=self.stats, required_plan=required_plan)
+        self.stats = suite.stats.get(str(DqExecutionMode.exact()), self.stats)
+        span = suite.spans.get(str(DqExecutionMode.exact()))
+        if span is not None:
+            self.add_metrics(dict(span.to_result(), rows_scanned=self.stats.row_count - rows_before))
+        self.schema = suite.get_schema(df)
+        self.chunks += 1
+
+    def add_metrics(self, metrics: Dict):
+        # durations, memory deltas and rows are summed, Spark job/stage ids are concatenated
+        for name, value in metrics.items():
+            if value is None:
+                continue
+            previous = self.metrics.get(name)
+            self.metrics[name] = value if previous is None else previous + value
+
+    def add_result(self, result, exception: DqException):
+        """
+        Merge result of the custom check for the chunk with the results of the previous chunks
+        :param result: result of DQ check
+        :param exception: the exception type (error or warning) and message
+        :return: None
+        """
+        result_details = getattr(result, 'result', None) or {}
+        key = (result.expectation_config.expectation_type,
+               json.dumps(result.expectation_config.kwargs, sort_keys=True, default=str),
+               exception.exception_message, exception.is_error)
+        if key in self.custom_results:
+            previous, _ = self.custom_results[key]
+            previous_details = getattr(previous, 'result', None) or {}
+            result_details = dict(
+                result_details,
+                sample_size=(previous_details.get('sample_size') or 0) + (result_details.get('sample_size') or 0)
+            )
+            result = DataQuality.get_dq_result(
+                success=previous.success and result.success,
+                expectation_type=result.expectation_config.expectation_type,
+                kwargs=result.expectation_config.kwargs,
+                **result_details
+            )
+        self.custom_results[key] = (result, exception)
+
+    def get_results(self) -> List[tuple]:
+        """
+        Resolve all expectations from the merged statistics of all chunks
+        :return: list of tuples (result, exception): custom checks first, then registered expectations
+        """
+        results = list(self.custom_results.values())
+        for expectation in self.expectations:
+            if expectation.expectation_type in DqSuiteCompiler.schema_expectation_types:
+                results.append((DqSuiteCompiler.resolve(expectation, self.schema), expectation.exception))
+            else:
+                result = DqSuiteCompiler.resolve(expectation, self.stats)
+                result.result.update(self.metrics)
+                results.append((result, expectation.exception))
+        return results
+
+    def dq_finalize(self, connector=None, cursor=None, table_name: str = None):
+        """
+        Save results of all chunks to DQ report and finalize (raise errors if exist and all warnings)
+        :param connector: connector to DB (to save DQ report)
+        :param cursor: cursor to DB (to save DQ report)
+        :param table_name: the name of the table for the DQ report
+        :return: None
+        """
+        dq = DataQuality(df=None, connector=connector, cursor=cursor, table_name=table_name)
+        for result, exception in self.get_results():
+            dq.add_result_to_report(result, exception)
+        dq.dq_finalize()
+
+
+class DqReportWriter:
+
+    def __init__(self, connector=None, cursor=None, store: DqReportStore = None, batch_size: int = None,
+                 flush_interval: float = None, service: DqReportService = None):
+        """
+        Buffered writer for the DQ report: records are kept in memory and written to DB in one transaction
+        :param connector: connector to DB (None - records are only buffered in memory)
+        :param cursor: cursor to DB
+        :param store: the DQ report store (dq_run / dq_result tables, created from connector if not passed)
+        :param batch_size: flush to DB when this number of records is buffered (None - flush on demand only)
+        :param flush_interval: flush to DB when this number of seconds passed since the last flush (None - disabled)
+        :param service: the DQ report service the records are submitted to (instead of connector)
+        """
+        self.service = service
+        self.connector = connector
+        self.cursor = connector.cursor() if connector and not cursor else cursor
+        self.store = store if store is not None or connector is None else DqReportStore(connector)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.records: List[Dict] = []
+        self.pending_records: List[Dict] = []
+        self.last_flush = time.monotonic()
+        # run_id of every (ts, table_name) run: the results of one run can be written by several flushes
+        self.run_ids: Dict[tuple, int] = {}
+        # finalize metrics of the runs written with the next flush
+        self.run_metrics: Dict[tuple, Dict] = {}
+        # failed records are counted on add (finalize does not filter the whole report)
+        self.error_records: List[Dict] = []
+        self.warning_records: List[Dict] = []
+
+    def add(self, record: Dict):
+        """
+        Add record to the report buffer (flush it if batch size or time window is reached)
+        :param record: DQ report record
+        :return: None
+        """
+        self.records.append(record)
+        self.pending_records.append(record)
+        if not record.get('success'):
+            (self.error_records if record.get('is_error') else self.warning_records).append(record)
+
+        if self.batch_size and len(self.pending_records) >= self.batch_size:
+            self.flush()
+        elif self.flush_interval is not None and time.monotonic() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+    def set_run_metrics(self, ts, table_name: str, metrics: Dict):
+        """
+        Set the metrics of the run finalize step (saved with the next flush of the run results)
+        :param ts: the run time
+        :param table_name: the name of the validated table
+        :param metrics: dict {duration_s, memory_delta_mb, spark_job_ids, spark_stage_ids}
+        :return: None
+        """
+        self.run_metrics[(str(ts), table_name)] = metrics
+
+    def flush(self):
+        """
+        Write all pending records to the report store with one commit (one run per ts and table name)
+        :return: None
+        """
+        # the metrics of the runs without results are saved with the first results of the run
+        if not (self.pending_records or set(self.run_metrics) & set(self.run_ids)):
+            return
+        if self.service is not None:
+            # the runs are registered by the service, the flush returns when the records are committed
+            self.run_ids, self.run_metrics = self.service.submit(self.pending_records, self.run_metrics,
+                                                                 self.run_ids).result()
+        else:
+            if self.store is None:
+                return
+            self.store.add_records(self.pending_records, self.run_ids, self.run_metrics)
+            self.store.connector.commit()
+
+        self.pending_records = []
+        self.last_flush = time.monotonic()
+
+
 class DataQuality:
+    dq_report_fields = [
+        'success',
+        'expectation_type',
+        'kwargs',
+        'description',
+        'ts',
+        'is_error',
+        'table_name',
+        'execution_mode',
+        'sample_size',
+        'cached',
+        'unexpected_count',
+        'partial_unexpected_list',
+        'duration_s',
+        'rows_scanned',
+        'spark_job_ids',
+        'spark_stage_ids',
+        'memory_delta_mb',
+        'row_id_column',
+        'unexpected_row_ids'
+    ]
 
-    def __init__(self, df, connector=None, cursor=None, table_name=None):
+    def __init__(self, df, connector=None, cursor=None, table_name=None, report_writer: DqReportWriter = None,
+                 report_batch_size: int = None, report_flush_interval: float = None,
+                 execution_mode: DqExecutionMode = None, incremental_watermark: str = None,
+                 result_cache: DqResultCache = None, stream_accumulator: DqStreamAccumulator = None,
+                 span_hook: Callable = None, fail_fast: bool = False, profile=None,
+                 report_service: DqReportService = None, row_id_column: str = None, max_row_ids: int = 10000,
+                 parallel_engine: 'DqParallelEngine' = None):
         """
         The class is created as example for core functionality of Data Quality checks
         :param df: DataFrame (Spark or Pandas)
         :param connector: connector to DB (to save DQ report)
         :param cursor: cursor to DB (to save DQ report)
         :param table_name: the name of the table for the DQ report
+        :param report_writer: the writer for the DQ report (created from connector if not passed)
+        :param report_batch_size: flush the DQ report to DB every N records (by default on dq_finalize only)
+        :param report_flush_interval: flush the DQ report to DB every N seconds (by default on dq_finalize only)
+        :param execution_mode: the execution mode of the suite: DqExecutionMode.exact() (default),
+                               DqExecutionMode.sample(fraction, seed) or DqExecutionMode.approx()
+        :param incremental_watermark: the numeric or datetime column which values only grow (e.g. parsed 'date'):
+                                      only rows added since the last run are validated and merged with the state
+                                      saved in DB
+        :param result_cache: the cache of expectation results (repeated validations of the same data
+                             are not evaluated again, the results are marked as cached in the DQ report)
+        :param stream_accumulator: the accumulator of the streaming DQ (df is one chunk of the data: results are
+                                   merged into the accumulator and saved to DQ report on its dq_finalize)
+        :param span_hook: callable(DqSpan) called for every stats pass, expectation and finalize step
+                          (e.g. OpenTelemetryHook() to export the spans to a local collector)
+        :param fail_fast: the suite is evaluated cheap passes first and a failed expectation with error exception
+                          skips the remaining (expensive) passes, the error is raised on dq_finalize
+        :param profile: the profile of df (DqProfile of data_quality/dq_profiler.py): the expectations
+                        are resolved from the profile, the data frame is scanned only for the statistics
+                        which are not in the profile
+        :param report_service: the DQ report service the results are submitted to when connector is not passed
+                               (the shared service of data/sales_pipeline.db by default)
+        :param row_id_column: the id column of the rows (e.g. 'invoice_id'): the ids of the unexpected rows of failed
+                              expectations are saved to the DQ report (None - the index labels, Pandas only)
+        :param max_row_ids: the max number of the saved ids of one expectation (0 - the ids are not saved)
+        :param parallel_engine: evaluates the stats passes of large Pandas data frames on a process pool
+                                (DqParallelEngine of data_quality/dq_parallel.py, shared by the suites)
         """
         self.df = df
-        self.df_ge = self.get_df_ge(df)
+        self._df_ge = None
         self.run_time = datetime.now()
-        self.dq_report_fields = [
-            'success',
-            'expectation_type',
-            'kwargs',
-            'description',
-            'ts',
-            'is_error',
-            'table_name'
-        ]
-        self.dq_report = pd.DataFrame(columns=self.dq_report_fields)
-        self.connector = self.get_connector() if not connector else connector
-        self.cursor = self.connector.cursor() if not cursor else cursor
+        if report_writer is None:
+            # without connector the results are written by the single writer service (no connection per instance)
+            self.connector = connector
+            self.cursor = self.connector.cursor() if connector and not cursor else cursor
+            report_writer = DqReportWriter(
+                connector=self.connector,
+                cursor=self.cursor,
+                batch_size=report_batch_size,
+                flush_interval=report_flush_interval,
+                service=None if connector else report_service if report_service else get_report_service()
+            )
+        else:
+            self.connector = report_writer.connector
+            self.cursor = report_writer.cursor
+        self.report_writer = report_writer
         self.table_name = table_name
+        self.execution_mode = execution_mode if execution_mode else DqExecutionMode.exact()
+        self.incremental_watermark = incremental_watermark
+        self.result_cache = result_cache
+        self.stream_accumulator = stream_accumulator
+        self.fail_fast = fail_fast
+        self.row_id_column = row_id_column
+        self.max_row_ids = max_row_ids
+        self.profile = profile
+        self.profile_stats = profile.to_stats() if profile is not None else None
+        self.tracer = DqTracer(span_hook)
+        self.suite = DqSuiteCompiler(self.tracer, parallel_engine)
+
+    @property
+    def dq_report(self) -> pd.DataFrame:
+        """
+        The DQ report of the current DataQuality instance
+        :return: pandas DataFrame with all added results
+        """
+        return pd.DataFrame(self.report_writer.records, columns=self.dq_report_fields)
+
+    @property
+    def df_ge(self):
+        """
+        great_expectations data frame (created on first use only, the suite expectations do not need it)
+        :return: great_expectations data frame
+        """
+        if self._df_ge is None:
+            self._df_ge = self.get_df_ge(self.df)
+        return self._df_ge
 
     @staticmethod
     def get_df_ge(df):
@@ -50,81 +1403,480 @@ class DataQuality:
         :param df: dataFrame (spark or pandas)
         :return: great_expectations data frame (dataset.SparkDFDataset or dataset.PandasDataset)
         """
-        if type(df) == SparkDataFrame:
-            return dataset.SparkDFDataset(df)
-        elif type(df) == pd.DataFrame:
-            return dataset.PandasDataset(df)
-        else:
+        if not is_spark_df(df) and type(df) != pd.DataFrame:
             return
+        # the suite expectations are evaluated natively, great_expectations is loaded only here
+        from great_expectations import dataset
+
+        if is_spark_df(df):
+            return dataset.SparkDFDataset(df)
+        return dataset.PandasDataset(df)
 
     def dq_finalize(self):
         """
         finalize the Data Pipeline (Raise errors if exist and all warnings)
         :return: None
         """
+        self.dq_evaluate()
 
-        # get all warnings
-        warnings_df: pd.DataFrame = self.dq_report.loc[
-            (self.dq_report['success'].astype(str).str.contains('False')) &
-            (self.dq_report['is_error'].astype(str).str.contains('False'))
-            ]
+        # write all buffered results and the finalize metrics to DB (one transaction)
+        self.report_writer.flush()
 
-        # get all errors
-        errors_df: pd.DataFrame = self.dq_report.loc[
-            (self.dq_report['success'].astype(str).str.contains('False')) &
-            (self.dq_report['is_error'].astype(str).str.contains('True'))
-            ]
+        self.raise_dq_exceptions(self.report_writer)
+
+    def dq_evaluate(self):
+        """
+        Evaluate all registered expectations and set the metrics of the finalize step of the run
+        (nothing is written to DB and raised here)
+        :return: None
+        """
+        with self.tracer.span('dq.finalize', self.df, table_name=self.table_name) as span:
+            self.run_suite()
+        self.report_writer.set_run_metrics(self.run_time, self.table_name, span.to_result())
+
+    @staticmethod
+    def raise_dq_exceptions(report_writer: DqReportWriter):
+        """
+        Raise errors and warnings based on the failed records counted by the report writer
+        :param report_writer: the writer of the DQ report (one or several DQ suites)
+        :return: None
+        """
 
         # raise warnings if exist
-        if warnings_df.shape[0]:
-            warnings.warn(
-                '\033[33m' + f"\n{warnings_df.to_json(indent=3, orient='records', lines=True)}" + '\033[m')
+        if report_writer.warning_records:
+            warnings.warn('\033[33m' + f"\n{DataQuality.records_to_json(report_writer.warning_records)}" + '\033[m')
 
         # raise errors if exist
-        if errors_df.shape[0]:
-            raise Exception("'\033[91m'" + f"\n{errors_df.to_json(indent=3, orient='records', lines=True)}" + '\033[m')
+        if report_writer.error_records:
+            raise Exception("'\033[91m'" + f"\n{DataQuality.records_to_json(report_writer.error_records)}" + '\033[m')
+
+    @staticmethod
+    def records_to_json(records: List[Dict]) -> str:
+        # one line of JSON per record (the blob of the row ids is not shown)
+        return '\n'.join(json.dumps({key: value for key, value in record.items() if key != 'unexpected_row_ids'},
+                                     default=str) for record in records)
+
+    def run_suite(self):
+        """
+        Evaluate all registered expectations with one pass over the data frame and add results to report
+        :return: None
+        """
+        if not self.suite.expectations:
+            return
+
+        # check DF Type
+        if type(self.df) is not pd.DataFrame and not is_spark_df(self.df):
+            warnings.warn('\033[33m' + "\nThis expectation is not supported of your dataframe" + '\033[m')
+            self.suite.expectations = []
+            return
+
+        # the suite is emptied by the run
+        expectations = list(self.suite.expectations)
+        if self.stream_accumulator is not None:
+            self.stream_accumulator.add_chunk(self.suite, self.df, self.execution_mode)
+            self.suite.expectations = []
+            return
+        elif self.incremental_watermark:
+            results = self.run_suite_incremental()
+        elif self.result_cache is not None:
+            results = self.run_suite_cached()
+        else:
+            results = self.suite.run(self.df, self.execution_mode, fail_fast=self.fail_fast,
+                                     profile=self.profile_stats)
+
+        if self.max_row_ids:
+            results = self.add_row_ids(results, expectations)
+        for result, exception in results:
+            self.add_result_to_report(result, exception)
+
+    def add_row_ids(self, results: List[tuple], expectations: List[DqExpectation]) -> List[tuple]:
+        """
+        Add the ids of the unexpected rows to the failed results of the row by row expectations
+        (one vectorized pass / Spark job per failed expectation, the passed expectations cost nothing)
+        :param results: list of tuples (result, exception)
+        :param expectations: the expectations of the results
+        :return: list of tuples (result, exception)
+        """
+        if self.row_id_column is None and is_spark_df(self.df):
+            # Spark rows have no positional ids
+            return results
+        if self.row_id_column is not None and self.row_id_column not in self.df.columns:
+            return results
+
+        expectations = {(expectation.expectation_type, json.dumps(expectation.kwargs, default=str)): expectation
+                        for expectation in expectations}
+        with_ids = []
+        for result, exception in results:
+            expectation = expectations.get((result.expectation_config.expectation_type,
+                                            json.dumps(result.expectation_config.kwargs, default=str)))
+            predicate = DqSuiteCompiler.get_unexpected_predicate(expectation) if expectation else None
+            if not result.success and predicate is not None and predicate.columns() <= set(self.df.columns):
+                # the result dict can be shared with the result cache: the ids are added to a copy
+                result = SimpleNamespace(**vars(result))
+                result.result = dict(result.result or {}, row_id_column=self.row_id_column,
+                                     unexpected_row_ids=self.get_row_ids(predicate).encode())
+            with_ids.append((result, exception))
+        return with_ids
+
+    def get_row_ids(self, predicate: DqRowPredicate) -> DqRowIds:
+        """
+        Get the ids of the rows matching the predicate (not more than max_row_ids)
+        :param predicate: DqRowPredicate of the unexpected rows
+        :return: DqRowIds
+        """
+        if is_spark_df(self.df):
+            rows = self.df.where(predicate.to_column()).select(self.row_id_column) \
+                .limit(self.max_row_ids + 1).collect()
+            ids = [row[0] for row in rows]
+        else:
+            mask = predicate.to_mask(self.df).to_numpy()
+            values = self.df.index if self.row_id_column is None else self.df[self.row_id_column]
+            ids = [to_python(value) for value in values.to_numpy()[mask][:self.max_row_ids + 1]]
+        return DqRowIds(column=self.row_id_column, ids=ids[:self.max_row_ids], truncated=len(ids) > self.max_row_ids)
+
+    def run_suite_incremental(self) -> List[tuple]:
+        """
+        Evaluate expectations over the rows added since the last run only: statistics of the new rows
+        are merged with the saved state of already validated rows, so expectations stay correct for the whole table
+        (the rows at the watermark are validated again on the next run, so late rows with the same value are checked)
+        :return: list of tuples (result, exception)
+        """
+        watermark_column = self.incremental_watermark
+        if watermark_column not in self.df.columns:
+            warnings.warn('\033[33m' + f"\nWatermark column '{watermark_column}' does not exist, "
+                                        f"all rows are validated" + '\033[m')
+            return self.suite.run(self.df, self.execution_mode, fail_fast=self.fail_fast)
+        self.check_watermark_column(watermark_column)
+
+        if self.connector is not None:
+            connection = nullcontext(self.connector)
+        else:
+            # pooled connection of the report DB
+            service = self.report_writer.service
+            connection = (service.pool if service is not None else get_connection_pool()).connection()
+        with connection as connector:
+            state_store = DqStateStore(connector)
+            state = state_store.load(self.table_name, watermark_column)
+            plan = self.suite.plan(list(self.df.columns), self.suite.data_expectations())
+            predicates = self.suite.plan_predicates(list(self.df.columns), self.suite.data_expectations())
+
+            if state is not None and state[1].covers(plan, predicates):
+                watermark, base_stats = state
+                df = self.get_rows_from(watermark_column, watermark)
+            else:
+                # the first run or the saved statistics are not enough (not mergeable): validate all rows
+                watermark, base_stats = None, None
+                df = self.df
+
+            new_watermark = merge_value(watermark, self.get_max(df, watermark_column), max)
+            df, boundary_df = self.split_at(df, watermark_column, new_watermark)
+            results = self.suite.run(df, self.execution_mode, base_stats=base_stats, fail_fast=self.fail_fast,
+                                     boundary_df=boundary_df)
+
+            if str(DqExecutionMode.exact()) in self.suite.stats and new_watermark is not None:
+                state_store.save(self.table_name, watermark_column, new_watermark, self.suite.state_stats)
+            return results
+
+    def check_watermark_column(self, column: str):
+        """
+        Check that the watermark column is numeric or datetime (text values are compared alphabetically,
+        e.g. '1/10/2019' < '1/9/2019', and the new rows would never be validated)
+        :param column: the watermark column
+        :return: None
+        """
+        if is_spark_df(self.df):
+            dtype = dict(self.df.dtypes)[column]
+            valid = dtype in ('tinyint', 'smallint', 'int', 'bigint', 'float', 'double', 'date', 'timestamp',
+                              'timestamp_ntz') or dtype.startswith('decimal')
+        else:
+            dtype = self.df[column].dtype
+            valid = pd.api.types.is_datetime64_any_dtype(dtype) or \
+                (pd.api.types.is_numeric_dtype(dtype) and not pd.api.types.is_bool_dtype(dtype))
+        if not valid:
+            raise ValueError(f"Watermark column '{column}' must be numeric or datetime, got '{dtype}' "
+                             f"(parse it first, e.g. pd.to_datetime(df['{column}']))")
+
+    def run_suite_cached(self) -> List[tuple]:
+        """
+        Evaluate only the data expectations which are not in the result cache for the content of the data frame
+        (schema expectations are always evaluated, they are cheaper than the fingerprint)
+        :return: list of tuples (result, exception) in the registration order
+        """
+        if not self.suite.data_expectations():
+            return self.suite.run(self.df, self.execution_mode, fail_fast=self.fail_fast, profile=self.profile_stats)
+
+        fingerprint = self.result_cache.get_fingerprint(self.df)
+        expectations = self.suite.expectations
+        keys = {}
+        cached = {}
+        for index, expectation in enumerate(expectations):
+            if expectation.expectation_type in self.suite.schema_expectation_types:
+                continue
+            keys[index] = self.result_cache.get_key(
+                fingerprint, expectation, expectation.execution_mode or self.execution_mode)
+            value = self.result_cache.get(keys[index])
+            if value is not None:
+                cached[index] = self.get_dq_result(
+                    success=value['success'],
+                    expectation_type=expectation.expectation_type,
+                    kwargs=expectation.kwargs,
+                    **dict(value['result'], cached=True, rows_scanned=0)
+                )
+
+        # evaluate not cached expectations only
+        self.suite.expectations = [e for index, e in enumerate(expectations) if index not in cached]
+        evaluated = iter(self.suite.run(self.df, self.execution_mode, fail_fast=self.fail_fast,
+                                        profile=self.profile_stats))
+
+        results = []
+        new_values = {}
+        for index, expectation in enumerate(expectations):
+            if index in cached:
+                results.append((cached[index], expectation.exception))
+                continue
+            if expectation in self.suite.skipped:
+                continue
+            result, exception = next(evaluated)
+            results.append((result, exception))
+            if index in keys:
+                # the metrics of this evaluation are not valid for the cached result
+                new_values[keys[index]] = {
+                    'success': result.success,
+                    'result': {k: v for k, v in result.result.items() if k not in DqSpan.metric_fields}
+                }
+        self.result_cache.put(new_values)
+        return results
+
+    def get_rows_from(self, column: str, watermark):
+        """
+        Get the rows with the column value not less than watermark (the rows at the watermark are validated again)
+        :param column: the watermark column
+        :param watermark: the max value of the watermark column of already validated rows
+        :return: DataFrame (Spark or Pandas)
+        """
+        if watermark is None:
+            return self.df
+        if is_spark_df(self.df):
+            from pyspark.sql import functions as F
+
+            return self.df.filter(F.col(column) >= F.lit(watermark))
+        return self.df.loc[self.df[column] >= watermark]
+
+    @staticmethod
+    def get_max(df, column: str):
+        """
+        Get the max value of the column (None for no rows)
+        :param df: DataFrame (Spark or Pandas)
+        :param column: the watermark column
+        :return: the max value
+        """
+        if is_spark_df(df):
+            from pyspark.sql import functions as F
+
+            return df.agg(F.max(F.col(column))).collect()[0][0]
+        return to_python(df[column].max())
+
+    @staticmethod
+    def split_at(df, column: str, watermark) -> tuple:
+        """
+        Split the rows into the rows before the watermark and the rows at it
+        :param df: DataFrame (Spark or Pandas)
+        :param column: the watermark column
+        :param watermark: the max value of the watermark column
+        :return: tuple (rows before the watermark, rows at the watermark)
+        """
+        if is_spark_df(df):
+            from pyspark.sql import functions as F
+
+            at_watermark = F.col(column) == F.lit(watermark)
+            return df.filter(~at_watermark | F.col(column).isNull()), df.filter(at_watermark)
+        at_watermark = (df[column] == watermark).to_numpy()
+        return df.loc[~at_watermark], df.loc[at_watermark]
 
     def expect_column_to_exist(self, column_name, exception: DqException):
         """
-        The wrapper over core great_expectation core function expect_column_to_exist
+        Expect the column to exist in the data frame (evaluated with the suite on run_suite / dq_finalize)
         :param column_name: the name of the column to perform checks
         :param exception: the exception type (error or warning) and message
         :return: none
         """
+        self.suite.add(
+            expectation_type='expect_column_to_exist',
+            kwargs={'column': column_name, 'result_format': 'SUMMARY'},
+            exception=exception
+        )
 
-        # check greatExpectation DF Type
-        if type(self.df_ge) is not dataset.PandasDataset and type(self.df_ge) is not dataset.SparkDFDataset:
-            warnings.warn('\033[33m' + "\nThis expectation is not supported of your dataframe" + '\033[m')
-            return
-
-        # get result of expectation
-        result = self.df_ge.expect_column_to_exist(column_name, result_format='SUMMARY')
+    def expect_column_values_to_be_of_type(self, column: str, type_: str, exception: DqException):
+        """
+        Expect the column type to be type_ (resolved from the schema: pandas dtype or Spark simple type name)
+        :param column: the name of the column to perform checks
+        :param type_: the expected type name ('float64', 'object' for Pandas, 'double', 'string' for Spark ...)
+        :param exception: the exception type (error or warning) and message
+        :return: None
+        """
+        self.suite.add(
+            expectation_type='expect_column_values_to_be_of_type',
+            kwargs={'column': column, 'type_': type_},
+            exception=exception
+        )
 
-        # save result to DB
-        self.add_result_to_report(result, exception)
+    def expect_table_columns_to_match_ordered_list(self, column_list: List[str], exception: DqException):
+        """
+        Expect the data frame columns to match the ordered list (resolved from the schema)
+        :param column_list: the expected list of columns
+        :param exception: the exception type (error or warning) and message
+        :return: None
+        """
+        self.suite.add(
+            expectation_type='expect_table_columns_to_match_ordered_list',
+            kwargs={'column_list': column_list},
+            exception=exception
+        )
 
-    def expect_column_values_distinct_to_be_in_set(self, column: str, values_li: List, exception: DqException):
+    def expect_column_values_distinct_to_be_in_set(self, column: str, values_li: List, exception: DqException,
+                                                   execution_mode: DqExecutionMode = None):
         """
-        The wrapper over core great_expectation core function expect_column_distinct_values_to_be_in_set
+        Expect distinct values of the column to be in the set (evaluated with the suite on run_suite / dq_finalize)
         :param column: the name of the column to perform checks
         :param values_li: the list of values to check in the column
         :param exception: the exception type (error or warning) and message
+        :param execution_mode: the execution mode of the expectation (None - the suite execution mode)
         :return: None
         """
+        self.suite.add(
+            expectation_type='expect_column_distinct_values_to_be_in_set',
+            kwargs={'column': column, 'value_set': values_li, 'result_format': 'BASIC'},
+            exception=exception,
+            execution_mode=execution_mode
+        )
 
-        # check greatExpectation DF Type
-        if type(self.df_ge) is not dataset.PandasDataset and type(self.df_ge) is not dataset.SparkDFDataset:
-            warnings.warn('\033[33m' + "\nThis expectation is not supported of your dataframe" + '\033[m')
-            return
+    def expect_column_values_to_not_be_null(self, column: str, exception: DqException,
+                                            execution_mode: DqExecutionMode = None):
+        """
+        Expect the column to have no null values (evaluated with the suite on run_suite / dq_finalize)
+        :param column: the name of the column to perform checks
+        :param exception: the exception type (error or warning) and message
+        :param execution_mode: the execution mode of the expectation (None - the suite execution mode)
+        :return: None
+        """
+        self.suite.add(
+            expectation_type='expect_column_values_to_not_be_null',
+            kwargs={'column': column},
+            exception=exception,
+            execution_mode=execution_mode
+        )
+
+    def expect_column_min_to_be_between(self, column: str, exception: DqException, min_value=None, max_value=None,
+                                        execution_mode: DqExecutionMode = None):
+        """
+        Expect the column minimum to be between min_value and max_value (evaluated with the suite)
+        :param column: the name of the column to perform checks
+        :param exception: the exception type (error or warning) and message
+        :param min_value: the lower bound (None - no bound)
+        :param max_value: the upper bound (None - no bound)
+        :param execution_mode: the execution mode of the expectation (None - the suite execution mode)
+        :return: None
+        """
+        self.suite.add(
+            expectation_type='expect_column_min_to_be_between',
+            kwargs={'column': column, 'min_value': min_value, 'max_value': max_value},
+            exception=exception,
+            execution_mode=execution_mode
+        )
+
+    def expect_column_max_to_be_between(self, column: str, exception: DqException, min_value=None, max_value=None,
+                                        execution_mode: DqExecutionMode = None):
+        """
+        Expect the column maximum to be between min_value and max_value (evaluated with the suite)
+        :param column: the name of the column to perform checks
+        :param exception: the exception type (error or warning) and message
+        :param min_value: the lower bound (None - no bound)
+        :param max_value: the upper bound (None - no bound)
+        :param execution_mode: the execution mode of the expectation (None - the suite execution mode)
+        :return: None
+        """
+        self.suite.add(
+            expectation_type='expect_column_max_to_be_between',
+            kwargs={'column': column, 'min_value': min_value, 'max_value': max_value},
+            exception=exception,
+            execution_mode=execution_mode
+        )
+
+    def expect_table_row_count_to_be_between(self, exception: DqException, min_value=None, max_value=None,
+                                             execution_mode: DqExecutionMode = None):
+        """
+        Expect the number of rows to be between min_value and max_value (evaluated with the suite)
+        :param exception: the exception type (error or warning) and message
+        :param min_value: the lower bound (None - no bound)
+        :param max_value: the upper bound (None - no bound)
+        :param execution_mode: the execution mode of the expectation (None - the suite execution mode)
+        :return: None
+        """
+        self.suite.add(
+            expectation_type='expect_table_row_count_to_be_between',
+            kwargs={'min_value': min_value, 'max_value': max_value},
+            exception=exception,
+            execution_mode=execution_mode
+        )
+
+    def expect_column_unique_value_count_to_be_between(self, column: str, exception: DqException, min_value=None,
+                                                       max_value=None, execution_mode: DqExecutionMode = None):
+        """
+        Expect the number of distinct values of the column to be between min_value and max_value
+        (approx_count_distinct sketch for Spark in approx mode)
+        :param column: the name of the column to perform checks
+        :param exception: the exception type (error or warning) and message
+        :param min_value: the lower bound (None - no bound)
+        :param max_value: the upper bound (None - no bound)
+        :param execution_mode: the execution mode of the expectation (None - the suite execution mode)
+        :return: None
+        """
+        self.suite.add(
+            expectation_type='expect_column_unique_value_count_to_be_between',
+            kwargs={'column': column, 'min_value': min_value, 'max_value': max_value},
+            exception=exception,
+            execution_mode=execution_mode
+        )
 
-        # get result of expectation
-        result = self.df_ge.expect_column_distinct_values_to_be_in_set(
-            column,
-            values_li
+    def expect_column_median_to_be_between(self, column: str, exception: DqException, min_value=None,
+                                           max_value=None, execution_mode: DqExecutionMode = None):
+        """
+        Expect the column median to be between min_value and max_value
+        (percentile_approx sketch for Spark in approx mode)
+        :param column: the name of the column to perform checks
+        :param exception: the exception type (error or warning) and message
+        :param min_value: the lower bound (None - no bound)
+        :param max_value: the upper bound (None - no bound)
+        :param execution_mode: the execution mode of the expectation (None - the suite execution mode)
+        :return: None
+        """
+        self.suite.add(
+            expectation_type='expect_column_median_to_be_between',
+            kwargs={'column': column, 'min_value': min_value, 'max_value': max_value},
+            exception=exception,
+            execution_mode=execution_mode
         )
 
-        # save result to DB
-        self.add_result_to_report(result, exception)
+    def expect_rows_to_not_match(self, name: str, predicate: DqRowPredicate, exception: DqException,
+                                 execution_mode: DqExecutionMode = None, **kwargs):
+        """
+        Custom expectation: expect no rows to match the row predicate (evaluated with the suite on run_suite /
+        dq_finalize, all predicates of the suite are counted in the same pass as other statistics)
+        :param name: the name of the custom expectation (expectation_type in the DQ report)
+        :param predicate: DqRowPredicate of the unexpected rows,
+                          e.g. DqRowPredicate.where('city', '==', 'Mandalay') & DqRowPredicate.where('unit_price', '<', 10)
+        :param exception: DqException
+        :param execution_mode: the execution mode of the expectation (None - DataQuality execution mode)
+        :param kwargs: the arguments of the custom expectation (saved to the DQ report)
+        :return: None
+        """
+        self.suite.add(
+            expectation_type=name,
+            kwargs=dict(kwargs, predicate=str(predicate)),
+            exception=exception,
+            execution_mode=execution_mode,
+            predicate=predicate
+        )
 
     def add_result_to_report(self, result, dq_exception: DqException):
         """
@@ -134,6 +1886,13 @@ class DataQuality:
         :return: None
         """
 
+        # streaming DQ: the result of the chunk is merged with the results of other chunks
+        if self.stream_accumulator is not None:
+            self.stream_accumulator.add_result(result, dq_exception)
+            return
+
+        result_details = getattr(result, 'result', None) or {}
+
         # result to Dict
         record: Dict = {
             "success": result.success,
@@ -142,34 +1901,50 @@ class DataQuality:
             "description": dq_exception.exception_message,
             "ts": self.run_time,
             "is_error": dq_exception.is_error,
-            "table_name": self.table_name
+            "table_name": self.table_name,
+            "execution_mode": result_details.get('execution_mode', 'exact'),
+            "sample_size": result_details.get('sample_size'),
+            "cached": result_details.get('cached', False),
+            "unexpected_count": result_details.get('unexpected_count'),
+            "partial_unexpected_list": json.dumps(result_details['partial_unexpected_list'], default=str)
+            if result_details.get('partial_unexpected_list') is not None else None,
+            "duration_s": result_details.get('duration_s'),
+            "rows_scanned": result_details.get('rows_scanned'),
+            "spark_job_ids": json.dumps(result_details['spark_job_ids'])
+            if result_details.get('spark_job_ids') is not None else None,
+            "spark_stage_ids": json.dumps(result_details['spark_stage_ids'])
+            if result_details.get('spark_stage_ids') is not None else None,
+            "memory_delta_mb": result_details.get('memory_delta_mb'),
+            "row_id_column": result_details.get('row_id_column'),
+            "unexpected_row_ids": result_details.get('unexpected_row_ids')
         }
 
-        # add result to dataframe
-        df_record = pd.DataFrame(record, index=[0])
-        self.dq_report = pd.concat([self.dq_report, df_record], ignore_index=True)
-
-        # add result to DB
-        self.add_record_to_db(record, table_name="dq_report")
-
-    def add_record_to_db(self, records, table_name):
-        records['ts'] = str(records['ts'])
-        df = pd.DataFrame(records, index=[0])
-
-        # convert bool
-        mask = df.applymap(type) != bool
-        d = {True: 'TRUE', False: 'FALSE'}
+        # add result to report buffer (written to DB in batches)
+        self.report_writer.add(record)
 
-        df = df.where(mask, df.replace(d))
+    @staticmethod
+    def get_dq_result(success: bool, expectation_type: str, kwargs: Dict, **result):
+        """
+        Create DQ result (the same format as ExpectationValidationResult from ge library)
+        :param success: the result of the expectation
+        :param expectation_type: the name of the expectation
+        :param kwargs: the expectation arguments
+        :param result: additional result details (observed_value, etc.)
+        :return: SimpleNamespace
+        """
+        return SimpleNamespace(
+            success=bool(success),
+            expectation_config=SimpleNamespace(
+                expectation_type=expectation_type,
+                kwargs=kwargs
+            ),
+            result=result
+        )
 
-        # insert to dq DB
-        self.cursor.executemany(f'insert into {table_name} '
-                                f'({", ".join(self.dq_report_fields)})'
-                                f'values (?,?,?,?,?,?,?);',
-                                df.to_records(index=False))
-        self.connector.commit()
+    @staticmethod
+    def get_path_to_db() -> str:
+        return os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "sales_pipeline.db")
 
     @staticmethod
     def get_connector():
-        path_to_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "sales_pipeline.db")
-        return sqlite3.connect(path_to_db)
+        return sqlite3.connect(DataQuality.get_path_to_db())
@@ -0,0 +1,243 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+from typing import Dict, List, Iterator, Optional
+import threading
+import sqlite3
+import atexit
+import queue
+import os
+from data_quality.dq_report_store import DqReportStore
+
+
+def get_default_path_to_db() -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "sales_pipeline.db")
+
+
+class DqConnectionPool:
+
+    def __init__(self, path_to_db: str, max_size: int = 8, timeout: float = 60):
+        """
+        Pool of SQLite connections in WAL mode (readers do not block the writer and the writer does not block readers)
+        :param path_to_db: the path to DB
+        :param max_size: the max number of open connections
+        :param timeout: seconds to wait for a free connection and for SQLite locks (busy timeout)
+        """
+        self.path_to_db = path_to_db
+        self.max_size = max_size
+        self.timeout = timeout
+        self.idle: queue.LifoQueue = queue.LifoQueue()
+        self.connections: List[sqlite3.Connection] = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def connect(self) -> sqlite3.Connection:
+        # the connections are handed out to any thread of the process
+        connector = sqlite3.connect(self.path_to_db, timeout=self.timeout, check_same_thread=False)
+        connector.execute('PRAGMA journal_mode=WAL')
+        connector.execute('PRAGMA synchronous=NORMAL')
+        return connector
+
+    def acquire(self) -> sqlite3.Connection:
+        """
+        Get an idle connection (a new one is opened while the pool is not full)
+        :return: sqlite3 connection (return it with release)
+        """
+        if self.closed:
+            raise RuntimeError(f"The connection pool of '{self.path_to_db}' is closed")
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.connections) < self.max_size:
+                self.connections.append(self.connect())
+                return self.connections[-1]
+        try:
+            return self.idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise TimeoutError(f"No free connection to '{self.path_to_db}' in {self.timeout} s "
+                               f"(max_size={self.max_size})")
+
+    def release(self, connector: sqlite3.Connection):
+        """
+        Return the connection to the pool (the uncommitted changes are rolled back)
+        :param connector: the connection taken by acquire
+        :return: None
+        """
+        connector.rollback()
+        if self.closed:
+            connector.close()
+        else:
+            self.idle.put(connector)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Pooled connection for the with block
+        :return: sqlite3 connection
+        """
+        connector = self.acquire()
+        try:
+            yield connector
+        finally:
+            self.release(connector)
+
+    def close(self):
+        """
+        Close the idle connections (the connections in use are closed when they are released)
+        :return: None
+        """
+        self.closed = True
+        while True:
+            try:
+                self.idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class DqReportService:
+
+    def __init__(self, pool: DqConnectionPool):
+        """
+        Single writer of the DQ report: the report writers of all suites of the process submit their records to the queue,
+        the background thread saves everything queued so far with one transaction (suites do not wait for each other's
+        SQLite locks, the writers of other processes are serialized by the busy timeout of WAL connections)
+        :param pool: the connection pool of the report DB
+        """
+        self.pool = pool
+        self.queue: queue.Queue = queue.Queue()
+        # the error which stopped the service (the records submitted after it are rejected)
+        self.error: Optional[BaseException] = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.run, name="dq-report-service", daemon=True)
+        self.thread.start()
+
+    def submit(self, records: List[Dict], run_metrics: Dict[tuple, Dict] = None,
+               run_ids: Dict[tuple, int] = None) -> Future:
+        """
+        Queue the records and the run metrics for the write
+        :param records: DQ report records
+        :param run_metrics: dict {(ts, table_name): metrics}
+        :param run_ids: dict {(ts, table_name): run_id} of the runs of the submitter saved before
+        :return: Future which is resolved when the records are committed: its result is tuple (run_ids, run_metrics)
+                 with the runs of the submitter and the metrics of the runs without results (it raises the write errors)
+        """
+        with self.lock:
+            if self.error is not None:
+                raise RuntimeError("The DQ report service is stopped") from self.error
+            if self.closed or not self.thread.is_alive():
+                raise RuntimeError("The DQ report service is closed")
+            future = Future()
+            self.queue.put((list(records), dict(run_metrics or {}), dict(run_ids or {}), future))
+        return future
+
+    def run(self):
+        try:
+            with self.pool.connection() as connector:
+                store = DqReportStore(connector)
+                while True:
+                    batch = [self.queue.get()]
+                    # everything queued so far is written with one commit
+                    while batch[-1] is not None:
+                        try:
+                            batch.append(self.queue.get_nowait())
+                        except queue.Empty:
+                            break
+                    items = [item for item in batch if item is not None]
+                    if items:
+                        self.write(connector, store, items)
+                    if batch[-1] is None:
+                        return
+        except Exception as error:
+            # e.g. no free connection: the pending records fail instead of waiting forever
+            self.fail(error)
+
+    def fail(self, error: BaseException):
+        """
+        Stop accepting records and fail the futures of all queued records
+        :param error: the error which stopped the service
+        :return: None
+        """
+        with self.lock:
+            self.error = error
+            while True:
+                try:
+                    item = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not None:
+                    item[-1].set_exception(error)
+
+    def write(self, connector: sqlite3.Connection, store: DqReportStore, items: List[tuple]):
+        # the runs are kept by the submitters (the service keeps no state of the written runs)
+        try:
+            for records, run_metrics, run_ids, _ in items:
+                store.add_records(records, run_ids, run_metrics)
+            connector.commit()
+        except Exception as error:
+            connector.rollback()
+            for _, _, _, future in items:
+                future.set_exception(error)
+            return
+        for _, run_metrics, run_ids, future in items:
+            future.set_result((run_ids, run_metrics))
+
+    def close(self):
+        """
+        Write all queued records and stop the service
+        :return: None
+        """
+        with self.lock:
+            self.closed = True
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
+
+# pools and services of the current process (forked processes create their own)
+pools: Dict[tuple, DqConnectionPool] = {}
+report_services: Dict[tuple, DqReportService] = {}
+lock = threading.Lock()
+
+
+def get_connection_pool(path_to_db: str = None) -> DqConnectionPool:
+    """
+    The shared connection pool of the DB
+    :param path_to_db: the path to DB (data/sales_pipeline.db by default)
+    :return: DqConnectionPool
+    """
+    key = (os.path.abspath(path_to_db if path_to_db else get_default_path_to_db()), os.getpid())
+    with lock:
+        if key not in pools or pools[key].closed:
+            pools[key] = DqConnectionPool(key[0])
+        return pools[key]
+
+
+def get_report_service(path_to_db: str = None) -> DqReportService:
+    """
+    The shared DQ report service of the DB
+    :param path_to_db: the path to DB (data/sales_pipeline.db by default)
+    :return: DqReportService
+    """
+    pool = get_connection_pool(path_to_db)
+    key = (pool.path_to_db, os.getpid())
+    with lock:
+        if key not in report_services or not report_services[key].thread.is_alive():
+            report_services[key] = DqReportService(pool)
+        return report_services[key]
+
+
+@atexit.register
+def close_all():
+    """
+    Flush the DQ report services and close the connection pools of the process
+    :return: None
+    """
+    pid = os.getpid()
+    for key, service in list(report_services.items()):
+        if key[1] == pid:
+            service.close()
+    for key, pool in list(pools.items()):
+        if key[1] == pid:
+            pool.close()
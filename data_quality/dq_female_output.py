@@ -3,29 +3,35 @@ from data_quality.data_quality_core import DataQuality, DqException
 
 class SalesDqFemaleOutput:
 
-    def __init__(self, female_output_df, connector=None, cursor=None, table_name=None):
+    def __init__(self, female_output_df, connector=None, cursor=None, table_name=None, finalize=True, **dq_options):
         """
         This class and all expectations inside are related to male_output_df Data Frame only
         :param female_output_df: the data frame for which expectations should be applied
         :param connector: connector to DB
         :param cursor: cursor for DB
         :param table_name: the name of the table for the DQ report
+        :param finalize: raise errors/warnings at the end (False - results are only collected, e.g. by DqRunner)
+        :param dq_options: additional options for DataQuality (report_writer, report_batch_size ...)
+                           the ids of the unexpected rows are saved by invoice_id by default
         """
         self.female_output_df = female_output_df
         self.connector = connector
         self.cursor = cursor
+        dq_options.setdefault('row_id_column', 'invoice_id')
         self.dq = DataQuality(
             df=female_output_df,
             connector=connector,
             cursor=cursor,
-            table_name=table_name
+            table_name=table_name,
+            **dq_options
         )
 
         # run all custom expectations
         self.run_all_core()
 
         # finalize pipeline (raise exception or warnings if exists)
-        self.dq.dq_finalize()
+        if finalize:
+            self.dq.dq_finalize()
 
     def run_all_core(self):
         self.dq.expect_column_to_exist(
@@ -0,0 +1,142 @@
+from typing import Callable, Dict, List, Optional
+import importlib.util
+import resource
+import time
+import os
+
+
+def get_rss_bytes() -> int:
+    """
+    Current RSS of the process (the peak RSS if /proc is not available)
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is in kilobytes on Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class DqSpan:
+    # the metrics of the step saved to the DQ report
+    metric_fields = ('duration_s', 'rows_scanned', 'memory_delta_mb', 'spark_job_ids', 'spark_stage_ids')
+
+    def __init__(self, name: str, attributes: Dict = None, spark_context=None, hook: Callable = None):
+        """
+        Measures one step of DQ: wall time, memory delta of the driver process (RSS) and Spark jobs/stages
+        started during the step (all jobs of the application: jobs of concurrent suites can be included)
+        :param name: the name of the step (e.g. 'dq.stats_pass', 'dq.finalize')
+        :param attributes: the attributes of the step (expectation type, table name ...)
+        :param spark_context: spark context to collect Spark job ids (None for Pandas)
+        :param hook: callable(span) which is called when the step is finished
+        """
+        self.name = name
+        self.attributes = attributes if attributes else {}
+        self.spark_context = spark_context
+        self.hook = hook
+        self.start_time_ns: Optional[int] = None
+        self.end_time_ns: Optional[int] = None
+        self.duration_s: Optional[float] = None
+        self.memory_delta_mb: Optional[float] = None
+        self.spark_job_ids: Optional[List[int]] = None
+        self.spark_stage_ids: Optional[List[int]] = None
+        self.rss_before = 0
+        self.jobs_before: set = set()
+        self.start = 0.0
+
+    def __enter__(self) -> 'DqSpan':
+        if self.spark_context is not None:
+            self.jobs_before = self.get_job_ids()
+        self.rss_before = get_rss_bytes()
+        self.start_time_ns = time.time_ns()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.duration_s = time.perf_counter() - self.start
+        self.end_time_ns = time.time_ns()
+        self.memory_delta_mb = (get_rss_bytes() - self.rss_before) / 1024 ** 2
+        if self.spark_context is not None:
+            tracker = self.spark_context.statusTracker()
+            self.spark_job_ids = sorted(self.get_job_ids() - self.jobs_before)
+            self.spark_stage_ids = sorted(
+                stage_id for job_id in self.spark_job_ids
+                for stage_id in (getattr(tracker.getJobInfo(job_id), 'stageIds', None) or [])
+            )
+        if self.hook is not None:
+            self.hook(self)
+
+    def get_job_ids(self) -> set:
+        return set(self.spark_context.statusTracker().getJobIdsForGroup())
+
+    def to_result(self) -> Dict:
+        """
+        Get the metrics of the step for the DQ report
+        :return: dict {duration_s, memory_delta_mb, spark_job_ids, spark_stage_ids}
+        """
+        return {
+            'duration_s': round(self.duration_s, 6) if self.duration_s is not None else None,
+            'memory_delta_mb': round(self.memory_delta_mb, 3) if self.memory_delta_mb is not None else None,
+            'spark_job_ids': self.spark_job_ids,
+            'spark_stage_ids': self.spark_stage_ids,
+        }
+
+
+class DqTracer:
+
+    def __init__(self, hook: Callable = None):
+        """
+        Creates DqSpan for the steps of DQ and passes finished spans to the hook
+        :param hook: callable(span), e.g. OpenTelemetryHook() or a function which logs the spans
+        """
+        self.hook = hook
+
+    def span(self, name: str, df=None, **attributes) -> DqSpan:
+        """
+        Create the span of the step
+        :param name: the name of the step
+        :param df: the validated data frame (Spark job ids are collected for Spark data frame)
+        :param attributes: the attributes of the step
+        :return: DqSpan (use it as context manager)
+        """
+        spark_context = None
+        if df is not None and type(df).__module__.startswith('pyspark'):
+            spark_context = df.sql_ctx.sparkSession.sparkContext
+        return DqSpan(name, attributes, spark_context, self.hook)
+
+    def emit(self, name: str, span: DqSpan, **attributes):
+        """
+        Pass the metrics of the finished step to the hook under another name (e.g. per expectation of one pass)
+        :param name: the name of the span
+        :param span: finished span
+        :param attributes: the attributes of the span
+        :return: None
+        """
+        if self.hook is None:
+            return
+        emitted = DqSpan(name, dict(span.attributes, **attributes), hook=self.hook)
+        emitted.__dict__.update({key: value for key, value in span.__dict__.items()
+                                 if key not in ('name', 'attributes', 'hook')})
+        self.hook(emitted)
+
+
+class OpenTelemetryHook:
+
+    def __init__(self, tracer_name: str = "data_quality"):
+        """
+        Hook which exports DQ spans to OpenTelemetry (requires opentelemetry-api, the exporter is configured by
+        the application, e.g. OTLP exporter to a local collector)
+        :param tracer_name: the name of the OpenTelemetry tracer
+        """
+        if importlib.util.find_spec("opentelemetry") is None:
+            raise ImportError("OpenTelemetryHook requires opentelemetry-api (pip install opentelemetry-api)")
+        from opentelemetry import trace
+        self.tracer = trace.get_tracer(tracer_name)
+
+    def __call__(self, span: DqSpan):
+        attributes = {key: value if isinstance(value, (str, bool, int, float)) else str(value)
+                      for key, value in span.attributes.items() if value is not None}
+        attributes.update({f'dq.{key}': value if not isinstance(value, list) else [int(v) for v in value]
+                           for key, value in span.to_result().items() if value is not None})
+        otel_span = self.tracer.start_span(span.name, start_time=span.start_time_ns, attributes=attributes)
+        otel_span.end(end_time=span.end_time_ns)
@@ -1,29 +1,30 @@
-import pandas as pd
-import inspect
-from data_quality.data_quality_core import DataQuality, DqException
-from pyspark.sql import DataFrame as SparkDataFrame
-from types import SimpleNamespace
+from data_quality.data_quality_core import DataQuality, DqException, DqRowPredicate
 
 
 class SalesDqMaleOutput:
-    def __init__(self, male_output_df, connector=None, cursor=None, table_name=None):
+    def __init__(self, male_output_df, connector=None, cursor=None, table_name=None, finalize=True, **dq_options):
         """
         This class and all expectations inside are related to male_output_df Data Frame only
         :param male_output_df: the data frame for which expectations should be applied
         :param connector: connector to DB
         :param cursor: cursor for DB
         :param table_name: the name of the table for the DQ report
+        :param finalize: raise errors/warnings at the end (False - results are only collected, e.g. by DqRunner)
+        :param dq_options: additional options for DataQuality (report_writer, report_batch_size ...)
+                           the ids of the unexpected rows are saved by invoice_id by default
         """
         self.male_output_df = male_output_df
         self.connector = connector
         self.cursor = cursor
 
         self.dq_exception = DqException
+        dq_options.setdefault('row_id_column', 'invoice_id')
         self.dq = DataQuality(
             df=self.male_output_df,
             connector=self.connector,
             cursor=self.cursor,
-            table_name=table_name
+            table_name=table_name,
+            **dq_options
         )
 
         # run all custom expectations
@@ -33,7 +34,8 @@ class SalesDqMaleOutput:
         self.run_all_core()
 
         # finalize pipeline (raise exception or warnings if exists)
-        self.dq.dq_finalize()
+        if finalize:
+            self.dq.dq_finalize()
 
     def run_all_custom(self):
         """
@@ -90,40 +92,19 @@ class SalesDqMaleOutput:
     def check_male_from_city_unit_price_not_more(self, city: str, unit_price_threshold: float, exception: DqException):
         """
         this function is created as custom dq check (expectation) example which related to current DataFrame only
-        works for Pandas and Spark Data Frame ...
+        works for Pandas and Spark Data Frame (the row predicate is compiled by DataQuality
+        and evaluated in the same pass as all other expectations of the suite)
 
         :param city: city name
         :param unit_price_threshold: unit price threshold
         :param exception: dq expectation
         :return: None
         """
-        # check Data Frame type
-        if type(self.male_output_df) is pd.DataFrame:
-            # get count unexpected rows
-            count_of_unexpected: int = (self.male_output_df.loc[
-                (self.male_output_df['city'] == city) & (self.male_output_df['unit_price'] < unit_price_threshold)]) \
-                .shape[0]
-
-        # check Data Frame type
-        elif type(self.male_output_df) is SparkDataFrame:
-            # get count unexpected rows
-            count_of_unexpected: int = self.male_output_df.filter(
-                f'city="{city}" and unit_price < {unit_price_threshold}') \
-                .count()
-
-        else:
-            return
-        # create DQ result (the same format as ExpectationValidationResult from ge library)
-        dq_result = SimpleNamespace(
-            success=False if count_of_unexpected else True,
-            expectation_config=SimpleNamespace(
-                expectation_type=inspect.stack()[1][4][0],  # current function name
-                kwargs={'city': city,
-                        'unit_price_threshold': unit_price_threshold}),
-
-        )
-        # add result Data Quality report DB
-        self.dq.add_result_to_report(
-            result=dq_result,
-            dq_exception=exception
+        self.dq.expect_rows_to_not_match(
+            name='check_male_from_city_unit_price_not_more',
+            predicate=DqRowPredicate.where('city', '==', city)
+            & DqRowPredicate.where('unit_price', '<', unit_price_threshold),
+            exception=exception,
+            city=city,
+            unit_price_threshold=unit_price_threshold
         )
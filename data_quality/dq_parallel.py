@@ -0,0 +1,307 @@
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from multiprocessing import shared_memory
+from typing import List, Dict, Set, Optional, Tuple
+import multiprocessing
+import threading
+import pickle
+import os
+import numpy as np
+import pandas as pd
+from data_quality.data_quality_core import DqSuiteCompiler, DqStats, DqColumnStats, DqPredicateStats, \
+    DqRowPredicate, to_python, get_observed_categories
+
+
+def is_shareable(series: pd.Series) -> bool:
+    """
+    Check that the column is mapped by the workers as it is: numeric, bool and datetime64 values
+    or category codes (object / extension columns would be converted at the cost of the statistics themselves)
+    """
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return True
+    return isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM'
+
+
+@dataclass
+class DqSharedColumn:
+    name: str
+    # the buffer of the column: 'values' or 'codes' (of the categorical column)
+    kind: str
+    dtype: str
+    offset: int
+
+
+@dataclass
+class DqSharedFrameSpec:
+    """
+    The picklable description of the shared frame sent to the workers (the data stays in shared memory)
+    """
+    name: str
+    row_count: int
+    columns: List[DqSharedColumn]
+    # the pickled categorical dtypes (after the column buffers)
+    meta_offset: int
+    meta_size: int
+
+
+class DqSharedFrame:
+
+    def __init__(self, df: pd.DataFrame, columns: List[str]):
+        """
+        Copy the buffers of the columns to one shared memory block: the workers map them
+        without pickling the data frame (the categories of categorical columns are pickled once)
+        :param df: pandas DataFrame
+        :param columns: the shareable columns required by the workers
+        """
+        arrays = {}
+        meta = {}
+        shared_columns = []
+        offset = 0
+        for column in columns:
+            series = df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                kind, meta[column] = 'codes', series.dtype
+                arrays[column] = np.ascontiguousarray(series.cat.codes.to_numpy())
+            else:
+                kind, arrays[column] = 'values', np.ascontiguousarray(series.to_numpy())
+            shared_columns.append(DqSharedColumn(column, kind, arrays[column].dtype.str, offset))
+            # the buffers are aligned to 64 bytes
+            offset += -(-arrays[column].nbytes // 64) * 64
+
+        meta_bytes = pickle.dumps(meta, protocol=pickle.HIGHEST_PROTOCOL)
+        self.memory = shared_memory.SharedMemory(create=True, size=max(offset + len(meta_bytes), 1))
+        for shared_column in shared_columns:
+            values = arrays[shared_column.name]
+            shared = np.ndarray(values.shape, dtype=values.dtype, buffer=self.memory.buf, offset=shared_column.offset)
+            shared[:] = values
+        self.memory.buf[offset:offset + len(meta_bytes)] = meta_bytes
+        self.spec = DqSharedFrameSpec(self.memory.name, df.shape[0], shared_columns, offset, len(meta_bytes))
+
+    def close(self):
+        """
+        Release the shared memory block (the mappings of the workers stay valid until they attach the next frame)
+        :return: None
+        """
+        self.memory.close()
+        self.memory.unlink()
+
+    def __enter__(self) -> 'DqSharedFrame':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# the shared frame attached by the worker process: {name: (shared memory, categorical dtypes)}
+attached: Dict[str, Tuple[shared_memory.SharedMemory, Dict]] = {}
+
+
+def attach(spec: DqSharedFrameSpec) -> Tuple[shared_memory.SharedMemory, Dict]:
+    """
+    Map the shared frame in the worker (the previous frame is released)
+    :param spec: DqSharedFrameSpec
+    :return: tuple (shared memory, categorical dtypes)
+    """
+    if spec.name not in attached:
+        for memory, _ in attached.values():
+            memory.close()
+        attached.clear()
+        memory = shared_memory.SharedMemory(name=spec.name)
+        meta = pickle.loads(memory.buf[spec.meta_offset:spec.meta_offset + spec.meta_size])
+        attached[spec.name] = (memory, meta)
+    return attached[spec.name]
+
+
+def get_chunk(spec: DqSharedFrameSpec, start: int, stop: int) -> pd.DataFrame:
+    """
+    Rows [start, stop) of the shared frame (the columns are views of the shared buffers)
+    :param spec: DqSharedFrameSpec
+    :param start: the first row
+    :param stop: the row after the last one
+    :return: pandas DataFrame
+    """
+    memory, meta = attach(spec)
+    columns = {}
+    for shared_column in spec.columns:
+        values = np.ndarray((spec.row_count,), dtype=np.dtype(shared_column.dtype), buffer=memory.buf,
+                            offset=shared_column.offset)[start:stop]
+        if shared_column.kind == 'codes':
+            # the codes are checked against the categories by pandas (one vectorized min/max of the chunk)
+            values = pd.Categorical.from_codes(values, dtype=meta[shared_column.name])
+        columns[shared_column.name] = values
+    return pd.DataFrame(columns, index=pd.RangeIndex(start, stop), copy=False)
+
+
+def compute_chunk_stats(spec: DqSharedFrameSpec, start: int, stop: int, plan: Dict[str, Set[str]],
+                        predicates: Dict[str, DqRowPredicate], max_positions: int) -> tuple:
+    """
+    Compute the mergeable statistics of the rows [start, stop) of the shared frame (runs in the worker process)
+    :param spec: DqSharedFrameSpec
+    :param start: the first row
+    :param stop: the row after the last one
+    :param plan: dict {column name: set of mergeable statistics}
+    :param predicates: dict {predicate: DqRowPredicate} to count the unexpected rows for
+    :param max_positions: the max number of the positions of the unexpected rows
+    :return: tuple (dict {column name: DqColumnStats}, dict {column name: distinct values},
+                    dict {predicate: (unexpected count, positions)})
+    """
+    chunk = get_chunk(spec, start, stop)
+    # distinct values are sent back as arrays (a set of scalars is slow to pickle) and merged by the caller
+    stats = DqSuiteCompiler.compute_stats_pandas(
+        chunk, {column: column_stats - {'distinct'} for column, column_stats in plan.items()},
+        DqStats(columns=list(chunk.columns)), {}
+    )
+    distinct = {
+        column: get_observed_categories(chunk[column]) if isinstance(chunk[column].dtype, pd.CategoricalDtype)
+        else chunk[column].dropna().unique()
+        for column, column_stats in plan.items() if 'distinct' in column_stats
+    }
+    predicate_stats = {}
+    for key, predicate in predicates.items():
+        positions = np.flatnonzero(predicate.to_mask(chunk).to_numpy())
+        predicate_stats[key] = (len(positions), (positions[:max_positions] + start).tolist())
+    return stats.column_stats, distinct, predicate_stats
+
+
+def merge_extreme(values: List, function):
+    """
+    Merge min/max of the chunks keeping the type of the values
+    (the missing value of the first chunk if all values are missing)
+    """
+    present = [value for value in values if to_python(value) is not None]
+    return function(present) if present else values[0]
+
+
+class DqParallelEngine:
+
+    def __init__(self, workers: int = None, min_rows: int = 1000000, chunks_per_worker: int = 1):
+        """
+        Evaluates the stats passes of large Pandas data frames on a process pool: numeric, bool, datetime64
+        and categorical columns are copied once to shared memory, every worker computes the mergeable statistics
+        (null counts, distinct values, min/max, unexpected rows of the row predicates) of its chunk of rows and
+        the statistics of the chunks are merged in the order of the rows. Object columns (and the predicates
+        and medians which are not mergeable) are evaluated in the current process at the same time.
+        The results are the same as the results of the pass in one process.
+        :param workers: the number of worker processes (the number of CPUs by default)
+        :param min_rows: smaller data frames are evaluated in the current process (the pool does not pay off)
+        :param chunks_per_worker: the number of chunks of rows per worker
+        """
+        self.workers = workers if workers else os.cpu_count()
+        self.min_rows = min_rows
+        self.chunks_per_worker = chunks_per_worker
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.lock = threading.Lock()
+
+    def __getstate__(self):
+        # the pool is not sent to other processes (they create their own)
+        state = self.__dict__.copy()
+        state.update(executor=None, lock=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, lock=threading.Lock())
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        """
+        The process pool of the engine (started on the first parallel pass and kept for the next ones)
+        :return: ProcessPoolExecutor
+        """
+        with self.lock:
+            if self.executor is None:
+                # the workers are forked from the single threaded fork server (as the workers of DqRunner)
+                self.executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context(
+                    "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None))
+            return self.executor
+
+    def accepts(self, df: pd.DataFrame) -> bool:
+        """
+        Check that the stats pass of the data frame is evaluated by the engine
+        :param df: pandas DataFrame
+        :return: bool
+        """
+        return self.workers > 1 and df.shape[0] >= self.min_rows
+
+    def compute_stats_pandas(self, df: pd.DataFrame, plan: Dict[str, Set[str]], stats: DqStats,
+                             predicates: Dict[str, DqRowPredicate]) -> DqStats:
+        """
+        Compute all planned statistics, the shareable columns by the chunks of rows in parallel
+        :param df: pandas DataFrame
+        :param plan: dict {column name: set of statistics}
+        :param stats: DqStats to fill in
+        :param predicates: dict {predicate: DqRowPredicate} to count the unexpected rows for
+        :return: DqStats
+        """
+        shared = {column for column in set(plan).union(*[p.columns() for p in predicates.values()])
+                  if is_shareable(df[column])}
+        # distinct count is merged from distinct values, medians are computed here
+        shared_plan = {
+            column: {'distinct' if stat == 'distinct_count' else stat for stat in column_stats} - {'median'}
+            for column, column_stats in plan.items() if column in shared
+        }
+        shared_plan = {column: column_stats for column, column_stats in shared_plan.items() if column_stats}
+        shared_predicates = {key: predicate for key, predicate in predicates.items() if predicate.columns() <= shared}
+        columns = list(dict.fromkeys(
+            list(shared_plan) + [column for predicate in shared_predicates.values()
+                                 for column in sorted(predicate.columns())]
+        ))
+        if not columns:
+            return DqSuiteCompiler.compute_stats_pandas(df, plan, stats, predicates)
+
+        bounds = np.linspace(0, df.shape[0], self.workers * self.chunks_per_worker + 1).astype(int)
+        with DqSharedFrame(df, columns) as frame:
+            executor = self.get_executor()
+            futures = [
+                executor.submit(compute_chunk_stats, frame.spec, start, stop, shared_plan, shared_predicates,
+                                DqPredicateStats.max_unexpected_rows)
+                for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start
+            ]
+            # the rest is evaluated while the workers are running
+            DqSuiteCompiler.compute_stats_pandas(
+                df, {column: column_stats for column, column_stats in plan.items() if column not in shared}, stats,
+                {key: predicate for key, predicate in predicates.items() if key not in shared_predicates}
+            )
+            medians = {column: df[column].median() for column, column_stats in plan.items()
+                       if column in shared and 'median' in column_stats}
+            partials = [future.result() for future in futures]
+
+        for key in shared_predicates:
+            positions = [position for _, _, predicate_stats in partials for position in predicate_stats[key][1]]
+            stats.predicate_stats[key] = DqPredicateStats(
+                unexpected_count=sum(predicate_stats[key][0] for _, _, predicate_stats in partials),
+                unexpected_rows=[
+                    {column: to_python(value) for column, value in unexpected_row.items()}
+                    for unexpected_row in
+                    df.iloc[positions[:DqPredicateStats.max_unexpected_rows]].to_dict('records')
+                ]
+            )
+
+        for column, column_stats in plan.items():
+            if column not in shared:
+                continue
+            chunks = [column_stats_of_chunk.get(column, DqColumnStats()) for column_stats_of_chunk, _, _ in partials]
+            # the distinct values of the chunks are merged as one array (the same values as of the serial pass)
+            distinct = pd.concat([pd.Series(distinct_of_chunk[column]) for _, distinct_of_chunk, _ in partials],
+                                 ignore_index=True).unique() if column_stats & {'distinct', 'distinct_count'} else None
+            stats.column_stats[column] = DqColumnStats(
+                distinct=set(distinct) if 'distinct' in column_stats else None,
+                null_count=sum(chunk.null_count for chunk in chunks) if 'null_count' in column_stats else None,
+                min=merge_extreme([chunk.min for chunk in chunks], min) if 'min' in column_stats else None,
+                max=merge_extreme([chunk.max for chunk in chunks], max) if 'max' in column_stats else None,
+                distinct_count=len(distinct) if 'distinct_count' in column_stats else None,
+                median=medians.get(column)
+            )
+
+        # the order of the serial pass
+        stats.column_stats = {column: stats.column_stats[column] for column in plan}
+        stats.predicate_stats = {key: stats.predicate_stats[key] for key in predicates}
+        return stats
+
+    def close(self):
+        """
+        Stop the worker processes
+        :return: None
+        """
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
@@ -0,0 +1,216 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+import json
+import zlib
+import numpy as np
+import pandas as pd
+from data_quality.data_quality_core import DqStats, DqColumnStats, to_python, is_spark_df, get_observed_categories
+
+
+@dataclass
+class DqColumnProfile:
+    dtype: str
+    null_count: int
+    distinct_count: int
+    # distinct values (None if there are more than the distinct cap)
+    distinct: Optional[List] = None
+    min: Any = None
+    max: Any = None
+    median: Any = None
+    # equi-depth histogram of numeric columns: bin edges (every bin has ~1/bins of not null values)
+    histogram: Optional[List] = None
+
+    def to_stats(self) -> DqColumnStats:
+        return DqColumnStats(
+            distinct=set(self.distinct) if self.distinct is not None else None,
+            null_count=self.null_count,
+            min=self.min,
+            max=self.max,
+            distinct_count=self.distinct_count,
+            median=self.median
+        )
+
+
+@dataclass
+class DqProfile:
+    table_name: Optional[str]
+    ts: datetime
+    row_count: int
+    columns: Dict[str, DqColumnProfile] = field(default_factory=dict)
+
+    def to_stats(self) -> DqStats:
+        """
+        Get the statistics of the profiled data frame for the suite compiler (expectations are resolved from
+        the profile without touching the data again)
+        :return: DqStats
+        """
+        return DqStats(
+            columns=list(self.columns),
+            dtypes={column: column_profile.dtype for column, column_profile in self.columns.items()},
+            row_count=self.row_count,
+            column_stats={column: column_profile.to_stats() for column, column_profile in self.columns.items()}
+        )
+
+    def to_json(self) -> str:
+        return json.dumps({
+            'table_name': self.table_name,
+            'ts': str(self.ts),
+            'row_count': self.row_count,
+            'columns': {column: vars(column_profile) for column, column_profile in self.columns.items()}
+        }, default=str)
+
+    @classmethod
+    def from_json(cls, value: str) -> 'DqProfile':
+        values = json.loads(value)
+        return cls(
+            table_name=values['table_name'],
+            ts=pd.Timestamp(values['ts']).to_pydatetime(),
+            row_count=values['row_count'],
+            columns={column: DqColumnProfile(**column_profile)
+                     for column, column_profile in values['columns'].items()}
+        )
+
+
+class DqProfiler:
+
+    def __init__(self, distinct_cap: int = 100, bins: int = 10):
+        """
+        Computes the profile of every column of the data frame (dtype, null count, distinct values up to the cap,
+        min/max, median and histogram): one vectorized pass for Pandas, one agg for Spark
+        (plus one agg for the distinct values of the columns with not more than distinct_cap values)
+        :param distinct_cap: the max number of distinct values kept in the profile
+        :param bins: the number of bins of the histograms
+        """
+        self.distinct_cap = distinct_cap
+        self.bins = bins
+
+    def profile(self, df, table_name: str = None, ts: datetime = None) -> DqProfile:
+        """
+        Profile the data frame
+        :param df: DataFrame (Spark or Pandas)
+        :param table_name: the name of the profiled table
+        :param ts: the run time (now by default)
+        :return: DqProfile
+        """
+        ts = ts if ts else datetime.now()
+        if is_spark_df(df):
+            return self.profile_spark(df, table_name, ts)
+        return self.profile_pandas(df, table_name, ts)
+
+    def profile_pandas(self, df: pd.DataFrame, table_name: str, ts: datetime) -> DqProfile:
+        numeric_columns = list(df.select_dtypes(include='number').columns)
+        null_counts = df.isna().sum()
+        distinct_counts = df.nunique()
+        quantiles = df[numeric_columns].quantile(np.linspace(0, 1, self.bins + 1)) if numeric_columns else None
+
+        columns = {}
+        for column in df.columns:
+            # the categories are not ordered (no min/max of categorical): the observed categories are profiled
+            values = pd.Series(get_observed_categories(df[column])) \
+                if isinstance(df[column].dtype, pd.CategoricalDtype) else df[column].dropna()
+            numeric = column in numeric_columns
+            columns[column] = DqColumnProfile(
+                dtype=str(df[column].dtype),
+                null_count=int(null_counts[column]),
+                distinct_count=int(distinct_counts[column]),
+                distinct=sorted((to_python(value) for value in values.unique()), key=str)
+                if distinct_counts[column] <= self.distinct_cap else None,
+                min=to_python(values.min()) if len(values) else None,
+                max=to_python(values.max()) if len(values) else None,
+                median=to_python(values.median()) if numeric else None,
+                histogram=[to_python(value) for value in quantiles[column]] if numeric and len(values) else None
+            )
+        return DqProfile(table_name=table_name, ts=ts, row_count=df.shape[0], columns=columns)
+
+    def profile_spark(self, df, table_name: str, ts: datetime) -> DqProfile:
+        from pyspark.sql import functions as F
+
+        dtypes = dict(df.dtypes)
+        numeric_columns = [column for column, dtype in dtypes.items()
+                           if dtype in ('tinyint', 'smallint', 'int', 'bigint', 'float', 'double')
+                           or dtype.startswith('decimal')]
+        percentages = [float(value) for value in np.linspace(0, 1, self.bins + 1)]
+
+        expressions = [F.count(F.lit(1)).alias('row_count')]
+        for index, column in enumerate(df.columns):
+            expressions += [
+                F.sum(F.when(F.col(column).isNull(), 1).otherwise(0)).alias(f'c{index}_null_count'),
+                F.countDistinct(F.col(column)).alias(f'c{index}_distinct_count'),
+                F.min(F.col(column)).alias(f'c{index}_min'),
+                F.max(F.col(column)).alias(f'c{index}_max'),
+            ]
+            if column in numeric_columns:
+                expressions.append(F.percentile_approx(F.col(column), percentages).alias(f'c{index}_histogram'))
+        row = df.agg(*expressions).collect()[0]
+
+        # distinct values are collected for the low cardinality columns only (one more agg)
+        low_cardinality = [(index, column) for index, column in enumerate(df.columns)
+                           if (row[f'c{index}_distinct_count'] or 0) <= self.distinct_cap]
+        distinct = df.agg(*[F.collect_set(F.col(column)).alias(f'c{index}_distinct')
+                            for index, column in low_cardinality]).collect()[0] if low_cardinality else {}
+
+        columns = {}
+        for index, column in enumerate(df.columns):
+            histogram = row[f'c{index}_histogram'] if column in numeric_columns else None
+            columns[column] = DqColumnProfile(
+                dtype=dtypes[column],
+                null_count=row[f'c{index}_null_count'] or 0,
+                distinct_count=row[f'c{index}_distinct_count'],
+                distinct=sorted(distinct[f'c{index}_distinct'], key=str)
+                if (index, column) in low_cardinality else None,
+                min=row[f'c{index}_min'],
+                max=row[f'c{index}_max'],
+                # percentile_approx is not exact: the median is not taken from the histogram
+                median=None,
+                histogram=list(histogram) if histogram is not None else None
+            )
+        return DqProfile(table_name=table_name, ts=ts, row_count=row['row_count'], columns=columns)
+
+
+class DqProfileStore:
+
+    def __init__(self, connector, table_name: str = "dq_profile"):
+        """
+        Profiles saved to DB as compressed JSON (one row per table and run)
+        :param connector: connector to DB
+        :param table_name: the name of the profiles table
+        """
+        self.connector = connector
+        self.table_name = table_name
+        self.connector.execute(
+            f'CREATE TABLE IF NOT EXISTS {self.table_name} ('
+            f'table_name TEXT NOT NULL, ts TEXT NOT NULL, row_count INTEGER, profile BLOB NOT NULL, '
+            f'PRIMARY KEY (table_name, ts))'
+        )
+
+    def save(self, profile: DqProfile):
+        """
+        Save the profile (the profile of the same table and run is replaced)
+        :param profile: DqProfile
+        :return: None
+        """
+        with self.connector:
+            self.connector.execute(
+                f'INSERT OR REPLACE INTO {self.table_name} (table_name, ts, row_count, profile) VALUES (?, ?, ?, ?)',
+                (profile.table_name, str(profile.ts), profile.row_count,
+                 zlib.compress(profile.to_json().encode()))
+            )
+
+    def load(self, table_name: str, ts=None) -> Optional[DqProfile]:
+        """
+        Load the profile of the table
+        :param table_name: the name of the profiled table
+        :param ts: the run time (None - the latest profile)
+        :return: DqProfile or None if there is no profile
+        """
+        if ts is None:
+            row = self.connector.execute(
+                f'SELECT profile FROM {self.table_name} WHERE table_name = ? ORDER BY ts DESC LIMIT 1',
+                (table_name,)
+            ).fetchone()
+        else:
+            row = self.connector.execute(
+                f'SELECT profile FROM {self.table_name} WHERE table_name = ? AND ts = ?', (table_name, str(ts))
+            ).fetchone()
+        return DqProfile.from_json(zlib.decompress(row[0]).decode()) if row else None
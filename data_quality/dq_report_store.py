@@ -0,0 +1,366 @@
+from typing import List, Dict, Optional, Union
+import json
+import pandas as pd
+from data_quality.dq_row_ids import DqRowIds
+
+
+class DqReportStore:
+    # columns of the results (booleans are saved as integers 0/1)
+    result_columns: Dict[str, str] = {
+        'expectation_type': 'TEXT',
+        'kwargs': 'TEXT',
+        'description': 'TEXT',
+        'success': 'INTEGER',
+        'is_error': 'INTEGER',
+        'execution_mode': 'TEXT',
+        'sample_size': 'INTEGER',
+        'cached': 'INTEGER',
+        'unexpected_count': 'INTEGER',
+        'partial_unexpected_list': 'TEXT',
+        'duration_s': 'REAL',
+        'rows_scanned': 'INTEGER',
+        'spark_job_ids': 'TEXT',
+        'spark_stage_ids': 'TEXT',
+        'memory_delta_mb': 'REAL',
+        # the ids of the unexpected rows (DqRowIds blob) and their column (NULL - the index labels of the data frame)
+        'row_id_column': 'TEXT',
+        'unexpected_row_ids': 'BLOB',
+    }
+    # metrics of the finalize step of the run
+    run_metric_columns: Dict[str, str] = {
+        'duration_s': 'REAL',
+        'memory_delta_mb': 'REAL',
+        'spark_job_ids': 'TEXT',
+        'spark_stage_ids': 'TEXT',
+    }
+    boolean_columns = ('success', 'is_error', 'cached')
+
+    def __init__(self, connector, run_table: str = "dq_run", result_table: str = "dq_result",
+                 legacy_table: str = "dq_report"):
+        """
+        DQ report store: one row per DQ suite run (dq_run) and its results (dq_result) with indexes,
+        so the queries read the rows of the requested runs only (not the whole history)
+        :param connector: connector to DB
+        :param run_table: the name of the runs table
+        :param result_table: the name of the results table
+        :param legacy_table: the name of the legacy DQ report table (migrated on the first use of the store)
+        """
+        self.connector = connector
+        self.run_table = run_table
+        self.result_table = result_table
+        self.legacy_table = legacy_table
+        self.schema_checked = False
+
+    def ensure_schema(self):
+        """
+        Create the store tables and indexes (the legacy DQ report is migrated when the tables are created)
+        :return: None
+        """
+        if self.schema_checked:
+            return
+        tables = {row[0] for row in self.connector.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        result_columns = ', '.join(f'{column} {column_type}' for column, column_type in self.result_columns.items())
+        run_metric_columns = ', '.join(f'{column} {column_type}'
+                                       for column, column_type in self.run_metric_columns.items())
+        statements = [
+            f'CREATE TABLE IF NOT EXISTS {self.run_table} ('
+            f'run_id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT NOT NULL, table_name TEXT, '
+            f'results INTEGER NOT NULL DEFAULT 0, failures INTEGER NOT NULL DEFAULT 0, '
+            f'errors INTEGER NOT NULL DEFAULT 0, {run_metric_columns})',
+            f'CREATE TABLE IF NOT EXISTS {self.result_table} ('
+            f'run_id INTEGER NOT NULL REFERENCES {self.run_table} (run_id), table_name TEXT, {result_columns})',
+            f'CREATE INDEX IF NOT EXISTS {self.run_table}_table_name_ts ON {self.run_table} (table_name, ts)',
+            f'CREATE INDEX IF NOT EXISTS {self.run_table}_ts ON {self.run_table} (ts)',
+            f'CREATE INDEX IF NOT EXISTS {self.result_table}_run_id_success ON {self.result_table} (run_id, success)',
+            f'CREATE INDEX IF NOT EXISTS {self.result_table}_table_name_run_id_success '
+            f'ON {self.result_table} (table_name, run_id, success)',
+            f'CREATE INDEX IF NOT EXISTS {self.result_table}_expectation_type_run_id '
+            f'ON {self.result_table} (expectation_type, run_id)',
+        ]
+        # not executescript: it commits the pending transaction of the connection
+        for statement in statements:
+            self.connector.execute(statement)
+        # tables created by the previous versions of the store
+        for table, columns in ((self.run_table, self.run_metric_columns), (self.result_table, self.result_columns)):
+            existing = {row[1] for row in self.connector.execute(f'PRAGMA table_info({table})')}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    self.connector.execute(f'ALTER TABLE {table} ADD COLUMN {column} {column_type}')
+        self.schema_checked = True
+        if self.run_table not in tables and self.legacy_table in tables:
+            self.migrate_legacy()
+
+    def add_run(self, ts, table_name: str) -> int:
+        """
+        Register DQ suite run (without commit)
+        :param ts: the run time
+        :param table_name: the name of the validated table
+        :return: run_id
+        """
+        self.ensure_schema()
+        cursor = self.connector.execute(f'INSERT INTO {self.run_table} (ts, table_name) VALUES (?, ?)',
+                                        (str(ts), table_name))
+        return cursor.lastrowid
+
+    def add_results(self, run_id: int, records: List[Dict]):
+        """
+        Save results of the run and update the run counters (without commit)
+        :param run_id: run_id of the run
+        :param records: DQ report records of the run
+        :return: None
+        """
+        self.ensure_schema()
+        columns = ['run_id', 'table_name'] + list(self.result_columns)
+        self.connector.executemany(
+            f'INSERT INTO {self.result_table} ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)})',
+            [(run_id, record.get('table_name')) + tuple(self.to_db_value(column, record.get(column))
+                                                          for column in self.result_columns)
+             for record in records]
+        )
+        failures = [record for record in records if not record.get('success')]
+        self.connector.execute(
+            f'UPDATE {self.run_table} SET results = results + ?, failures = failures + ?, errors = errors + ? '
+            f'WHERE run_id = ?',
+            (len(records), len(failures), sum(bool(record.get('is_error')) for record in failures), run_id)
+        )
+
+    def add_records(self, records: List[Dict], run_ids: Dict[tuple, int], run_metrics: Dict[tuple, Dict]):
+        """
+        Save the records grouped by run (ts, table_name) and the metrics of the runs with results (without commit)
+        :param records: DQ report records
+        :param run_ids: dict {(ts, table_name): run_id} of the runs saved before (new runs are added to it)
+        :param run_metrics: dict {(ts, table_name): metrics}, the saved metrics are removed from it
+                            (the metrics of the runs without results are kept for the next call)
+        :return: None
+        """
+        runs: Dict[tuple, List[Dict]] = {}
+        for record in records:
+            runs.setdefault((str(record.get('ts')), record.get('table_name')), []).append(record)
+        for run_key, run_records in runs.items():
+            if run_key not in run_ids:
+                run_ids[run_key] = self.add_run(*run_key)
+            self.add_results(run_ids[run_key], run_records)
+        # runs without results are not registered
+        for run_key in [key for key in run_metrics if key in run_ids]:
+            self.set_run_metrics(run_ids[run_key], run_metrics.pop(run_key))
+
+    def set_run_metrics(self, run_id: int, metrics: Dict):
+        """
+        Save the metrics of the run finalize step (without commit)
+        :param run_id: run_id of the run
+        :param metrics: dict {duration_s, memory_delta_mb, spark_job_ids, spark_stage_ids}
+        :return: None
+        """
+        self.ensure_schema()
+        columns = list(self.run_metric_columns)
+        self.connector.execute(
+            f'UPDATE {self.run_table} SET {", ".join(f"{column} = ?" for column in columns)} WHERE run_id = ?',
+            tuple(json.dumps(metrics.get(column)) if isinstance(metrics.get(column), list) else metrics.get(column)
+                  for column in columns) + (run_id,)
+        )
+
+    def to_db_value(self, column: str, value):
+        if column in self.boolean_columns:
+            return None if value is None else int(bool(value))
+        return value
+
+    def migrate_legacy(self):
+        """
+        Copy the legacy DQ report ('TRUE'/'FALSE' text booleans, one row per result) to the store:
+        one run per (ts, table_name)
+        :return: None
+        """
+        legacy_columns = {row[1] for row in self.connector.execute(f'PRAGMA table_info({self.legacy_table})')}
+
+        def legacy_column(column: str) -> str:
+            if column not in legacy_columns:
+                return 'NULL'
+            if column in self.boolean_columns:
+                return f"CASE WHEN l.{column} IN ('TRUE', 'True', 1) THEN 1 " \
+                       f"WHEN l.{column} IN ('FALSE', 'False', 0) THEN 0 END"
+            return f'l.{column}'
+
+        table_name = legacy_column('table_name')
+        with self.connector:
+            self.connector.execute(
+                f'INSERT INTO {self.run_table} (ts, table_name) '
+                f'SELECT DISTINCT l.ts, {table_name} FROM {self.legacy_table} AS l ORDER BY l.ts'
+            )
+            self.connector.execute(
+                f'INSERT INTO {self.result_table} (run_id, table_name, {", ".join(self.result_columns)}) '
+                f'SELECT r.run_id, r.table_name, {", ".join(legacy_column(column) for column in self.result_columns)} '
+                f'FROM {self.legacy_table} AS l JOIN {self.run_table} AS r '
+                f'ON r.ts = l.ts AND r.table_name IS {table_name} ORDER BY l.rowid'
+            )
+            self.connector.execute(
+                f'UPDATE {self.run_table} SET '
+                f'results = (SELECT count(*) FROM {self.result_table} AS d WHERE d.run_id = {self.run_table}.run_id), '
+                f'failures = (SELECT count(*) FROM {self.result_table} AS d '
+                f'WHERE d.run_id = {self.run_table}.run_id AND d.success = 0), '
+                f'errors = (SELECT count(*) FROM {self.result_table} AS d '
+                f'WHERE d.run_id = {self.run_table}.run_id AND d.success = 0 AND d.is_error = 1)'
+            )
+
+    def latest_run(self, table_name: str = None) -> pd.DataFrame:
+        """
+        Get results of the latest run of every table (or of the table only)
+        :param table_name: the name of the validated table (None - all tables)
+        :return: DataFrame of the results with ts of the run
+        """
+        self.ensure_schema()
+        condition = 'WHERE table_name = ?' if table_name is not None else ''
+        return self.read_results(
+            f'SELECT max(run_id) FROM {self.run_table} {condition} GROUP BY table_name',
+            [table_name] if table_name is not None else []
+        )
+
+    def failures_since(self, since, table_name: str = None) -> pd.DataFrame:
+        """
+        Get failed results of all runs since the time
+        :param since: datetime (or the same string representation as ts)
+        :param table_name: the name of the validated table (None - all tables)
+        :return: DataFrame of the failed results with ts of the run
+        """
+        self.ensure_schema()
+        condition = 'AND table_name = ?' if table_name is not None else ''
+        return self.read_results(
+            f'SELECT run_id FROM {self.run_table} WHERE ts >= ? AND failures > 0 {condition}',
+            [str(since)] + ([table_name] if table_name is not None else []),
+            only_failures=True
+        )
+
+    def trend(self, expectation_type: str, table_name: str = None, limit: Optional[int] = None) -> pd.DataFrame:
+        """
+        Get results of the expectation over runs (e.g. for a dashboard)
+        :param expectation_type: the name of the expectation
+        :param table_name: the name of the validated table (None - all tables)
+        :param limit: the number of the latest runs (None - all runs)
+        :return: DataFrame of the results of the expectation ordered by ts
+        """
+        self.ensure_schema()
+        condition = 'AND d.table_name = ?' if table_name is not None else ''
+        sql = f'SELECT r.ts, d.* FROM {self.result_table} AS d JOIN {self.run_table} AS r USING (run_id) ' \
+              f'WHERE d.expectation_type = ? {condition} ORDER BY d.run_id DESC'
+        params = [expectation_type] + ([table_name] if table_name is not None else [])
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self.to_report(pd.read_sql_query(sql, self.connector, params=params)).iloc[::-1] \
+            .reset_index(drop=True)
+
+    def hot_expectations(self, table_name: str = None, since=None, limit: Optional[int] = 10) -> pd.DataFrame:
+        """
+        Get the slowest expectations over runs (to find the expectations responsible for long DQ suites)
+        :param table_name: the name of the validated table (None - all tables)
+        :param since: datetime (or the same string representation as ts), None - all runs
+        :param limit: the number of the expectations (None - all)
+        :return: DataFrame with runs, total/avg/max duration_s, avg rows_scanned and max memory_delta_mb
+                 of every expectation ordered by total duration
+        """
+        self.ensure_schema()
+        conditions = ['d.duration_s IS NOT NULL']
+        params = []
+        if table_name is not None:
+            conditions.append('d.table_name = ?')
+            params.append(table_name)
+        if since is not None:
+            conditions.append('r.ts >= ?')
+            params.append(str(since))
+        sql = f'SELECT d.table_name, d.expectation_type, d.kwargs, count(*) AS runs, ' \
+              f'sum(d.duration_s) AS total_duration_s, avg(d.duration_s) AS avg_duration_s, ' \
+              f'max(d.duration_s) AS max_duration_s, avg(d.rows_scanned) AS avg_rows_scanned, ' \
+              f'max(d.memory_delta_mb) AS max_memory_delta_mb ' \
+              f'FROM {self.result_table} AS d JOIN {self.run_table} AS r USING (run_id) ' \
+              f'WHERE {" AND ".join(conditions)} ' \
+              f'GROUP BY d.table_name, d.expectation_type, d.kwargs ORDER BY total_duration_s DESC'
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return pd.read_sql_query(sql, self.connector, params=params)
+
+    def get_row_ids(self, table_name: str, expectation_type: str, column: str = None,
+                    run_id: int = None) -> Optional[DqRowIds]:
+        """
+        Get the ids of the unexpected rows of the failed expectation
+        :param table_name: the name of the validated table
+        :param expectation_type: the name of the expectation
+        :param column: the column of the expectation (None - any column)
+        :param run_id: run_id of the run (None - the latest run of the table)
+        :return: DqRowIds (the ids of all matching results of the run) or None if no ids are saved
+        """
+        self.ensure_schema()
+        conditions = ['table_name = ?', 'expectation_type = ?', 'unexpected_row_ids IS NOT NULL']
+        params = [table_name, expectation_type]
+        if column is not None:
+            conditions.append("json_extract(kwargs, '$.column') = ?")
+            params.append(column)
+        if run_id is None:
+            conditions.append(f'run_id = (SELECT max(run_id) FROM {self.run_table} WHERE table_name = ?)')
+            params.append(table_name)
+        else:
+            conditions.append('run_id = ?')
+            params.append(run_id)
+        rows = self.connector.execute(
+            f'SELECT row_id_column, unexpected_row_ids FROM {self.result_table} WHERE {" AND ".join(conditions)}',
+            params
+        ).fetchall()
+        if not rows:
+            return None
+        row_ids = [DqRowIds.decode(blob, row_id_column) for row_id_column, blob in rows]
+        return DqRowIds(
+            column=row_ids[0].column,
+            ids=[value for ids in row_ids for value in ids.ids],
+            truncated=any(ids.truncated for ids in row_ids)
+        )
+
+    def fetch_unexpected_rows(self, table_name: str, expectation_type: str, source: Union[str, pd.DataFrame],
+                              column: str = None, run_id: int = None, batch_size: int = 500) -> pd.DataFrame:
+        """
+        Fetch the unexpected rows of the failed expectation by their ids (without running the check again)
+        :param table_name: the name of the validated table
+        :param expectation_type: the name of the expectation
+        :param source: the validated data: the name of the table in the store DB (e.g. 'sales_output_male')
+                       or pandas DataFrame (required for the ids of the index labels)
+        :param column: the column of the expectation (None - any column)
+        :param run_id: run_id of the run (None - the latest run of the table)
+        :param batch_size: the number of ids in one query
+        :return: DataFrame of the unexpected rows (empty if no ids are saved)
+        """
+        row_ids = self.get_row_ids(table_name, expectation_type, column=column, run_id=run_id)
+        ids = row_ids.ids if row_ids is not None else []
+        if isinstance(source, pd.DataFrame):
+            if row_ids is None or row_ids.column is None:
+                return source.loc[source.index.isin(ids)]
+            return source.loc[source[row_ids.column].isin(ids)]
+
+        if row_ids is None:
+            return pd.read_sql_query(f'SELECT * FROM "{source}" WHERE 0', self.connector)
+        if row_ids.column is None:
+            raise ValueError(f"The ids of '{expectation_type}' are the index labels of the validated data frame, "
+                             f"pass the data frame as the source")
+        # the lookups by id use the index of the id column if the table has it (created on load by SqliteSink)
+        return pd.concat([
+            pd.read_sql_query(
+                f'SELECT * FROM "{source}" WHERE "{row_ids.column}" IN ({", ".join("?" for _ in batch)})',
+                self.connector,
+                params=batch
+            )
+            for batch in [ids[start:start + batch_size] for start in range(0, max(len(ids), 1), batch_size)]
+        ], ignore_index=True)
+
+    def read_results(self, runs_sql: str, params: List, only_failures: bool = False) -> pd.DataFrame:
+        condition = 'AND d.success = 0' if only_failures else ''
+        return self.to_report(pd.read_sql_query(
+            f'SELECT r.ts, d.* FROM {self.result_table} AS d JOIN {self.run_table} AS r USING (run_id) '
+            f'WHERE d.run_id IN ({runs_sql}) {condition} ORDER BY d.run_id, d.rowid',
+            self.connector,
+            params=params
+        ))
+
+    def to_report(self, df: pd.DataFrame) -> pd.DataFrame:
+        # integer booleans to bool, ts to datetime
+        for column in self.boolean_columns:
+            df[column] = df[column].map({1: True, 0: False})
+        df['ts'] = pd.to_datetime(df['ts'])
+        return df
+
@@ -0,0 +1,62 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+import json
+import zlib
+import numpy as np
+
+
+@dataclass
+class DqRowIds:
+    """
+    The ids of the unexpected rows of one expectation saved to the DQ report as a compressed blob:
+    integer ids as delta encoded runs of consecutive ids, other ids as sorted JSON list
+    """
+    # the id column of the validated data frame (None - the index labels of the pandas data frame)
+    column: Optional[str]
+    ids: List = field(default_factory=list)
+    # there are more unexpected rows than the saved ids (the number of ids is capped)
+    truncated: bool = False
+
+    # the kinds of the blob (the first byte)
+    runs_kind = b'R'
+    json_kind = b'J'
+
+    def encode(self) -> bytes:
+        """
+        :return: the blob (kind byte + zlib compressed payload)
+        """
+        if self.ids and all(isinstance(value, (int, np.integer)) and not isinstance(value, bool) for value in self.ids):
+            # python and numpy integers are sorted together by value
+            values = np.unique(np.asarray([int(value) for value in self.ids], dtype=np.int64))
+            # the runs of consecutive ids: the gap from the end of the previous run and the length of the run
+            starts = np.flatnonzero(np.diff(values, prepend=values[0] - 2) != 1)
+            lengths = np.diff(np.append(starts, len(values)))
+            gaps = np.diff(values[starts], prepend=0)
+            gaps[1:] -= lengths[:-1]
+            payload = np.concatenate([[int(self.truncated)], np.column_stack([gaps, lengths]).ravel()])
+            return self.runs_kind + zlib.compress(payload.astype('<i8').tobytes())
+        ids = sorted(set(self.ids), key=lambda value: (str(type(value)), value))
+        payload = json.dumps({'truncated': self.truncated, 'ids': ids}, default=str)
+        return self.json_kind + zlib.compress(payload.encode())
+
+    @classmethod
+    def decode(cls, blob: bytes, column: Optional[str] = None) -> 'DqRowIds':
+        """
+        :param blob: the blob created by encode
+        :param column: the id column
+        :return: DqRowIds
+        """
+        kind, payload = blob[:1], zlib.decompress(blob[1:])
+        if kind == cls.json_kind:
+            values = json.loads(payload)
+            return cls(column=column, ids=values['ids'], truncated=values['truncated'])
+
+        values = np.frombuffer(payload, dtype='<i8')
+        gaps, lengths = values[1::2], values[2::2]
+        ids = []
+        end = 0
+        for gap, length in zip(gaps.tolist(), lengths.tolist()):
+            start = end + gap
+            ids.extend(range(start, start + length))
+            end = start + length
+        return cls(column=column, ids=ids, truncated=bool(values[0]))
@@ -0,0 +1,107 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+from dataclasses import dataclass
+from typing import Any, Callable, List, Dict, Optional, Tuple
+import pandas as pd
+from data_quality.data_quality_core import DataQuality, DqReportWriter
+from data_quality.dq_connections import DqReportService, get_report_service
+
+
+@dataclass
+class DqJob:
+    df: Any
+    suite_class: type
+    table_name: str
+    # options for DataQuality of this job only (e.g. the profile of df)
+    dq_options: Optional[Dict] = None
+    # called when the suite of this job has no errors (e.g. publish the output), before the errors are raised
+    on_success: Optional[Callable] = None
+
+
+def run_dq_job(df, suite_class: type, table_name: str, dq_options: Dict = None) -> Tuple[List[Dict], Dict]:
+    """
+    Run DQ suite for one data frame and collect the results (nothing is written to DB and raised here)
+    :param df: DataFrame (Spark or Pandas)
+    :param suite_class: DQ suite class (SalesDqMaleOutput, SalesDqFemaleOutput ...)
+    :param table_name: the name of the table for the DQ report
+    :param dq_options: additional options for DataQuality (execution_mode, result_cache ...)
+    :return: tuple (list of DQ report records, dict {(ts, table_name): the metrics of the finalize step})
+    """
+    report_writer = DqReportWriter()
+    suite = suite_class(df, table_name=table_name, finalize=False, report_writer=report_writer, **(dq_options or {}))
+    suite.dq.dq_evaluate()
+    return report_writer.records, report_writer.run_metrics
+
+
+class DqRunner:
+
+    def __init__(self, connector=None, cursor=None, executor: str = "thread", max_workers: int = None,
+                 dq_options: Dict = None, report_service: DqReportService = None):
+        """
+        Runs DQ suites of several data frames concurrently, saves all results to DQ report with one write,
+        calls on_success of the jobs without errors and raises errors/warnings of all suites in one finalize step
+        :param connector: connector to DB (to save DQ report)
+        :param cursor: cursor to DB (to save DQ report)
+        :param executor: 'thread' (Spark and Pandas, Spark jobs are submitted to the cluster at the same time)
+                         or 'process' (Pandas only, the data frames are pickled to the worker processes)
+        :param max_workers: the number of workers (by default one per job)
+        :param dq_options: additional options for DataQuality of all jobs (should be picklable for 'process')
+        :param report_service: the DQ report service the results are saved by when connector is not passed
+                               (the shared service of data/sales_pipeline.db by default)
+        """
+        if executor not in ("thread", "process"):
+            raise ValueError(f"Unknown executor '{executor}', expected 'thread' or 'process'")
+        self.connector = connector
+        self.cursor = self.connector.cursor() if connector and not cursor else cursor
+        self.report_service = None if connector else report_service if report_service else get_report_service()
+        self.executor = executor
+        self.max_workers = max_workers
+        self.dq_options = dq_options if dq_options else {}
+
+    def run(self, jobs: List[DqJob]) -> pd.DataFrame:
+        """
+        Run all DQ jobs, save the merged report and finalize: every job without errors is completed
+        with its on_success (an error of one output does not block the others), then errors are raised
+        if exist and all warnings
+        :param jobs: list of DqJob (data frame, suite class, table name, on_success)
+        :return: merged DQ report of all jobs
+        """
+        if not jobs:
+            return pd.DataFrame(columns=DataQuality.dq_report_fields)
+
+        if self.executor == "thread":
+            pool = ThreadPoolExecutor(max_workers=self.max_workers or len(jobs))
+        else:
+            # fork is not safe when other threads of the pipeline hold SQLite locks (e.g. asynchronous DQ):
+            # the workers are forked from the single threaded fork server
+            pool = ProcessPoolExecutor(max_workers=self.max_workers or len(jobs), mp_context=multiprocessing.get_context(
+                "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else None))
+        with pool:
+            futures = [
+                pool.submit(run_dq_job, job.df, job.suite_class, job.table_name,
+                            dict(self.dq_options, **(job.dq_options or {})))
+                for job in jobs
+            ]
+            results = [future.result() for future in futures]
+
+        # save results and finalize metrics of all jobs with one write
+        report_writer = DqReportWriter(
+            connector=self.connector,
+            cursor=self.cursor,
+            service=self.report_service
+        )
+        for records, run_metrics in results:
+            for record in records:
+                report_writer.add(record)
+            report_writer.run_metrics.update(run_metrics)
+        report_writer.flush()
+
+        for job, (records, _) in zip(jobs, results):
+            if job.on_success is not None and not any(record.get('is_error') and not record.get('success')
+                                                      for record in records):
+                job.on_success()
+
+        # finalize all jobs together
+        DataQuality.raise_dq_exceptions(report_writer)
+        return pd.DataFrame([record for records, _ in results for record in records],
+                            columns=DataQuality.dq_report_fields)
@@ -1,81 +1,492 @@
 import os
 from data_quality.dq_female_output import SalesDqFemaleOutput
 from data_quality.dq_male_output import SalesDqMaleOutput
+from data_quality.dq_runner import DqRunner, DqJob
+from data_quality.data_quality_core import DqResultCache, DqStreamAccumulator
+from data_quality.dq_profiler import DqProfiler, DqProfileStore
+from data_quality.dq_connections import get_connection_pool, get_report_service
+from data_quality.dq_parallel import DqParallelEngine
+from output_sinks import OutputSink, OutputWriter, SqliteSink, JsonSink, CsvSink, get_insert_sql, get_rows, \
+    create_indexes
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, Union, Tuple, List, Any, Iterator, Callable, Optional, Collection
+from dataclasses import dataclass
+from functools import partial
+import argparse
 import pandas as pd
 import sqlite3
 
 
+@dataclass(frozen=True)
+class SalesQuery:
+    """
+    Lazy query over the input table: pipeline steps add predicates, the data is read only by
+    SalesDataPipeline.collect with one SQLite query (all predicates are pushed down as typed parameters)
+    """
+    table: str = "sales_input_data"
+    columns: Tuple[str, ...] = ()
+    predicates: Tuple[Tuple[str, str, Any], ...] = ()
+
+    operators = ("=", "!=", "<", "<=", ">", ">=", "IN")
+
+    def where(self, column: str, operator: str, value) -> 'SalesQuery':
+        """
+        Add predicate (all predicates are combined with AND)
+        :param column: the name of the column
+        :param operator: one of SalesQuery.operators
+        :param value: the value (list of values for 'IN')
+        :return: new SalesQuery
+        """
+        if operator not in self.operators:
+            raise ValueError(f"Unsupported operator '{operator}', expected one of {self.operators}")
+        value = tuple(value) if operator == "IN" else value
+        return SalesQuery(self.table, self.columns, self.predicates + ((self.quote(column), operator, value),))
+
+    def select(self, *columns: str) -> 'SalesQuery':
+        """
+        Read only the columns (all columns by default)
+        :param columns: the names of the columns
+        :return: new SalesQuery
+        """
+        return SalesQuery(self.table, tuple(self.quote(column) for column in columns), self.predicates)
+
+    def to_sql(self) -> Tuple[str, List]:
+        """
+        :return: tuple (SQL query, list of parameters)
+        """
+        conditions = []
+        params = []
+        for column, operator, value in self.predicates:
+            if operator == "IN":
+                conditions.append(f'{column} IN ({", ".join("?" for _ in value)})')
+                params.extend(value)
+            else:
+                conditions.append(f'{column} {operator} ?')
+                params.append(value)
+
+        sql = f'SELECT {", ".join(self.columns) if self.columns else "*"} FROM {self.quote(self.table)}'
+        if conditions:
+            sql += f' WHERE {" AND ".join(conditions)}'
+        return sql, params
+
+    @staticmethod
+    def quote(identifier: str) -> str:
+        if identifier.startswith('"') and identifier.endswith('"'):
+            return identifier
+        if not identifier.isidentifier():
+            raise ValueError(f"Invalid column or table name '{identifier}'")
+        return f'"{identifier}"'
+
+
+@dataclass(frozen=True)
+class SalesSchema:
+    """
+    Compact in-memory dtypes of the input table: low cardinality text columns are categoricals, numeric columns
+    are downcast when their values do not change and date/time are parsed once to datetime64
+    (restore converts date/time back to the source text for the outputs)
+    """
+    categories: Tuple[str, ...] = ("branch", "city", "customer_type", "gender", "product_line", "payment")
+    # dates in the source format m/d/yyyy (without leading zeros)
+    dates: Tuple[str, ...] = ("date",)
+    # times in the source format hh:mm
+    times: Tuple[str, ...] = ("time",)
+
+    def apply(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convert the columns of the data frame read from DB to the compact dtypes (in place)
+        :param df: pandas DataFrame
+        :return: the same DataFrame
+        """
+        for column in df.columns:
+            if column in self.categories:
+                df[column] = df[column].astype("category")
+            elif column in self.dates:
+                df[column] = pd.to_datetime(df[column], format="%m/%d/%Y")
+            elif column in self.times:
+                df[column] = pd.to_datetime(df[column], format="%H:%M")
+            elif pd.api.types.is_integer_dtype(df[column].dtype):
+                df[column] = pd.to_numeric(df[column], downcast="integer")
+            elif pd.api.types.is_float_dtype(df[column].dtype):
+                # prices are not exact in float32: the column is downcast only if all values are kept
+                values = df[column].astype("float32")
+                if ((values.astype("float64") == df[column]) | df[column].isna()).all():
+                    df[column] = values
+        return df
+
+    def concat(self, frames: List[pd.DataFrame]) -> pd.DataFrame:
+        """
+        Concatenate the chunks converted by apply (pd.concat converts categoricals with different categories to text)
+        :param frames: list of pandas DataFrames
+        :return: pandas DataFrame
+        """
+        for column in self.categories:
+            if frames and column in frames[0].columns:
+                categories = pd.api.types.union_categoricals([frame[column] for frame in frames]).categories
+                for frame in frames:
+                    frame[column] = frame[column].cat.set_categories(categories)
+        return pd.concat(frames, ignore_index=True)
+
+    def restore(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convert date/time back to the source text (categoricals and numbers are written as their values)
+        :param df: pandas DataFrame converted by apply
+        :return: new pandas DataFrame
+        """
+        columns = {}
+        for column in self.dates:
+            if column in df.columns and pd.api.types.is_datetime64_any_dtype(df[column].dtype):
+                values = df[column]
+                columns[column] = (values.dt.month.astype("Int64").astype(str) + "/"
+                                   + values.dt.day.astype("Int64").astype(str) + "/"
+                                   + values.dt.year.astype("Int64").astype(str)).where(values.notna())
+        for column in self.times:
+            if column in df.columns and pd.api.types.is_datetime64_any_dtype(df[column].dtype):
+                columns[column] = df[column].dt.strftime("%H:%M")
+        return df.assign(**columns) if columns else df
+
+
 class SalesDataPipeline:
-    def __init__(self):
+    # the ids of the unexpected rows saved by the DQ suites: the output tables are indexed by them on load
+    # (DqReportStore.fetch_unexpected_rows looks the rows up by id)
+    output_index_columns = ["invoice_id"]
+
+    def __init__(self, output_sinks: List[OutputSink] = None, path_to_db: str = None, output_path: str = None,
+                 compact: bool = False, chunksize: int = 100000, dq_workers: int = None):
         """
         Example of the Data Pipeline based on the Pandas
         (do not judge strictly - I am not a date engineer :) )
+        :param output_sinks: the sinks every output is written to concurrently
+                             (SQLite bulk load, indented JSON and CSV by default)
+        :param path_to_db: the path to the pipeline DB (data/sales_pipeline.db by default)
+        :param output_path: the directory of the output files (data/ by default)
+        :param compact: read the input with the compact dtypes of SalesSchema (categoricals, downcast numbers,
+                        parsed date/time), the outputs are written in the source format
+        :param chunksize: the number of rows converted at once by the compact read (the text of the whole
+                          table is not kept in memory together with the converted columns)
+        :param dq_workers: evaluate the DQ passes of large outputs on N worker processes (DqParallelEngine,
+                           the columns are shared through shared memory, the results are the same as of one process)
         """
-        self.path_to_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sales_pipeline.db")
+        self.schema = SalesSchema() if compact else None
+        self.chunksize = chunksize
+        data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+        self.path_to_db = path_to_db if path_to_db else os.path.join(data_path, "sales_pipeline.db")
         self.connector = sqlite3.connect(self.path_to_db)
+        # WAL: DQ report / cache writes of the background DQ do not conflict with the readers of the staged outputs
+        # (switched once here, not by the first sink write while other connections are open)
+        self.connector.execute("PRAGMA journal_mode=WAL")
         self.cursor = self.connector.cursor()
 
-        self.output_csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sales_csv")
-        self.output_json_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sales_json")
+        self.output_csv_path = os.path.join(output_path if output_path else data_path, "sales_csv")
+        self.output_json_path = os.path.join(output_path if output_path else data_path, "sales_json")
         self.sales_data_frame = None
+        self.output_writer = OutputWriter(
+            output_sinks if output_sinks is not None else [
+                SqliteSink(path_to_db=self.path_to_db, index_columns=self.output_index_columns),
+                JsonSink(path=self.output_json_path),
+                CsvSink(path=self.output_csv_path)
+            ]
+        )
 
-    def get_sales_separated_by_gender(self, gender: str) -> pd.DataFrame:
-        self.sales_data_frame = pd.read_sql_query("SELECT * FROM sales_input_data", self.connector)
-        df = self.sales_data_frame.loc[self.sales_data_frame['gender'] == gender]
-        return df
+        # results of DQ checks for unchanged data are taken from the cache (retries, backfills, re-runs)
+        self.dq_result_cache = DqResultCache(path_to_db=self.path_to_db)
+        self.dq_engine = DqParallelEngine(workers=dq_workers) if dq_workers else None
+
+    @staticmethod
+    def get_sales_query(columns: List[str] = None) -> SalesQuery:
+        """
+        Start lazy pipeline over the input table
+        :param columns: the columns to read (all by default)
+        :return: SalesQuery
+        """
+        query = SalesQuery(table="sales_input_data")
+        return query.select(*columns) if columns else query
+
+    def get_sales_separated_by_gender(self, gender: str, lazy: bool = False) -> Union[pd.DataFrame, SalesQuery]:
+        query = self.get_sales_query().where("gender", "=", gender)
+        if lazy:
+            return query
+        self.sales_data_frame = self.collect(query)
+        return self.sales_data_frame
 
     @staticmethod
-    def get_sales_by_payment_method(payment_method: str, df: pd.DataFrame):
+    def get_sales_by_payment_method(payment_method: str, df: Union[pd.DataFrame, SalesQuery]):
+        if isinstance(df, SalesQuery):
+            return df.where("payment", "=", payment_method)
         df = df.loc[df['payment'] == payment_method]
         return df
 
     @staticmethod
-    def get_sales_price_lower_then(price_lower: int, df: pd.DataFrame):
+    def get_sales_price_lower_then(price_lower: int, df: Union[pd.DataFrame, SalesQuery]):
+        if isinstance(df, SalesQuery):
+            return df.where("unit_price", "<", price_lower)
         df = df.loc[df['unit_price'] < price_lower]
         return df
 
     @staticmethod
-    def get_sales_quantity_lower_then(quantity_lower: int, df: pd.DataFrame):
+    def get_sales_quantity_lower_then(quantity_lower: int, df: Union[pd.DataFrame, SalesQuery]):
+        if isinstance(df, SalesQuery):
+            return df.where("quantity", "<", quantity_lower)
         df = df.loc[df['quantity'] < quantity_lower]
         return df
 
+    def fan_out(self, df: Union[pd.DataFrame, SalesQuery], key: str,
+                segments: Dict[Any, str] = None) -> Dict[Any, pd.DataFrame]:
+        """
+        Split the result of the shared pipeline steps into the outputs by the key column in one pass
+        (the shared steps are applied once, a new output does not add a scan of the input)
+        :param df: pandas DataFrame or SalesQuery (read with one SQLite query)
+        :param key: the column to split by
+        :param segments: dict {key value: output name} (all values of the key by default, outputs are named by the values)
+        :return: dict {output name: data frame} (empty data frame for the segment without rows),
+                 the outputs keep the index of the source rows
+        """
+        if isinstance(df, SalesQuery):
+            df = self.collect(df.where(key, "IN", list(segments)) if segments else df)
+        groups = {value: group for value, group in df.groupby(key, sort=False, observed=True)}
+        segments = segments if segments else {value: value for value in groups}
+        return {name: groups[value] if value in groups else df.iloc[0:0] for value, name in segments.items()}
+
+    def collect(self, query: SalesQuery) -> pd.DataFrame:
+        """
+        Read the result of the lazy pipeline with one SQLite query
+        :param query: SalesQuery
+        :return: pandas DataFrame
+        """
+        sql, params = query.to_sql()
+        if self.schema is None:
+            return pd.read_sql_query(sql, self.connector, params=params)
+        frames = [self.schema.apply(chunk)
+                  for chunk in pd.read_sql_query(sql, self.connector, params=params, chunksize=self.chunksize)]
+        if not frames:
+            return self.schema.apply(pd.read_sql_query(sql, self.connector, params=params))
+        return self.schema.concat(frames)
+
+    def to_output(self, df: pd.DataFrame) -> pd.DataFrame:
+        # the outputs are written in the source format
+        return self.schema.restore(df) if self.schema is not None else df
+
     def save_output(self, output_data: pd.DataFrame, output_table: str):
-        self.save_output_to_db(
-            table_name=output_table,
-            df=output_data
-        )
-        output_data.to_json(
-            os.path.join(self.output_json_path, f"{output_table}.json"),
-            indent=3
-        )
-        output_data.to_csv(
-            path_or_buf=os.path.join(self.output_csv_path, f"{output_table}.csv")
-        )
+        self.output_writer.write(df=self.to_output(output_data), output_table=output_table)
+
+    def save_output_to_db(self, table_name: str, df: pd.DataFrame, commit: bool = True):
+        self.cursor.executemany(get_insert_sql(table_name, list(df.columns)), get_rows(df))
+        if commit:
+            self.connector.commit()
+
+    def save_output_after_dq(self, outputs: Dict[str, pd.DataFrame], dq_future: Future,
+                             passed_outputs: Collection[str] = ()):
+        """
+        Write the outputs to the staging locations of all sinks while DQ is running and publish every output
+        when DQ is finalized without errors or its DQ suite passed (the other staged outputs are discarded)
+        :param outputs: dict {output table: data frame}
+        :param dq_future: the future of the asynchronous DQ checks of the outputs
+        :param passed_outputs: the output tables whose DQ suites passed (filled by on_success of the DQ checks),
+                               they are published even if DQ of the other outputs fails
+        :return: None
+        """
+        try:
+            for output_table, output_data in outputs.items():
+                self.output_writer.stage(df=self.to_output(output_data), output_table=output_table)
+        except Exception:
+            # the DQ report is saved before the staged outputs are discarded
+            wait([dq_future])
+            for output_table in outputs:
+                self.output_writer.discard(output_table=output_table)
+            raise
+        wait([dq_future])
+        for output_table in outputs:
+            if dq_future.exception() is None or output_table in passed_outputs:
+                self.output_writer.promote(output_table=output_table)
+            else:
+                self.output_writer.discard(output_table=output_table)
+        dq_future.result()
+
+    def run_async(self, function: Callable, **kwargs) -> Future:
+        """
+        Run the function in the background thread (the DQ results are saved by the report service,
+        the pipeline connection is not used by other threads)
+        :param function: the function to run
+        :param kwargs: the arguments of the function
+        :return: Future of the function result
+        """
+        pool = ThreadPoolExecutor(max_workers=1)
+        future = pool.submit(function, **kwargs)
+        pool.shutdown(wait=False)
+        return future
+
+    def get_sales_chunks(self, query: SalesQuery = None, chunksize: int = 10000) -> Iterator[pd.DataFrame]:
+        """
+        Read the input table (or the lazy pipeline result) chunk by chunk
+        :param query: SalesQuery (the whole input table by default)
+        :param chunksize: the number of rows in one chunk
+        :return: iterator of pandas DataFrames (the index continues over the chunks as in the whole result)
+        """
+        sql, params = (query if query else self.get_sales_query()).to_sql()
+        rows_read = 0
+        for chunk in pd.read_sql_query(sql, self.connector, params=params, chunksize=chunksize):
+            chunk.index += rows_read
+            rows_read += chunk.shape[0]
+            yield self.schema.apply(chunk) if self.schema is not None else chunk
+
+    def run_streaming(self, chunksize: int = 10000):
+        """
+        Streaming version of the pipeline for inputs larger than RAM (constant memory regardless of input size):
+        the input table is read once chunk by chunk, every chunk goes through the pipeline steps for both outputs,
+        DQ suites accumulate mergeable partial results and the outputs are written to staging chunk by chunk.
+        The outputs are published only when DQ of all outputs is finalized without errors
+        :param chunksize: the number of input rows in one chunk
+        :return: None
+        """
+        outputs = {
+            "male_output": ("Male", "sales_output_male", SalesDqMaleOutput),
+            "female_output": ("Female", "sales_output_female", SalesDqFemaleOutput),
+        }
+        dq_streams = {table_name: DqStreamAccumulator() for table_name in outputs}
+        staged_files = {}
 
-    def save_output_to_db(self, table_name: str, df: pd.DataFrame):
-        self.cursor.executemany(f'insert into {table_name} '
-                                f'(invoice_id, branch, city, customer_type, gender, product_line, unit_price, quantity,'
-                                f'tax, total, date, time, payment, cogs, gross_margin_percentage, gross_income, rating)'
-                                f'values (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?);',
-                                df.to_records(index=False))
-        self.connector.commit()
+        # outputs are staged in temp tables (they do not lock the DB for the DQ report)
+        for _, output_table, _ in outputs.values():
+            self.cursor.execute(f'CREATE TEMP TABLE {output_table}_staging AS SELECT * FROM main.{output_table} WHERE 0')
 
-    def data_quality_checks_sales_pipeline(self, df: pd.DataFrame, table_name: str):
+        try:
+            for chunk_number, chunk in enumerate(self.get_sales_chunks(chunksize=chunksize)):
+                # pipeline steps 2-4 for the chunk (once for all outputs)
+                chunk = self.get_sales_by_payment_method(df=chunk, payment_method="Credit card")
+                chunk = self.get_sales_price_lower_then(df=chunk, price_lower=50)
+                chunk = self.get_sales_quantity_lower_then(df=chunk, quantity_lower=3)
+
+                # pipeline step 1: the chunk is split into the outputs by gender
+                chunk_outputs = self.fan_out(chunk, key="gender", segments={
+                    gender: table_name for table_name, (gender, _, _) in outputs.items()
+                })
+                for table_name, (gender, output_table, dq_suite) in outputs.items():
+                    df = chunk_outputs[table_name]
+
+                    # DATA QUALITY - partial results of the chunk
+                    dq_suite(
+                        df,
+                        connector=self.connector,
+                        cursor=self.cursor,
+                        table_name=table_name,
+                        finalize=False,
+                        stream_accumulator=dq_streams[table_name]
+                    ).dq.run_suite()
+
+                    # save the chunk to staging
+                    staged_files.update(self.save_output_chunk(df, output_table, first_chunk=chunk_number == 0))
+
+            # DATA QUALITY - resolve expectations from the merged results of all chunks
+            for table_name, dq_stream in dq_streams.items():
+                dq_stream.dq_finalize(connector=self.connector, cursor=self.cursor, table_name=table_name)
+            # publish the outputs
+            for _, output_table, _ in outputs.values():
+                self.cursor.execute(f'INSERT INTO main.{output_table} SELECT * FROM temp.{output_table}_staging')
+                create_indexes(self.connector, output_table, self.output_index_columns)
+            self.connector.commit()
+            for staged_path, output_path in staged_files.items():
+                os.replace(staged_path, output_path)
+        except Exception:
+            for staged_path in staged_files:
+                if os.path.exists(staged_path):
+                    os.remove(staged_path)
+            raise
+        finally:
+            for _, output_table, _ in outputs.values():
+                self.cursor.execute(f'DROP TABLE temp.{output_table}_staging')
+            self.connector.commit()
+
+    def save_output_chunk(self, output_data: pd.DataFrame, output_table: str, first_chunk: bool) -> Dict[str, str]:
+        """
+        Append the chunk of the output to the staging table and staging files (JSON lines and CSV)
+        :param output_data: the chunk of the output
+        :param output_table: the name of the output table
+        :param first_chunk: the staging files are created by the first chunk
+        :return: dict {staging file path: output file path}
+        """
+        output_data = self.to_output(output_data)
+        self.save_output_to_db(table_name=f"temp.{output_table}_staging", df=output_data, commit=False)
+
+        os.makedirs(self.output_json_path, exist_ok=True)
+        os.makedirs(self.output_csv_path, exist_ok=True)
+        json_path = os.path.join(self.output_json_path, f"{output_table}.jsonl")
+        csv_path = os.path.join(self.output_csv_path, f"{output_table}.csv")
+
+        with open(f"{json_path}.staging", "w" if first_chunk else "a") as json_file:
+            if output_data.shape[0]:
+                output_data.to_json(json_file, orient="records", lines=True)
+        output_data.to_csv(f"{csv_path}.staging", mode="w" if first_chunk else "a", header=first_chunk)
+        return {f"{json_path}.staging": json_path, f"{csv_path}.staging": csv_path}
+
+    def data_quality_checks_sales_pipeline(self, df: pd.DataFrame, table_name: str,
+                                           asynchronous: bool = False) -> Optional[Future]:
+        """
+        Run DQ checks for the pipeline output
+        :param df: the pipeline output
+        :param table_name: the name of the table for the DQ report
+        :param asynchronous: run DQ in the background and return the future (its result raises DQ errors)
+        :return: Future if asynchronous else None
+        """
+        if asynchronous:
+            return self.run_async(self.data_quality_checks_sales_pipeline, df=df, table_name=table_name)
+        # the results are saved by the single writer service of the pipeline DB (no connection per suite)
         if table_name == "female_output":
             SalesDqFemaleOutput(
                 female_output_df=df,
-                connector=self.connector,
-                cursor=self.cursor,
-                table_name=table_name
+                table_name=table_name,
+                report_service=get_report_service(self.path_to_db),
+                result_cache=self.dq_result_cache,
+                parallel_engine=self.dq_engine
             )
         if table_name == "male_output":
             SalesDqMaleOutput(
                 male_output_df=df,
-                connector=self.connector,
-                cursor=self.cursor,
-                table_name=table_name
+                table_name=table_name,
+                report_service=get_report_service(self.path_to_db),
+                result_cache=self.dq_result_cache,
+                parallel_engine=self.dq_engine
             )
 
+    def data_quality_checks_sales_pipeline_parallel(self, outputs: Dict[str, pd.DataFrame], executor: str = "process",
+                                                    profile: bool = False, asynchronous: bool = False,
+                                                    on_success: Callable[[str], None] = None) -> Optional[Future]:
+        """
+        Run DQ checks for several pipeline outputs concurrently (one DQ report write and one finalize for all)
+        :param outputs: dict {the name of the table for the DQ report: data frame}
+        :param executor: 'process' (process pool) or 'thread' (thread pool, the suites share the DQ workers
+                         of dq_workers)
+        :param profile: profile every output once (saved to dq_profile), the DQ suites are resolved from the profiles
+        :param asynchronous: run DQ in the background and return the future (its result raises DQ errors)
+        :param on_success: callable(table name) called for every output without DQ errors before the errors
+                           of the other outputs are raised (e.g. save the output)
+        :return: Future if asynchronous else None
+        """
+        if asynchronous:
+            return self.run_async(self.data_quality_checks_sales_pipeline_parallel, outputs=outputs,
+                                  executor=executor, profile=profile, on_success=on_success)
+        dq_suites = {"female_output": SalesDqFemaleOutput, "male_output": SalesDqMaleOutput}
+        profiles = {}
+        if profile:
+            profiler = DqProfiler()
+            with get_connection_pool(self.path_to_db).connection() as connector:
+                profile_store = DqProfileStore(connector)
+                for table_name, df in outputs.items():
+                    profiles[table_name] = profiler.profile(df, table_name=table_name)
+                    profile_store.save(profiles[table_name])
+        dq_options = {"result_cache": self.dq_result_cache}
+        # the suites of the process executor already run on separate cores
+        if self.dq_engine is not None and executor == "thread":
+            dq_options["parallel_engine"] = self.dq_engine
+        DqRunner(
+            report_service=get_report_service(self.path_to_db),
+            executor=executor,
+            dq_options=dq_options
+        ).run([
+            DqJob(df=df, suite_class=dq_suites[table_name], table_name=table_name,
+                  dq_options={"profile": profiles[table_name]} if table_name in profiles else None,
+                  on_success=partial(on_success, table_name) if on_success else None)
+            for table_name, df in outputs.items()
+        ])
+
 
 if __name__ == '__main__':
     """
@@ -84,43 +495,73 @@ if __name__ == '__main__':
     2.
     3.
     4.
-    => data quality checks for first data frame
+    => data quality checks for both data frames (in parallel)
     5. save pipeline output for first data frame
-    => data quality checks for second data frame
     6. save pipeline output for second data frame
     """
-    sales = SalesDataPipeline()
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--streaming", action="store_true", help="process the input chunk by chunk (constant memory)")
+    parser.add_argument("--chunksize", type=int, default=10000, help="the number of input rows in one chunk")
+    parser.add_argument("--async-dq", action="store_true",
+                        help="run DQ in the background while the outputs are staged, publish them after DQ passes")
+    parser.add_argument("--compact", action="store_true",
+                        help="read the input with compact dtypes (categoricals, downcast numbers, parsed date/time)")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the outputs once (dq_profile table) and resolve the DQ suites from the profiles")
+    parser.add_argument("--dq-workers", type=int,
+                        help="evaluate the DQ passes of large outputs on N processes (the suites run in threads)")
+    args = parser.parse_args()
 
-    # pipeline step 1
-    male_df = sales.get_sales_separated_by_gender(gender="Male")
-    female_df = sales.get_sales_separated_by_gender(gender="Female")
+    sales = SalesDataPipeline(compact=args.compact, dq_workers=args.dq_workers)
 
-    # pipeline step 2
-    male_df = sales.get_sales_by_payment_method(df=male_df, payment_method="Credit card")
-    female_df = sales.get_sales_by_payment_method(df=female_df, payment_method="Credit card")
+    if args.streaming:
+        # pipeline steps 1-4, data quality checks and saving of both outputs chunk by chunk
+        sales.run_streaming(chunksize=args.chunksize)
+    else:
+        # pipeline steps 2-4 are lazy and shared by both outputs: all filters are pushed down into one SQLite query
+        query = sales.get_sales_query()
 
-    # pipeline step 3
-    male_df = sales.get_sales_price_lower_then(df=male_df, price_lower=50)
-    female_df = sales.get_sales_price_lower_then(df=female_df, price_lower=50)
+        # pipeline step 2
+        query = sales.get_sales_by_payment_method(df=query, payment_method="Credit card")
 
-    # pipeline step 4
-    male_df = sales.get_sales_quantity_lower_then(df=male_df, quantity_lower=3)
-    female_df = sales.get_sales_quantity_lower_then(df=female_df, quantity_lower=3)
+        # pipeline step 3
+        query = sales.get_sales_price_lower_then(df=query, price_lower=50)
 
-    # DATA QUALITY - Data Frame 1 (for male df)
-    sales.data_quality_checks_sales_pipeline(
-        df=male_df,
-        table_name="male_output"
-    )
+        # pipeline step 4
+        query = sales.get_sales_quantity_lower_then(df=query, quantity_lower=3)
 
-    # pipeline save output 1
-    sales.save_output(output_data=male_df, output_table="sales_output_male")
+        # pipeline step 1: read the result once and split it into the outputs by gender
+        outputs = sales.fan_out(query, key="gender", segments={"Male": "male_output", "Female": "female_output"})
+        male_df, female_df = outputs["male_output"], outputs["female_output"]
 
-    # DATA QUALITY - Data Frame 2 (for female df)
-    sales.data_quality_checks_sales_pipeline(
-        df=female_df,
-        table_name="female_output"
-    )
+        # every output is saved when its DQ suite passes: DQ errors of one output do not block the other one
+        output_tables = {"male_output": "sales_output_male", "female_output": "sales_output_female"}
 
-    # pipeline save output 2
-    sales.save_output(output_data=female_df, output_table="sales_output_female")
+        if args.async_dq:
+            passed_outputs = set()
+
+            # DATA QUALITY - Data Frames 1 and 2 (for male and female df)
+            dq_future = sales.data_quality_checks_sales_pipeline_parallel(
+                outputs={"male_output": male_df, "female_output": female_df},
+                executor="thread" if args.dq_workers else "process",
+                profile=args.profile,
+                asynchronous=True,
+                on_success=lambda table_name: passed_outputs.add(output_tables[table_name])
+            )
+
+            # pipeline save outputs 1 and 2 (staged while DQ is running, published after DQ of the output passes)
+            sales.save_output_after_dq(
+                outputs={"sales_output_male": male_df, "sales_output_female": female_df},
+                dq_future=dq_future,
+                passed_outputs=passed_outputs
+            )
+        else:
+            # DATA QUALITY - Data Frames 1 and 2 (for male and female df)
+            # and pipeline save outputs 1 and 2 (after DQ of the output passes)
+            sales.data_quality_checks_sales_pipeline_parallel(
+                outputs={"male_output": male_df, "female_output": female_df},
+                executor="thread" if args.dq_workers else "process",
+                profile=args.profile,
+                on_success=lambda table_name: sales.save_output(output_data=outputs[table_name],
+                                                                output_table=output_tables[table_name])
+            )
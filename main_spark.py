@@ -2,30 +2,204 @@ from pyspark.sql import SparkSession
 import pyspark
 from data_quality.dq_female_output import SalesDqFemaleOutput
 from data_quality.dq_male_output import SalesDqMaleOutput
+from data_quality.dq_runner import DqRunner, DqJob
+from data_quality.dq_profiler import DqProfiler, DqProfileStore
+from data_quality.dq_connections import get_connection_pool, get_report_service
+from output_sinks import get_staging_name
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from functools import partial
+from typing import Callable, Collection, Dict, List, Optional, Tuple
+import urllib.request
+import argparse
+import warnings
+import hashlib
+import shutil
+import json
 import os
 
 
+class SparkRunMetrics:
+
+    def __init__(self, spark: SparkSession):
+        """
+        Counts Spark jobs (status tracker) and JDBC reads (scans of JDBC relations in the SQL executions
+        of the Spark UI status store) triggered between start and stop
+        :param spark: spark session
+        """
+        self.spark = spark
+        self.job_ids_before: set = set()
+        self.execution_ids_before: set = set()
+        self.spark_jobs: Optional[int] = None
+        self.jdbc_reads: Optional[int] = None
+
+    def __enter__(self) -> 'SparkRunMetrics':
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def start(self):
+        self.job_ids_before = self.get_job_ids()
+        self.execution_ids_before = {execution['id'] for execution in self.get_sql_executions() or []}
+
+    def stop(self):
+        self.spark_jobs = len(self.get_job_ids() - self.job_ids_before)
+        executions = self.get_sql_executions()
+        self.jdbc_reads = None if executions is None else sum(
+            node['nodeName'].startswith('Scan JDBCRelation')
+            for execution in executions if execution['id'] not in self.execution_ids_before
+            for node in execution.get('nodes', [])
+        )
+
+    def get_job_ids(self) -> set:
+        # all known jobs which are not associated with a job group
+        return set(self.spark.sparkContext.statusTracker().getJobIdsForGroup())
+
+    def get_sql_executions(self) -> Optional[List[Dict]]:
+        """
+        Get SQL executions with the plan nodes from the Spark UI REST API
+        :return: list of executions (None if Spark UI is disabled or not available)
+        """
+        ui_url = self.spark.sparkContext.uiWebUrl
+        if not ui_url:
+            return None
+        url = f"{ui_url}/api/v1/applications/{self.spark.sparkContext.applicationId}/sql?details=true&length=100000"
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                return json.loads(response.read())
+        except OSError as error:
+            warnings.warn('\033[33m' + f"\nSpark UI is not available, JDBC reads are not counted: {error}" + '\033[m')
+            return None
+
+    def to_dict(self) -> Dict:
+        return {'spark_jobs': self.spark_jobs, 'jdbc_reads': self.jdbc_reads}
+
+
 class SalesDataPipeline:
-    def __init__(self):
+    # the ways to materialize the pipeline outputs once for DQ and save
+    materialize_modes = ("persist", "local_checkpoint", "checkpoint", "none")
+
+    def __init__(self, materialize_mode: str = "persist", storage_level: str = "MEMORY_AND_DISK",
+                 num_partitions: int = None, partition_column: str = "rowid", input_cache: bool = True,
+                 path_to_db: str = None, output_path: str = None):
         """
         Example of the Data Pipeline based on the Pandas
         (do not judge strictly - I am not a date engineer :) )
+        :param materialize_mode: how outputs are materialized before DQ and save:
+                                 'persist' (storage_level), 'local_checkpoint' (executors storage, lineage is truncated),
+                                 'checkpoint' (reliable checkpoint to data/spark_checkpoint), 'none' (lazy outputs)
+        :param storage_level: the name of pyspark.StorageLevel for 'persist' mode
+        :param num_partitions: the number of parallel JDBC reads of the input (Spark default parallelism by default)
+        :param partition_column: numeric column to split the input by ('rowid' - SQLite rowid)
+        :param input_cache: read the input from the local Parquet cache (data/spark_cache) if the source is unchanged
+        :param path_to_db: the path to the pipeline DB (data/sales_pipeline.db by default)
+        :param output_path: the directory of the output files, checkpoints and input cache (data/ by default)
         """
-        self.path_to_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sales_pipeline.db")
-        self.output_csv_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sales_csv")
-        self.output_json_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sales_json")
+        if materialize_mode not in self.materialize_modes:
+            raise ValueError(f"Unknown materialize mode '{materialize_mode}', expected one of {self.materialize_modes}")
+        self.materialize_mode = materialize_mode
+        self.storage_level = getattr(pyspark.StorageLevel, storage_level)
+        self.materialized = []
+
+        data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+        output_path = output_path if output_path else data_path
+        self.path_to_db = path_to_db if path_to_db else os.path.join(data_path, "sales_pipeline.db")
+        self.output_csv_path = os.path.join(output_path, "sales_csv")
+        self.output_json_path = os.path.join(output_path, "sales_json")
+        self.checkpoint_path = os.path.join(output_path, "spark_checkpoint")
+        self.input_cache_path = os.path.join(output_path, "spark_cache")
+        self.partition_column = partition_column
+        self.input_cache = input_cache
 
         self.scSpark = SparkSession.builder \
             .config('spark.jars.packages', 'org.xerial:sqlite-jdbc:3.34.0') \
             .getOrCreate()
-        self.sdf_data = self.scSpark.read.format('jdbc') \
+        if materialize_mode == "checkpoint":
+            self.scSpark.sparkContext.setCheckpointDir(self.checkpoint_path)
+        self.num_partitions = num_partitions if num_partitions else self.scSpark.sparkContext.defaultParallelism
+
+        self.sdf_data = self.load_input(table_name="sales_input_data")
+        self.sdf_data.registerTempTable("sales_male")
+        self.sdf_data.registerTempTable("sales_female")
+
+    def load_input(self, table_name: str):
+        """
+        Load the input table: from the local Parquet cache if the source table is unchanged,
+        otherwise with partitioned JDBC reads (the cache is refreshed)
+        :param table_name: the name of the input table
+        :return: spark data frame
+        """
+        if not self.input_cache:
+            return self.read_jdbc(table_name)
+
+        fingerprint = self.get_table_fingerprint(table_name)
+        cache_path = os.path.join(self.input_cache_path, table_name, fingerprint)
+        if not os.path.exists(cache_path):
+            staging_path = os.path.join(self.input_cache_path, f"{table_name}.{fingerprint}.staging")
+            self.read_jdbc(table_name).write.mode("overwrite").parquet(staging_path)
+            # the previous versions of the table are removed, the new one is published atomically
+            shutil.rmtree(os.path.join(self.input_cache_path, table_name), ignore_errors=True)
+            os.makedirs(os.path.join(self.input_cache_path, table_name))
+            os.replace(staging_path, cache_path)
+        return self.scSpark.read.parquet(cache_path)
+
+    def read_jdbc(self, table_name: str):
+        """
+        Read the table with num_partitions parallel JDBC queries, split by partition_column between its min and max
+        :param table_name: the name of the table
+        :return: spark data frame
+        """
+        if self.partition_column == "rowid":
+            # rowid is not selected by 'select *': it is exposed by the subquery and dropped after the read
+            dbtable = f"(SELECT rowid AS _rowid, * FROM {table_name}) AS {table_name}"
+            partition_column = "_rowid"
+        else:
+            dbtable = table_name
+            partition_column = self.partition_column
+        lower_bound, upper_bound = self.get_partition_bounds(table_name, self.partition_column)
+
+        reader = self.scSpark.read.format('jdbc') \
             .options(
             url=f'jdbc:sqlite:{self.path_to_db}',
-            dbtable='sales_input_data',
+            dbtable=dbtable,
             driver='org.sqlite.JDBC') \
-            .option("customSchema", "date STRING").load()
-        self.sdf_data.registerTempTable("sales_male")
-        self.sdf_data.registerTempTable("sales_female")
+            .option("customSchema", "date STRING")
+        if lower_bound is not None and self.num_partitions > 1:
+            reader = reader \
+                .option("partitionColumn", partition_column) \
+                .option("lowerBound", lower_bound) \
+                .option("upperBound", upper_bound + 1) \
+                .option("numPartitions", self.num_partitions)
+        df = reader.load()
+        return df.drop("_rowid") if self.partition_column == "rowid" else df
+
+    def get_partition_bounds(self, table_name: str, column: str) -> Tuple[Optional[int], Optional[int]]:
+        """
+        Get min and max of the partition column (from SQLite directly, without Spark job)
+        :param table_name: the name of the table
+        :param column: the partition column
+        :return: tuple (min, max), (None, None) for the empty table
+        """
+        with get_connection_pool(self.path_to_db).connection() as connector:
+            return connector.execute(f'SELECT min({column}), max({column}) FROM {table_name}').fetchone()
+
+    def get_table_fingerprint(self, table_name: str) -> str:
+        """
+        Content fingerprint of the source table for the Parquet cache: the hash of all columns of all rows
+        in rowid order (one SQLite scan without Spark job, the DB file is changed by every run so its mtime
+        can not be used)
+        :param table_name: the name of the table
+        :return: hex digest
+        """
+        fingerprint = hashlib.sha1()
+        with get_connection_pool(self.path_to_db).connection() as connector:
+            cursor = connector.execute(f'SELECT rowid, * FROM {table_name} ORDER BY rowid')
+            fingerprint.update(json.dumps([column[0] for column in cursor.description]).encode())
+            for rows in iter(lambda: cursor.fetchmany(10000), []):
+                # repr keeps the types of the values (1 and 1.0 and '1' are different)
+                fingerprint.update(repr(rows).encode())
+        return fingerprint.hexdigest()
 
     def get_sales_separated_by_gender(self):
         return self.scSpark.sql(f"select * from sales_male where gender == 'Male'"), \
@@ -50,18 +224,104 @@ class SalesDataPipeline:
             sqlQuery=f'SELECT * from quantity_view WHERE `quantity` < {quantity_lower}'
         )
 
-    def data_quality_checks_sales_pipeline(self, df, table_name):
+    def materialize(self, df):
+        """
+        Materialize the output once (one JDBC read of the lineage): DQ checks and save use the materialized data
+        :param df: spark data frame
+        :return: materialized spark data frame (release it with release_materialized)
+        """
+        if self.materialize_mode == "none":
+            return df
+        if self.materialize_mode == "local_checkpoint":
+            return df.localCheckpoint(eager=True)
+
+        df = df.persist(self.storage_level)
+        df.count()
+        self.materialized.append(df)
+        if self.materialize_mode == "checkpoint":
+            # the checkpoint is written from the persisted data (the lineage is not computed twice)
+            return df.checkpoint(eager=True)
+        return df
+
+    def fan_out(self, df, key: str, segments: Dict) -> Dict:
+        """
+        Split the result of the shared pipeline steps into the outputs by the key column: the shared steps are
+        materialized once as one stage partitioned by the key and every output is a filter over it
+        (a new output does not add a read of the input)
+        :param df: spark data frame (the result of the shared pipeline steps)
+        :param key: the column to split by
+        :param segments: dict {key value: output name}
+        :return: dict {output name: spark data frame}
+        """
+        from pyspark.sql import functions as F
+
+        shared = self.materialize(df.where(F.col(key).isin(list(segments))).repartition(key))
+        return {name: shared.where(F.col(key) == value) for value, name in segments.items()}
+
+    def release_materialized(self):
+        """
+        Unpersist all materialized outputs
+        :return: None
+        """
+        for df in self.materialized:
+            df.unpersist()
+        self.materialized = []
+
+    def data_quality_checks_sales_pipeline(self, df, table_name, asynchronous: bool = False) -> Optional[Future]:
+        """
+        Run DQ checks for the pipeline output
+        :param df: spark data frame
+        :param table_name: the name of the table for the DQ report
+        :param asynchronous: run DQ in the background and return the future (its result raises DQ errors)
+        :return: Future if asynchronous else None
+        """
+        if asynchronous:
+            return self.run_async(self.data_quality_checks_sales_pipeline, df=df, table_name=table_name)
+        # the results are saved by the single writer service of the pipeline DB (no connection per suite)
         if table_name == "female_output":
             SalesDqFemaleOutput(
                 female_output_df=df,
-                table_name=table_name
+                table_name=table_name,
+                report_service=get_report_service(self.path_to_db)
             )
         if table_name == "male_output":
             SalesDqMaleOutput(
                 male_output_df=df,
-                table_name=table_name
+                table_name=table_name,
+                report_service=get_report_service(self.path_to_db)
             )
 
+    def data_quality_checks_sales_pipeline_parallel(self, outputs, profile: bool = False, asynchronous: bool = False,
+                                                    on_success: Callable[[str], None] = None) -> Optional[Future]:
+        """
+        Run DQ checks for several pipeline outputs concurrently (Spark jobs of all outputs are submitted
+        at the same time), save DQ report with one write and finalize all of them together
+        :param outputs: dict {the name of the table for the DQ report: spark data frame}
+        :param profile: profile every output once (saved to dq_profile), the DQ suites are resolved from the profiles
+        :param asynchronous: run DQ in the background and return the future (its result raises DQ errors)
+        :param on_success: callable(table name) called for every output without DQ errors before the errors
+                           of the other outputs are raised (e.g. save the output)
+        :return: Future if asynchronous else None
+        """
+        if asynchronous:
+            return self.run_async(self.data_quality_checks_sales_pipeline_parallel, outputs=outputs, profile=profile,
+                                  on_success=on_success)
+        dq_suites = {"female_output": SalesDqFemaleOutput, "male_output": SalesDqMaleOutput}
+        profiles = {}
+        if profile:
+            profiler = DqProfiler()
+            with get_connection_pool(self.path_to_db).connection() as connector:
+                profile_store = DqProfileStore(connector)
+                for table_name, df in outputs.items():
+                    profiles[table_name] = profiler.profile(df, table_name=table_name)
+                    profile_store.save(profiles[table_name])
+        DqRunner(report_service=get_report_service(self.path_to_db), executor="thread").run([
+            DqJob(df=df, suite_class=dq_suites[table_name], table_name=table_name,
+                  dq_options={"profile": profiles[table_name]} if table_name in profiles else None,
+                  on_success=partial(on_success, table_name) if on_success else None)
+            for table_name, df in outputs.items()
+        ])
+
     def save_output(self, output_data, table_name):
         output_data.write.format('jdbc') \
             .options(
@@ -69,6 +329,60 @@ class SalesDataPipeline:
             dbtable=table_name,
             driver='org.sqlite.JDBC').mode("overwrite").save()
 
+    def save_output_after_dq(self, outputs: Dict, dq_future: Future, passed_outputs: Collection[str] = ()):
+        """
+        Write the outputs to the staging tables while DQ is running (Spark jobs of DQ and of the writes
+        are submitted at the same time) and publish every output when DQ is finalized without errors
+        or its DQ suite passed (the other staging tables are dropped)
+        :param outputs: dict {output table: spark data frame}
+        :param dq_future: the future of the asynchronous DQ checks of the outputs
+        :param passed_outputs: the output tables whose DQ suites passed (filled by on_success of the DQ checks),
+                               they are published even if DQ of the other outputs fails
+        :return: None
+        """
+        try:
+            for output_table, output_data in outputs.items():
+                self.save_output(output_data=output_data, table_name=get_staging_name(output_table))
+        except Exception:
+            # the DQ report is saved before the staged outputs are discarded
+            wait([dq_future])
+            self.run_sql([f'DROP TABLE IF EXISTS {get_staging_name(output_table)}' for output_table in outputs])
+            raise
+        wait([dq_future])
+        for output_table in outputs:
+            if dq_future.exception() is None or output_table in passed_outputs:
+                # the save is overwrite: the output table is replaced by the staging table in one transaction
+                self.run_sql([f'DROP TABLE IF EXISTS {output_table}',
+                              f'ALTER TABLE {get_staging_name(output_table)} RENAME TO {output_table}'])
+            else:
+                self.run_sql([f'DROP TABLE IF EXISTS {get_staging_name(output_table)}'])
+        dq_future.result()
+
+    def run_sql(self, statements: List[str]):
+        """
+        Run the statements in one SQLite transaction
+        :param statements: list of SQL statements
+        :return: None
+        """
+        with get_connection_pool(self.path_to_db).connection() as connector:
+            with connector:
+                # DDL statements do not open the transaction implicitly
+                connector.execute('BEGIN')
+                for statement in statements:
+                    connector.execute(statement)
+
+    def run_async(self, function, **kwargs) -> Future:
+        """
+        Run the function in the background thread (Spark session is shared by the threads)
+        :param function: the function to run
+        :param kwargs: the arguments of the function
+        :return: Future of the function result
+        """
+        pool = ThreadPoolExecutor(max_workers=1)
+        future = pool.submit(function, **kwargs)
+        pool.shutdown(wait=False)
+        return future
+
 
 if __name__ == '__main__':
     """
@@ -77,65 +391,69 @@ if __name__ == '__main__':
     2.
     3.
     4.
-    => data quality checks for first data frame
+    => materialize the shared result once and split it into both outputs by gender (one read of the input)
+    => data quality checks for both data frames (in parallel)
     5. save pipeline output for first data frame
-    => data quality checks for second data frame
     6. save pipeline output for second data frame
     """
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--async-dq", action="store_true",
+                        help="run DQ in the background while the outputs are staged, publish them after DQ passes")
+    args = parser.parse_args()
+
     sales = SalesDataPipeline()
 
-    # pipeline step 1
-    male_df, female_df = sales.get_sales_separated_by_gender()
-
-    # pipeline step 2
-    male_df = sales.get_sales_by_payment_method(
-        payment_method="Credit card",
-        df=male_df
-    )
-    female_df = sales.get_sales_by_payment_method(
-        payment_method="Credit card",
-        df=female_df)
-
-    # pipeline step 3
-    male_df = sales.get_sales_price_lower_then(
-        price_lower=50,
-        df=male_df
-    )
-    female_df = sales.get_sales_price_lower_then(
-        price_lower=50,
-        df=female_df
-    )
-
-    # pipeline step 4
-    output_male = sales.get_sales_quantity_lower_then(
-        df=male_df,
-        quantity_lower=3
-    )
-    output_female = sales.get_sales_quantity_lower_then(
-        df=female_df,
-        quantity_lower=3
-    )
-
-    # DATA QUALITY 1
-    sales.data_quality_checks_sales_pipeline(
-        df=output_male,
-        table_name="male_output"
-    )
-
-    # 5. pipeline save output 1
-    sales.save_output(
-        output_data=output_male,
-        table_name='sales_output_male'
-    )
-
-    # DATA QUALITY 2
-    sales.data_quality_checks_sales_pipeline(
-        df=output_female,
-        table_name="female_output"
-    )
-
-    # 6. pipeline save output 2
-    sales.save_output(
-        output_data=output_male,
-        table_name='sales_output_female'
-    )
+    with SparkRunMetrics(sales.scSpark) as run_metrics:
+        # pipeline steps 2-4 are shared by both outputs
+        sales_df = sales.get_sales_by_payment_method(
+            payment_method="Credit card",
+            df=sales.sdf_data
+        )
+
+        # pipeline step 3
+        sales_df = sales.get_sales_price_lower_then(
+            price_lower=50,
+            df=sales_df
+        )
+
+        # pipeline step 4
+        sales_df = sales.get_sales_quantity_lower_then(
+            df=sales_df,
+            quantity_lower=3
+        )
+
+        # pipeline step 1: materialize the shared result once and split it into the outputs by gender
+        outputs = sales.fan_out(sales_df, key="gender", segments={"Male": "male_output", "Female": "female_output"})
+        output_male, output_female = outputs["male_output"], outputs["female_output"]
+
+        # every output is saved when its DQ suite passes: DQ errors of one output do not block the other one
+        output_tables = {"male_output": "sales_output_male", "female_output": "sales_output_female"}
+
+        try:
+            if args.async_dq:
+                passed_outputs = set()
+
+                # DATA QUALITY 1 and 2
+                dq_future = sales.data_quality_checks_sales_pipeline_parallel(
+                    outputs={"male_output": output_male, "female_output": output_female},
+                    asynchronous=True,
+                    on_success=lambda table_name: passed_outputs.add(output_tables[table_name])
+                )
+
+                # 5. and 6. pipeline save outputs (staged while DQ is running, published after DQ of the output passes)
+                sales.save_output_after_dq(
+                    outputs={"sales_output_male": output_male, "sales_output_female": output_female},
+                    dq_future=dq_future,
+                    passed_outputs=passed_outputs
+                )
+            else:
+                # DATA QUALITY 1 and 2, 5. and 6. pipeline save outputs (after DQ of the output passes)
+                sales.data_quality_checks_sales_pipeline_parallel(
+                    outputs={"male_output": output_male, "female_output": output_female},
+                    on_success=lambda table_name: sales.save_output(output_data=outputs[table_name],
+                                                                    table_name=output_tables[table_name])
+                )
+        finally:
+            sales.release_materialized()
+
+    print(f"Spark run metrics: {json.dumps(run_metrics.to_dict())}")
@@ -0,0 +1,320 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Iterator
+import importlib.util
+import itertools
+import sqlite3
+import os
+import pandas as pd
+
+
+def get_insert_sql(table_name: str, columns: List[str]) -> str:
+    """
+    Build INSERT statement for the columns of the data frame (instead of the hardcoded column list)
+    :param table_name: the name of the table
+    :param columns: the columns of the data frame
+    :return: sql with '?' placeholders
+    """
+    column_list = ', '.join(f'"{column}"' for column in columns)
+    placeholders = ', '.join('?' for _ in columns)
+    return f'INSERT INTO {table_name} ({column_list}) VALUES ({placeholders})'
+
+
+def get_rows(df: pd.DataFrame) -> Iterator[tuple]:
+    """
+    Iterate over the rows of the data frame as python values (numpy scalars can not be bound by sqlite3, NaN -> NULL)
+    :param df: pandas DataFrame
+    :return: iterator of tuples
+    """
+    return df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+
+
+def create_indexes(connector: sqlite3.Connection, table_name: str, columns: List[str]):
+    """
+    Index the lookup columns of the table (the columns missing in the table are skipped, without commit)
+    :param connector: connector to DB
+    :param table_name: the name of the table
+    :param columns: the columns to index (e.g. invoice_id for the fetch of the unexpected rows of DQ)
+    :return: None
+    """
+    table_columns = {row[1] for row in connector.execute(f'PRAGMA table_info("{table_name}")')}
+    for column in columns:
+        if column in table_columns:
+            connector.execute(f'CREATE INDEX IF NOT EXISTS "{table_name}_{column}" ON "{table_name}" ("{column}")')
+
+
+def get_file_path(path: str, file_name: str, compression: str = None) -> str:
+    extensions = {'gzip': '.gz', 'bz2': '.bz2', 'zip': '.zip', 'xz': '.xz'}
+    return os.path.join(path, file_name + extensions.get(compression, ''))
+
+
+def get_staging_name(output_table: str) -> str:
+    return f"{output_table}__staging"
+
+
+class OutputSink(ABC):
+
+    @abstractmethod
+    def write(self, df: pd.DataFrame, output_table: str):
+        """
+        Write the output data frame
+        :param df: pandas DataFrame
+        :param output_table: the name of the output (table name / file name)
+        :return: None
+        """
+
+    @abstractmethod
+    def stage(self, df: pd.DataFrame, output_table: str):
+        """
+        Write the output data frame to the staging location (not visible as the output until promote)
+        :param df: pandas DataFrame
+        :param output_table: the name of the output (table name / file name)
+        :return: None
+        """
+
+    @abstractmethod
+    def promote(self, output_table: str):
+        """
+        Atomically publish the staged output
+        :param output_table: the name of the output (table name / file name)
+        :return: None
+        """
+
+    @abstractmethod
+    def discard(self, output_table: str):
+        """
+        Remove the staged output (if exists)
+        :param output_table: the name of the output (table name / file name)
+        :return: None
+        """
+
+
+class FileSink(OutputSink):
+
+    @abstractmethod
+    def get_path(self, output_table: str) -> str:
+        """
+        Get the path of the output file
+        :param output_table: the name of the output
+        :return: path
+        """
+
+    @abstractmethod
+    def write_file(self, df: pd.DataFrame, path: str):
+        """
+        Write the data frame to the file
+        :param df: pandas DataFrame
+        :param path: the path of the file
+        :return: None
+        """
+
+    def write(self, df: pd.DataFrame, output_table: str):
+        os.makedirs(os.path.dirname(self.get_path(output_table)), exist_ok=True)
+        self.write_file(df, self.get_path(output_table))
+
+    def stage(self, df: pd.DataFrame, output_table: str):
+        # the staged file is in the same directory: os.replace is atomic
+        os.makedirs(os.path.dirname(self.get_path(output_table)), exist_ok=True)
+        self.write_file(df, self.get_path(output_table) + ".staging")
+
+    def promote(self, output_table: str):
+        os.replace(self.get_path(output_table) + ".staging", self.get_path(output_table))
+
+    def discard(self, output_table: str):
+        if os.path.exists(self.get_path(output_table) + ".staging"):
+            os.remove(self.get_path(output_table) + ".staging")
+
+
+class SqliteSink(OutputSink):
+
+    def __init__(self, path_to_db: str, batch_size: int = 50000, journal_mode: str = "WAL",
+                 synchronous: str = "NORMAL", cache_size: int = -65536, index_columns: List[str] = None):
+        """
+        Bulk load to SQLite: all rows in one transaction, inserted in batches of batch_size rows
+        :param path_to_db: the path to the DB
+        :param batch_size: the number of rows in one executemany
+        :param journal_mode: PRAGMA journal_mode (WAL - readers are not blocked by the load)
+        :param synchronous: PRAGMA synchronous (NORMAL is safe with WAL and does not sync on every commit)
+        :param cache_size: PRAGMA cache_size (negative - KiB, the pages are written in bigger batches)
+        :param index_columns: the columns of the output tables indexed with the load (e.g. the row id column of DQ)
+        """
+        self.path_to_db = path_to_db
+        self.batch_size = batch_size
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.cache_size = cache_size
+        self.index_columns = index_columns if index_columns else []
+
+    def connect(self) -> sqlite3.Connection:
+        # own connection: the sink is called from the writer thread
+        connector = sqlite3.connect(self.path_to_db)
+        connector.execute(f'PRAGMA journal_mode={self.journal_mode}')
+        connector.execute(f'PRAGMA synchronous={self.synchronous}')
+        connector.execute(f'PRAGMA cache_size={self.cache_size}')
+        connector.execute('PRAGMA temp_store=MEMORY')
+        return connector
+
+    def insert(self, connector: sqlite3.Connection, df: pd.DataFrame, table_name: str):
+        sql = get_insert_sql(table_name, list(df.columns))
+        rows = get_rows(df)
+        for batch in iter(lambda: list(itertools.islice(rows, self.batch_size)), []):
+            connector.executemany(sql, batch)
+
+    def write(self, df: pd.DataFrame, output_table: str):
+        connector = self.connect()
+        try:
+            with connector:
+                self.insert(connector, df, output_table)
+                create_indexes(connector, output_table, self.index_columns)
+        finally:
+            connector.close()
+
+    def stage(self, df: pd.DataFrame, output_table: str):
+        # the staging table has the schema of the output table
+        staging_table = get_staging_name(output_table)
+        connector = self.connect()
+        try:
+            with connector:
+                connector.execute(f'DROP TABLE IF EXISTS {staging_table}')
+                connector.execute(f'CREATE TABLE {staging_table} AS SELECT * FROM {output_table} WHERE 0')
+                self.insert(connector, df, staging_table)
+        finally:
+            connector.close()
+
+    def promote(self, output_table: str):
+        # the rows are appended to the output table and the staging table is dropped in one transaction
+        staging_table = get_staging_name(output_table)
+        connector = self.connect()
+        try:
+            with connector:
+                connector.execute(f'INSERT INTO {output_table} SELECT * FROM {staging_table}')
+                connector.execute(f'DROP TABLE {staging_table}')
+                create_indexes(connector, output_table, self.index_columns)
+        finally:
+            connector.close()
+
+    def discard(self, output_table: str):
+        connector = self.connect()
+        try:
+            with connector:
+                connector.execute(f'DROP TABLE IF EXISTS {get_staging_name(output_table)}')
+        finally:
+            connector.close()
+
+
+class JsonSink(FileSink):
+
+    def __init__(self, path: str, lines: bool = False, compression: str = None):
+        """
+        JSON files (one file per output)
+        :param path: the directory of the files
+        :param lines: line-delimited JSON (.jsonl), otherwise JSON array of records with indent (.json)
+        :param compression: 'gzip', 'bz2', 'zip', 'xz' or None
+        """
+        self.path = path
+        self.lines = lines
+        self.compression = compression
+
+    def get_path(self, output_table: str) -> str:
+        return get_file_path(self.path, f"{output_table}.jsonl" if self.lines else f"{output_table}.json",
+                             self.compression)
+
+    def write_file(self, df: pd.DataFrame, path: str):
+        if self.lines:
+            df.to_json(path, orient="records", lines=True, compression=self.compression)
+        else:
+            df.to_json(path, indent=3, compression=self.compression)
+
+
+class CsvSink(FileSink):
+
+    def __init__(self, path: str, compression: str = None):
+        """
+        CSV files (one file per output)
+        :param path: the directory of the files
+        :param compression: 'gzip', 'bz2', 'zip', 'xz' or None
+        """
+        self.path = path
+        self.compression = compression
+
+    def get_path(self, output_table: str) -> str:
+        return get_file_path(self.path, f"{output_table}.csv", self.compression)
+
+    def write_file(self, df: pd.DataFrame, path: str):
+        df.to_csv(path, compression=self.compression)
+
+
+class ParquetSink(FileSink):
+
+    def __init__(self, path: str, compression: str = "snappy"):
+        """
+        Parquet files (one file per output), requires pyarrow
+        :param path: the directory of the files
+        :param compression: 'snappy', 'gzip', 'brotli', 'zstd' or None
+        """
+        if importlib.util.find_spec("pyarrow") is None:
+            raise ImportError("ParquetSink requires pyarrow (pip install pyarrow)")
+        self.path = path
+        self.compression = compression
+
+    def get_path(self, output_table: str) -> str:
+        return os.path.join(self.path, f"{output_table}.parquet")
+
+    def write_file(self, df: pd.DataFrame, path: str):
+        df.to_parquet(path, engine="pyarrow", compression=self.compression, index=False)
+
+
+class OutputWriter:
+
+    def __init__(self, sinks: List[OutputSink], max_workers: int = None):
+        """
+        Writes the output to all configured sinks concurrently (one thread per sink)
+        :param sinks: list of OutputSink
+        :param max_workers: the number of threads (by default one per sink)
+        """
+        self.sinks = sinks
+        self.max_workers = max_workers
+
+    def write(self, df: pd.DataFrame, output_table: str):
+        """
+        Write the output to all sinks (the first error is raised after all sinks are finished)
+        :param df: pandas DataFrame
+        :param output_table: the name of the output (table name / file name)
+        :return: None
+        """
+        self.run_all('write', df, output_table)
+
+    def stage(self, df: pd.DataFrame, output_table: str):
+        """
+        Write the output to the staging locations of all sinks (published by promote only)
+        :param df: pandas DataFrame
+        :param output_table: the name of the output (table name / file name)
+        :return: None
+        """
+        self.run_all('stage', df, output_table)
+
+    def promote(self, output_table: str):
+        """
+        Publish the staged output of all sinks (every sink is promoted atomically)
+        :param output_table: the name of the output (table name / file name)
+        :return: None
+        """
+        self.run_all('promote', output_table)
+
+    def discard(self, output_table: str):
+        """
+        Remove the staged output of all sinks
+        :param output_table: the name of the output (table name / file name)
+        :return: None
+        """
+        self.run_all('discard', output_table)
+
+    def run_all(self, method: str, *args):
+        if not self.sinks:
+            return
+        with ThreadPoolExecutor(max_workers=self.max_workers or len(self.sinks)) as pool:
+            futures = [pool.submit(getattr(sink, method), *args) for sink in self.sinks]
+            errors = [future.exception() for future in futures]
+        for error in errors:
+            if error is not None:
+                raise error
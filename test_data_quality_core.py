@@ -0,0 +1,213 @@
+import allure
+import numpy as np
+import pandas as pd
+import pytest
+import sqlite3
+import time
+from data_quality.data_quality_core import DataQuality, DqException, DqReportWriter, DqRowPredicate, DqSuiteCompiler, \
+    DqStateStore, DqResultCache
+
+
+def get_sales_df() -> pd.DataFrame:
+    return pd.DataFrame({
+        'invoice_id': [f'{index:03}-{index % 7}' for index in range(12)],
+        'city': pd.Categorical(['Yangon', 'Mandalay', 'Naypyitaw', 'Mandalay'] * 3),
+        'gender': ['Male', 'Female', None, 'Male'] * 3,
+        'unit_price': [5.0, 9.5, 15.0, np.nan, 45.2, 7.0, 99.9, 12.0, 8.0, 60.0, np.nan, 3.5],
+        'quantity': np.arange(12, dtype='int64') % 5 + 1,
+    })
+
+
+def add_expectations(dq: DataQuality):
+    exception = DqException(exception_message="test", is_error=False)
+    dq.expect_column_to_exist('unit_price', exception=exception)
+    dq.expect_column_values_distinct_to_be_in_set('city', values_li=['Yangon', 'Mandalay'], exception=exception)
+    dq.expect_column_values_distinct_to_be_in_set('gender', values_li=['Male', 'Female'], exception=exception)
+    dq.expect_column_values_to_not_be_null('gender', exception=exception)
+    dq.expect_column_values_to_not_be_null('quantity', exception=exception)
+    dq.expect_column_min_to_be_between('unit_price', exception=exception, min_value=1)
+    dq.expect_column_max_to_be_between('unit_price', exception=exception, max_value=50)
+    dq.expect_column_max_to_be_between('city', exception=exception, max_value='Yangon')
+    dq.expect_table_row_count_to_be_between(exception=exception, min_value=10, max_value=20)
+    dq.expect_column_unique_value_count_to_be_between('quantity', exception=exception, min_value=5, max_value=5)
+    dq.expect_column_median_to_be_between('unit_price', exception=exception, min_value=9, max_value=10)
+    dq.expect_rows_to_not_match(
+        name='check_mandalay_unit_price',
+        predicate=DqRowPredicate.where('city', '==', 'Mandalay') & DqRowPredicate.where('unit_price', '<', 10),
+        exception=exception
+    )
+
+
+def get_observed(result) -> tuple:
+    return result.success, result.result.get('observed_value'), result.result.get('unexpected_count')
+
+
+@allure.story("DQ suite compiler")
+class TestDqSuiteCompiler:
+
+    @allure.title("The fused stats pass gives the results of the expectations evaluated one by one")
+    def test_fused_pass_matches_single_expectations(self):
+        df = get_sales_df()
+        spans = []
+        dq = DataQuality(df=df, table_name="sales", report_writer=DqReportWriter(), max_row_ids=0,
+                         span_hook=spans.append)
+        add_expectations(dq)
+        expectations = list(dq.suite.expectations)
+
+        fused = dq.suite.run(df)
+
+        # all data expectations are resolved from one stats pass
+        assert [span.name for span in spans].count('dq.stats_pass') == 1
+        assert len(fused) == len(expectations)
+        for expectation, (result, _) in zip(expectations, fused):
+            suite = DqSuiteCompiler()
+            suite.expectations = [expectation]
+            (single, _), = suite.run(df)
+            assert result.expectation_config.expectation_type == expectation.expectation_type
+            assert get_observed(result) == get_observed(single), expectation.expectation_type
+
+    @allure.title("The fused stats pass resolves the expectations from the data")
+    def test_fused_pass_observed_values(self):
+        df = get_sales_df()
+        dq = DataQuality(df=df, table_name="sales", report_writer=DqReportWriter(), max_row_ids=0)
+        add_expectations(dq)
+
+        results = {(result.expectation_config.expectation_type, result.expectation_config.kwargs.get('column')):
+                   result for result, _ in dq.suite.run(df)}
+
+        assert results[('expect_column_to_exist', 'unit_price')].success
+        assert not results[('expect_column_distinct_values_to_be_in_set', 'city')].success
+        assert results[('expect_column_distinct_values_to_be_in_set', 'gender')].success
+        assert results[('expect_column_values_to_not_be_null', 'gender')].result['observed_value'] == 3
+        assert results[('expect_column_values_to_not_be_null', 'quantity')].success
+        assert results[('expect_column_min_to_be_between', 'unit_price')].result['observed_value'] == 3.5
+        assert results[('expect_column_max_to_be_between', 'unit_price')].result['observed_value'] == 99.9
+        assert results[('expect_column_max_to_be_between', 'city')].success
+        assert results[('expect_table_row_count_to_be_between', None)].result['observed_value'] == 12
+        assert results[('expect_column_unique_value_count_to_be_between', 'quantity')].success
+        assert results[('expect_column_median_to_be_between', 'unit_price')].result['observed_value'] == \
+            pytest.approx(df['unit_price'].median())
+        custom = results[('check_mandalay_unit_price', None)]
+        assert custom.result['unexpected_count'] == 3
+        assert [row['invoice_id'] for row in custom.result['partial_unexpected_list']] == ['001-1', '005-5', '011-4']
+
+
+def get_daily_sales_df(days: range) -> pd.DataFrame:
+    # two rows per day, the date is m/d/yyyy text as in the sales input
+    return pd.DataFrame({
+        'date': [f'1/{day}/2019' for day in days for _ in range(2)],
+        'city': ['Yangon', 'Mandalay'] * len(days),
+        'unit_price': [float(day) for day in days for _ in range(2)],
+    })
+
+
+def run_incremental(connector, df: pd.DataFrame) -> dict:
+    dq = DataQuality(df=df, connector=connector, table_name="sales", incremental_watermark='date', max_row_ids=0)
+    exception = DqException(exception_message="test", is_error=False)
+    dq.expect_table_row_count_to_be_between(exception=exception, min_value=1)
+    dq.expect_column_values_distinct_to_be_in_set('city', values_li=['Yangon', 'Mandalay'], exception=exception)
+    dq.expect_column_min_to_be_between('unit_price', exception=exception, min_value=0)
+    dq.expect_column_max_to_be_between('unit_price', exception=exception, max_value=100)
+    return {result.expectation_config.expectation_type: result for result, _ in dq.run_suite_incremental()}
+
+
+@allure.story("Incremental DQ")
+class TestDqIncremental:
+
+    @allure.title("The statistics of the second batch are merged with the state of the first one")
+    def test_merge_two_batches(self):
+        connector = sqlite3.connect(":memory:")
+        df = get_daily_sales_df(range(1, 10))
+        df['date'] = pd.to_datetime(df['date'], format='%m/%d/%Y')
+        first = run_incremental(connector, df)
+
+        df = get_daily_sales_df(range(1, 32))
+        df['date'] = pd.to_datetime(df['date'], format='%m/%d/%Y')
+        second = run_incremental(connector, df)
+
+        assert first['expect_table_row_count_to_be_between'].result['observed_value'] == 18
+        assert second['expect_table_row_count_to_be_between'].result['observed_value'] == 62
+        # the rows of Jan 9 (the watermark) and the new rows are scanned
+        assert second['expect_table_row_count_to_be_between'].result['rows_scanned'] == 46
+        assert second['expect_column_min_to_be_between'].result['observed_value'] == 1.0
+        assert second['expect_column_max_to_be_between'].result['observed_value'] == 31.0
+        watermark, stats = DqStateStore(connector).load("sales", "date")
+        assert watermark == pd.Timestamp('2019-01-31')
+        # the rows at the watermark are not in the saved state
+        assert stats.row_count == 60
+
+    @allure.title("The late rows with the value of the watermark are validated")
+    def test_late_rows_at_watermark(self):
+        connector = sqlite3.connect(":memory:")
+        df = pd.DataFrame({'date': [1, 2, 3], 'city': ['Yangon', 'Yangon', 'Yangon'],
+                           'unit_price': [1.0, 2.0, 3.0]})
+        run_incremental(connector, df)
+
+        late = pd.concat([df, pd.DataFrame({'date': [3], 'city': ['Bago'], 'unit_price': [4.0]})],
+                         ignore_index=True)
+        results = run_incremental(connector, late)
+
+        assert results['expect_table_row_count_to_be_between'].result['observed_value'] == 4
+        assert not results['expect_column_distinct_values_to_be_in_set'].success
+
+    @allure.title("Text watermark column is rejected")
+    def test_text_watermark(self):
+        with pytest.raises(ValueError, match="numeric or datetime"):
+            run_incremental(sqlite3.connect(":memory:"), get_daily_sales_df(range(1, 10)))
+
+
+def run_cached(df: pd.DataFrame, cache: DqResultCache) -> list:
+    dq = DataQuality(df=df, table_name="sales", report_writer=DqReportWriter(), result_cache=cache, max_row_ids=0)
+    add_expectations(dq)
+    return [result for result, _ in dq.run_suite_cached()]
+
+
+def get_cached(results: list) -> list:
+    return [result.result.get('cached', False) for result in results
+            if result.expectation_config.expectation_type != 'expect_column_to_exist']
+
+
+@allure.story("DQ result cache")
+class TestDqResultCache:
+
+    @allure.title("The results of unchanged data are taken from the cache")
+    def test_hit_and_miss(self, tmp_path):
+        cache = DqResultCache(path_to_db=str(tmp_path / "cache.db"))
+        df = get_sales_df()
+
+        evaluated = run_cached(df, cache)
+        cached = run_cached(df, cache)
+        changed = run_cached(df.assign(quantity=df['quantity'] + 1), cache)
+
+        assert not any(get_cached(evaluated))
+        assert all(get_cached(cached))
+        assert [get_observed(result) for result in cached] == [get_observed(result) for result in evaluated]
+        assert not any(get_cached(changed))
+
+    @allure.title("The persistent tier is used when the in-memory tier is empty")
+    def test_persistent_hit(self, tmp_path):
+        path_to_db = str(tmp_path / "cache.db")
+        df = get_sales_df()
+        run_cached(df, DqResultCache(path_to_db=path_to_db))
+
+        assert all(get_cached(run_cached(df, DqResultCache(path_to_db=path_to_db))))
+
+    @allure.title("The fingerprint does not depend on the order of rows")
+    def test_fingerprint_order_independent(self):
+        df = get_sales_df()
+        shuffled = df.sample(frac=1, random_state=1)
+
+        assert DqResultCache.get_fingerprint(shuffled) == DqResultCache.get_fingerprint(df)
+        assert DqResultCache.get_fingerprint(df.head(11)) != DqResultCache.get_fingerprint(df)
+
+    @allure.title("Expired results are evaluated again")
+    def test_ttl_expiry(self, tmp_path, monkeypatch):
+        cache = DqResultCache(path_to_db=str(tmp_path / "cache.db"), ttl=60)
+        df = get_sales_df()
+        run_cached(df, cache)
+        assert all(get_cached(run_cached(df, cache)))
+
+        now = time.time()
+        monkeypatch.setattr(time, 'time', lambda: now + 61)
+
+        assert not any(get_cached(run_cached(df, cache)))
@@ -0,0 +1,47 @@
+import allure
+import pytest
+from data_quality.data_quality_core import DqReportWriter
+from data_quality.dq_connections import DqConnectionPool, DqReportService
+
+
+def get_record(ts: str, table_name: str, success: bool = True) -> dict:
+    return {'success': success, 'expectation_type': 'expect_column_to_exist', 'kwargs': '{}', 'description': 'test',
+            'ts': ts, 'is_error': False, 'table_name': table_name}
+
+
+@allure.story("DQ report service")
+class TestDqReportService:
+
+    @allure.title("The results of one run written by several flushes are saved to one run")
+    def test_flushes_of_one_run(self, tmp_path):
+        pool = DqConnectionPool(str(tmp_path / "report.db"))
+        service = DqReportService(pool)
+        writer = DqReportWriter(service=service, batch_size=2)
+        for _ in range(5):
+            writer.add(get_record('2019-01-01 10:00:00', 'sales'))
+        writer.set_run_metrics('2019-01-01 10:00:00', 'sales', {'duration_s': 1.5})
+        writer.flush()
+        service.close()
+
+        with pool.connection() as connector:
+            runs = connector.execute('SELECT run_id, duration_s FROM dq_run').fetchall()
+            results = connector.execute('SELECT COUNT(*) FROM dq_result').fetchone()[0]
+        assert len(runs) == 1 and runs[0][1] == 1.5
+        assert results == 5
+        # the service keeps no state of the written runs
+        assert not hasattr(service, 'run_ids')
+        assert list(writer.run_ids) == [('2019-01-01 10:00:00', 'sales')] and writer.run_metrics == {}
+
+    @allure.title("The queued records fail when the service can not get a connection")
+    def test_no_free_connection(self, tmp_path):
+        pool = DqConnectionPool(str(tmp_path / "report.db"), max_size=1, timeout=0.2)
+        connector = pool.acquire()
+        service = DqReportService(pool)
+        future = service.submit([get_record('2019-01-01 10:00:00', 'sales')])
+
+        with pytest.raises(TimeoutError, match="No free connection"):
+            future.result(timeout=5)
+        service.thread.join(timeout=5)
+        with pytest.raises(RuntimeError, match="stopped"):
+            service.submit([get_record('2019-01-01 10:00:00', 'sales')])
+        pool.release(connector)
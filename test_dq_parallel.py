@@ -0,0 +1,91 @@
+import allure
+import numpy as np
+import pandas as pd
+import pytest
+from data_quality.data_quality_core import DqRowPredicate, DqStats, DqSuiteCompiler, to_python
+from data_quality.dq_parallel import DqParallelEngine
+
+
+def get_mixed_df(rows: int) -> pd.DataFrame:
+    random = np.random.default_rng(7)
+    unit_price = np.round(random.uniform(1, 100, rows), 2)
+    unit_price[random.random(rows) < 0.05] = np.nan
+    df = pd.DataFrame({
+        'invoice_id': [f'{number:06}' for number in range(rows)],
+        'city': pd.Categorical(random.choice(['Yangon', 'Mandalay', 'Naypyitaw'], rows),
+                               categories=['Bago', 'Mandalay', 'Naypyitaw', 'Yangon']),
+        'unit_price': unit_price,
+        'quantity': random.integers(1, 11, rows).astype('int8'),
+        'date': pd.Timestamp('2019-01-01') + pd.to_timedelta(random.integers(0, 90, rows), unit='D'),
+        'member': random.random(rows) < 0.5,
+        'payment': random.choice(['Cash', 'Ewallet', None], rows),
+    })
+    # the frame of the filtered output: the index is not a range
+    return df.iloc[::-1].set_index(pd.Index(np.arange(rows) * 3 + 1))
+
+
+def get_plan() -> dict:
+    return {
+        'city': {'distinct', 'null_count', 'min', 'max', 'distinct_count'},
+        'unit_price': {'null_count', 'min', 'max', 'median'},
+        'quantity': {'distinct', 'min', 'max', 'distinct_count'},
+        'date': {'null_count', 'min', 'max'},
+        'member': {'distinct', 'null_count'},
+        'payment': {'distinct', 'null_count'},
+    }
+
+
+def get_predicates() -> dict:
+    predicates = [
+        DqRowPredicate.where('city', '==', 'Mandalay') & DqRowPredicate.where('unit_price', '<', 10),
+        DqRowPredicate.where('quantity', '>', 9),
+        DqRowPredicate.where('payment', 'is null'),
+    ]
+    return {str(predicate): predicate for predicate in predicates}
+
+
+@pytest.fixture(scope="module")
+def engine():
+    engine = DqParallelEngine(workers=2, min_rows=0, chunks_per_worker=2)
+    yield engine
+    engine.close()
+
+
+@allure.story("Parallel DQ stats pass")
+class TestDqParallelEngine:
+
+    @allure.title("The parallel stats pass gives the statistics of the serial pass")
+    @pytest.mark.parametrize("rows", [1, 7, 5000])
+    def test_same_stats_as_serial(self, engine, rows):
+        df = get_mixed_df(rows)
+        schema = DqSuiteCompiler.get_schema(df)
+
+        serial = DqSuiteCompiler.compute_stats_pandas(df, get_plan(), DqStats(schema.columns), get_predicates())
+        parallel = engine.compute_stats_pandas(df, get_plan(), DqStats(schema.columns), get_predicates())
+
+        assert engine.accepts(df)
+        assert parallel.row_count == serial.row_count == rows
+        assert parallel.to_json() == serial.to_json()
+        for column in get_plan():
+            assert parallel.column_stats[column].distinct_count == serial.column_stats[column].distinct_count
+            assert to_python(parallel.column_stats[column].median) == to_python(serial.column_stats[column].median)
+
+    @allure.title("The suite results are the same with the parallel engine")
+    def test_suite_with_engine(self, engine):
+        df = get_mixed_df(3000)
+        predicate = DqRowPredicate.where('quantity', '>', 9)
+        results = []
+        for parallel_engine in (None, engine):
+            suite = DqSuiteCompiler(parallel_engine=parallel_engine)
+            suite.add('expect_column_distinct_values_to_be_in_set', {'column': 'city', 'value_set': ['Yangon']}, None)
+            suite.add('expect_column_max_to_be_between', {'column': 'date', 'max_value': None}, None)
+            suite.add('check_quantity', {'predicate': str(predicate)}, None, predicate=predicate)
+            results.append([(result.success, result.result['observed_value'], result.result.get('unexpected_count'))
+                            for result, _ in suite.run(df)])
+
+        assert results[0] == results[1]
+
+    @allure.title("Small frames are evaluated in the process")
+    def test_min_rows(self):
+        assert not DqParallelEngine(workers=2, min_rows=100).accepts(get_mixed_df(99))
+        assert not DqParallelEngine(workers=1, min_rows=0).accepts(get_mixed_df(99))
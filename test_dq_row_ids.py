@@ -0,0 +1,88 @@
+import allure
+import numpy as np
+import pandas as pd
+import pytest
+import sqlite3
+from data_quality.data_quality_core import DataQuality, DqException, DqRowPredicate
+from data_quality.dq_report_store import DqReportStore
+from data_quality.dq_row_ids import DqRowIds
+from output_sinks import SqliteSink
+
+
+@allure.story("Ids of the unexpected rows")
+class TestDqRowIds:
+
+    @allure.title("Integer ids round trip: {ids}")
+    @pytest.mark.parametrize("ids", [
+        [],
+        [7],
+        list(range(100, 1100)) + list(range(5000, 5003)) + [9000],
+        [-10, -9, -8, -1, 0, 1, 2, 40],
+        [np.int64(3), 1, np.int32(2), 10, np.int64(11), 4],
+        [2 ** 62, -2 ** 62, 0],
+    ])
+    def test_runs_round_trip(self, ids):
+        blob = DqRowIds(column='invoice_id', ids=ids).encode()
+        decoded = DqRowIds.decode(blob, 'invoice_id')
+
+        assert blob[:1] == (DqRowIds.runs_kind if ids else DqRowIds.json_kind)
+        assert decoded.ids == sorted(int(value) for value in ids)
+        assert all(type(value) is int for value in decoded.ids)
+        assert decoded.column == 'invoice_id' and not decoded.truncated
+
+    @allure.title("Duplicated ids are saved once")
+    def test_duplicates(self):
+        decoded = DqRowIds.decode(DqRowIds(column=None, ids=[5, np.int64(5), 6, 5]).encode())
+
+        assert decoded.ids == [5, 6]
+
+    @allure.title("Text ids round trip as JSON")
+    def test_json_round_trip(self):
+        ids = ['750-67-8428', '226-31-3081', '631-41-3108']
+        blob = DqRowIds(column='invoice_id', ids=ids, truncated=True).encode()
+        decoded = DqRowIds.decode(blob, 'invoice_id')
+
+        assert blob[:1] == DqRowIds.json_kind
+        assert decoded.ids == sorted(ids)
+        assert decoded.truncated
+
+    @allure.title("The truncated flag is kept by the runs")
+    def test_truncated_runs(self):
+        assert DqRowIds.decode(DqRowIds(column=None, ids=[1, 2, 3], truncated=True).encode()).truncated
+
+    @allure.title("Consecutive ids are compressed to runs")
+    def test_runs_are_compact(self):
+        blob = DqRowIds(column=None, ids=list(range(1000000))).encode()
+
+        assert len(blob) < 64
+
+
+@allure.story("Fetch of the unexpected rows")
+class TestFetchUnexpectedRows:
+
+    @allure.title("The unexpected rows are fetched by id from the indexed output table without schema changes")
+    def test_fetch_from_table(self, tmp_path):
+        path_to_db = str(tmp_path / "pipeline.db")
+        df = pd.DataFrame({'invoice_id': ['a-1', 'a-2', 'a-3', 'a-4'], 'city': ['Mandalay', 'Yangon'] * 2,
+                           'unit_price': [5.0, 5.0, 50.0, 7.0]})
+        connector = sqlite3.connect(path_to_db)
+        connector.execute('CREATE TABLE sales_output (invoice_id TEXT, city TEXT, unit_price REAL)')
+        connector.commit()
+        SqliteSink(path_to_db=path_to_db, index_columns=['invoice_id', 'missing']).write(df, 'sales_output')
+
+        dq = DataQuality(df=df, connector=connector, table_name='sales_output', row_id_column='invoice_id')
+        dq.expect_rows_to_not_match(
+            name='check_unit_price',
+            predicate=DqRowPredicate.where('unit_price', '<', 10),
+            exception=DqException(exception_message="test", is_error=False)
+        )
+        with pytest.warns(UserWarning):
+            dq.dq_finalize()
+
+        schema = connector.execute('SELECT name, sql FROM sqlite_master ORDER BY name').fetchall()
+        rows = DqReportStore(connector).fetch_unexpected_rows('sales_output', 'check_unit_price', 'sales_output')
+
+        assert sorted(rows['invoice_id']) == ['a-1', 'a-2', 'a-4']
+        assert connector.execute('SELECT name, sql FROM sqlite_master ORDER BY name').fetchall() == schema
+        assert ('sales_output_invoice_id',) in connector.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'sales_output'").fetchall()
@@ -0,0 +1,57 @@
+import allure
+import pandas as pd
+import pytest
+import sqlite3
+from data_quality.data_quality_core import DataQuality, DqException
+from data_quality.dq_runner import DqRunner, DqJob
+
+
+class SalesDqSuite:
+
+    def __init__(self, df, table_name=None, finalize=True, **dq_options):
+        # the suite of the output with the column 'unit_price' (the unit price above 100 is an error)
+        self.dq = DataQuality(df=df, table_name=table_name, max_row_ids=0, **dq_options)
+        self.dq.expect_column_max_to_be_between(
+            'unit_price', max_value=100, exception=DqException(exception_message="unit price", is_error=True)
+        )
+        if finalize:
+            self.dq.dq_finalize()
+
+
+def get_jobs(male_price: float = 10.0, female_price: float = 20.0) -> list:
+    return [DqJob(df=pd.DataFrame({'unit_price': [1.0, male_price]}), suite_class=SalesDqSuite,
+                  table_name="male_output"),
+            DqJob(df=pd.DataFrame({'unit_price': [2.0, female_price]}), suite_class=SalesDqSuite,
+                  table_name="female_output")]
+
+
+@allure.story("DQ runner")
+class TestDqRunner:
+
+    @allure.title("The finalize metrics of every suite are saved to the DQ runs")
+    def test_run_metrics(self):
+        connector = sqlite3.connect(":memory:")
+
+        report = DqRunner(connector=connector).run(get_jobs())
+
+        runs = connector.execute('SELECT table_name, duration_s, memory_delta_mb FROM dq_run '
+                                 'ORDER BY table_name').fetchall()
+        assert report['success'].all()
+        assert [run[0] for run in runs] == ["female_output", "male_output"]
+        assert all(duration_s is not None and duration_s >= 0 for _, duration_s, _ in runs)
+        assert all(memory_delta_mb is not None for _, _, memory_delta_mb in runs)
+
+    @allure.title("The output without DQ errors is completed when DQ of the other output fails")
+    def test_on_success_of_passed_jobs(self):
+        connector = sqlite3.connect(":memory:")
+        passed = []
+        jobs = get_jobs(female_price=200.0)
+        for job in jobs:
+            job.on_success = lambda table_name=job.table_name: passed.append(table_name)
+
+        with pytest.raises(Exception, match="unit price"):
+            DqRunner(connector=connector).run(jobs)
+
+        assert passed == ["male_output"]
+        # the results of both suites are saved before the errors are raised
+        assert connector.execute('SELECT COUNT(*) FROM dq_result').fetchone()[0] == 2
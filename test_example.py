@@ -2,6 +2,7 @@ import allure
 import os
 import sqlite3
 import pandas as pd
+from data_quality.dq_report_store import DqReportStore
 
 
 @allure.story("Sales Pipeline test")
@@ -30,36 +31,25 @@ def pytest_generate_tests(metafunc):
     # connect to DB
     path_to_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "sales_pipeline.db")
     connector = sqlite3.connect(path_to_db)
-    dq_report_full = pd.read_sql_query("SELECT * FROM dq_report", connector, index_col=None)
 
-    # parse booleans
-    values = {'TRUE': True, 'FALSE': False}
-    dq_report_full = dq_report_full.replace(values)
-    dq_report_full['ts'] = dq_report_full['ts'].astype('datetime64[s]')
-
-    # get last run
-    last_pipeline_run_results: pd.DataFrame = dq_report_full.loc[dq_report_full['ts'] == dq_report_full['ts'].max()]
-    last_pipeline_run_results.reset_index(inplace=True, drop=True)
+    # get last run of every table (only the rows of these runs are read)
+    last_pipeline_run_results: pd.DataFrame = DqReportStore(connector).latest_run()
 
     # get tuple of series from df
-    params_li_warnings = []
-    params_li_errors = []
-    for index, row in last_pipeline_run_results.iterrows():
-        if row.is_error:
-            params_li_errors.append(row)
-        else:
-            params_li_warnings.append(row)
+    is_error = last_pipeline_run_results['is_error'].fillna(False).astype(bool)
+    params_li_warnings = [row for _, row in last_pipeline_run_results.loc[~is_error].iterrows()]
+    params_li_errors = [row for _, row in last_pipeline_run_results.loc[is_error].iterrows()]
 
     # parametrize for warnings test
     if "dq_result_warning" in metafunc.fixturenames and params_li_warnings:
         metafunc.parametrize("dq_result_warning",
                              params_li_warnings,
                              scope='session',
-                             ids=[e[3] for e in params_li_warnings])
+                             ids=[e.description for e in params_li_warnings])
 
     # parametrize for errors test
     if "dq_result_error" in metafunc.fixturenames and params_li_errors:
         metafunc.parametrize("dq_result_error",
                              params_li_errors,
                              scope='session',
-                             ids=[e[3] for e in params_li_errors])
+                             ids=[e.description for e in params_li_errors])
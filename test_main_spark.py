@@ -0,0 +1,55 @@
+import allure
+import os
+import sqlite3
+from types import SimpleNamespace
+from main_spark import SalesDataPipeline
+
+
+def get_pipeline(tmp_path) -> SalesDataPipeline:
+    # the pipeline without Spark session: the JDBC read and the Parquet files are replaced by the directories
+    path_to_db = str(tmp_path / "sales.db")
+    with sqlite3.connect(path_to_db) as connector:
+        connector.execute("CREATE TABLE sales_input_data (invoice_id TEXT, gender TEXT, unit_price REAL)")
+        connector.executemany("INSERT INTO sales_input_data VALUES (?, ?, ?)",
+                              [('750-67-8428', 'Male', 74.69), ('226-31-3081', 'Female', 15.28)])
+    pipeline = SalesDataPipeline.__new__(SalesDataPipeline)
+    pipeline.path_to_db = path_to_db
+    pipeline.input_cache = True
+    pipeline.input_cache_path = str(tmp_path / "spark_cache")
+    pipeline.jdbc_reads = 0
+    pipeline.scSpark = SimpleNamespace(read=SimpleNamespace(parquet=lambda path: path))
+    pipeline.read_jdbc = lambda table_name: read_jdbc(pipeline)
+    return pipeline
+
+
+def read_jdbc(pipeline: SalesDataPipeline) -> SimpleNamespace:
+    pipeline.jdbc_reads += 1
+    writer = SimpleNamespace(parquet=lambda path: os.makedirs(path))
+    return SimpleNamespace(write=SimpleNamespace(mode=lambda mode: writer))
+
+
+@allure.story("Spark input cache")
+class TestSparkInputCache:
+
+    @allure.title("The unchanged input is read from the cache")
+    def test_cache_hit(self, tmp_path):
+        pipeline = get_pipeline(tmp_path)
+
+        first = pipeline.load_input("sales_input_data")
+        second = pipeline.load_input("sales_input_data")
+
+        assert first == second
+        assert pipeline.jdbc_reads == 1
+
+    @allure.title("The change of a value with the same length refreshes the cache")
+    def test_same_length_change(self, tmp_path):
+        pipeline = get_pipeline(tmp_path)
+        first = pipeline.load_input("sales_input_data")
+
+        with sqlite3.connect(pipeline.path_to_db) as connector:
+            connector.execute("UPDATE sales_input_data SET gender = 'Mela' WHERE gender = 'Male'")
+        second = pipeline.load_input("sales_input_data")
+
+        assert second != first
+        assert pipeline.jdbc_reads == 2
+        assert os.listdir(os.path.join(pipeline.input_cache_path, "sales_input_data")) == [os.path.basename(second)]